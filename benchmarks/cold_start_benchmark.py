@@ -0,0 +1,78 @@
+''' measures how long a data store takes to start on a large registry
+
+the registry is written as a patients file, then opened with the JSON and
+columnar backends, and with the columnar backend from its checkpoint, alone
+and with changes journaled after it. The benchmark runs in a temporary
+directory.
+
+usage: python -m benchmarks.cold_start_benchmark [--patients n] [--changes n]
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from json import dumps
+from clinic.dao.patient_encoder import PatientEncoder
+from clinic.dao.recovery import replace_file, seal_line
+from clinic.data_store import DataStore
+from clinic.patient import Patient
+
+USERS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'clinic', 'users.txt')
+
+def new_patient(i):
+	''' returns the i-th patient of the registry '''
+	return Patient(9000000000 + i, "Patient %d Doe" % (i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+
+def timed_start(**options):
+	''' returns the seconds taken to open a data store, and the store '''
+	start = time.perf_counter()
+	store = DataStore(autosave=True, **options)
+	return time.perf_counter() - start, store
+
+def run(patients, changes):
+	''' returns the start-up seconds of each way of opening the registry '''
+	directory = tempfile.mkdtemp()
+	os.makedirs(os.path.join(directory, 'clinic', 'records'))
+	shutil.copy(USERS_FILE, os.path.join(directory, 'clinic'))
+	working_directory = os.getcwd()
+	os.chdir(directory)
+	results = []
+	try:
+		replace_file('clinic/patients.json', (seal_line(dumps(new_patient(i), cls=PatientEncoder)) for i in range(patients)))
+
+		for label, options in [('json', {'backend': 'json'}), ('columnar', {'backend': 'columnar'})]:
+			seconds, store = timed_start(**options)
+			store.close()
+			results.append((label, seconds))
+
+		# the first start writes the checkpoint, the next ones read it
+		store = DataStore(autosave=True, journal=True, backend='columnar', checkpoint=True)
+		store.close()
+		seconds, store = timed_start(journal=True, backend='columnar', checkpoint=True)
+		results.append(('checkpoint', seconds))
+
+		for i in range(changes):
+			store.patient_dao.update_patient(9000000000 + i, new_patient(patients + i))
+		store.close()
+		seconds, store = timed_start(journal=True, backend='columnar', checkpoint=True)
+		store.close()
+		results.append(('checkpoint + %d changes' % (changes), seconds))
+	finally:
+		os.chdir(working_directory)
+		shutil.rmtree(directory)
+	return results
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--patients', type=int, default=100000)
+	parser.add_argument('--changes', type=int, default=1000)
+	args = parser.parse_args()
+
+	print('%d patients' % (args.patients))
+	print('  %28s %10s' % ('start', 'seconds'))
+	for label, seconds in run(args.patients, args.changes):
+		print('  %28s %10.3f' % (label, seconds))
+
+if __name__ == '__main__':
+	main()
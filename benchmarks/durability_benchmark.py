@@ -0,0 +1,83 @@
+''' measures the writes per second of each durability mode
+
+every session runs on its own thread and creates patients, then notes on a
+patient of its own; the time includes closing the store, which flushes what
+is still pending. The benchmark runs in a temporary directory.
+
+usage: python -m benchmarks.durability_benchmark [modes ...] [--backend json|mmap|sqlite] [--no-journal] [--sessions n] [--writes n]
+'''
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from clinic.dao.durability import DURABILITY_MODES
+from clinic.data_store import DataStore
+from clinic.session_manager import SessionManager
+
+USERS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'clinic', 'users.txt')
+
+def timed(sessions, target):
+	''' runs a target on one thread per session, returning the elapsed time '''
+	start = time.perf_counter()
+	threads = [threading.Thread(target=target, args=(session,)) for session in range(sessions)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return time.perf_counter() - start
+
+def run(mode, backend, journal, sessions, writes):
+	''' returns the patient and note writes per second of a mode, on empty data files '''
+	directory = tempfile.mkdtemp()
+	os.makedirs(os.path.join(directory, 'clinic', 'records'))
+	shutil.copy(USERS_FILE, os.path.join(directory, 'clinic'))
+	working_directory = os.getcwd()
+	os.chdir(directory)
+	try:
+		manager = SessionManager(DataStore(autosave=True, journal=journal, backend=backend, durability=mode))
+		controllers = [manager.get_session(manager.login("user", "123456")) for session in range(sessions)]
+
+		def create_patients(session):
+			for i in range(writes):
+				controllers[session].create_patient(9000000000 + session * writes + i, "Patient %d Doe" % (i),
+					"2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+
+		def create_notes(session):
+			controllers[session].set_current_patient(9000000000 + session * writes)
+			for i in range(writes):
+				controllers[session].create_note("Note %d from session %d" % (i, session))
+
+		patient_seconds = timed(sessions, create_patients)
+		start = time.perf_counter()
+		manager.store.durability.flush()
+		patient_seconds += time.perf_counter() - start
+		note_seconds = timed(sessions, create_notes)
+		start = time.perf_counter()
+		manager.close()
+		manager.store.close()
+		note_seconds += time.perf_counter() - start
+	finally:
+		os.chdir(working_directory)
+		shutil.rmtree(directory)
+	return sessions * writes / patient_seconds, sessions * writes / note_seconds
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('modes', nargs='*', default=DURABILITY_MODES)
+	parser.add_argument('--backend', default='json', choices=['json', 'mmap', 'sqlite', 'columnar'])
+	parser.add_argument('--no-journal', dest='journal', action='store_false')
+	parser.add_argument('--sessions', type=int, default=4)
+	parser.add_argument('--writes', type=int, default=500)
+	args = parser.parse_args()
+
+	print('%s backend%s, %d sessions of %d writes' % (args.backend,
+		'' if args.journal or args.backend != 'json' else ' without journal', args.sessions, args.writes))
+	print('  %8s %16s %14s' % ('mode', 'patient writes/s', 'note writes/s'))
+	for mode in args.modes:
+		patient_rate, note_rate = run(mode, args.backend, args.journal, args.sessions, args.writes)
+		print('  %8s %16.0f %14.0f' % (mode, patient_rate, note_rate))
+
+if __name__ == '__main__':
+	main()
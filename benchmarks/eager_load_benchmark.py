@@ -0,0 +1,75 @@
+''' measures the phases of loading every record eagerly, by mode and number of workers
+
+the registry is written as a patients file and a record file per patient,
+then the data store is started with each eager loading mode and number of
+workers; the first row loads nothing eagerly. The benchmark runs in a
+temporary directory.
+
+usage: python -m benchmarks.eager_load_benchmark [modes ...] [--patients n] [--notes n] [--workers n ...]
+'''
+import argparse
+import os
+import shutil
+import tempfile
+from json import dumps
+from pickle import dumps as pickle_dumps
+from clinic.dao.patient_encoder import PatientEncoder
+from clinic.dao.recovery import RECORD_MAGIC, frame, replace_file, seal_line
+from clinic.dao.record_loader import EAGER_MODES
+from clinic.data_store import DataStore
+from clinic.note import Note
+from clinic.patient import Patient
+
+USERS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'clinic', 'users.txt')
+
+PHASES = ['patients', 'scan', 'read', 'index']
+
+def write_registry(patients, notes):
+	''' writes the patients file and the record file of every patient '''
+	replace_file('clinic/patients.json', (seal_line(dumps(Patient(9000000000 + i, "Patient %d Doe" % (i), "2000-01-01",
+		"250 000 0000", "patient@gmail.com", "1 Main St, Victoria"), cls=PatientEncoder)) for i in range(patients)), False)
+	for i in range(patients):
+		note_frames = [frame(pickle_dumps(Note(code, "Note %d of patient %d, who comes with a headache." % (code, i))))
+			for code in range(1, notes + 1)]
+		replace_file('clinic/records/%d.dat' % (9000000000 + i), [RECORD_MAGIC] + note_frames, False)
+
+def run(runs, patients, notes):
+	''' returns the seconds of each phase of the start, for each eager mode and number of workers '''
+	directory = tempfile.mkdtemp()
+	os.makedirs(os.path.join(directory, 'clinic', 'records'))
+	shutil.copy(USERS_FILE, os.path.join(directory, 'clinic'))
+	working_directory = os.getcwd()
+	os.chdir(directory)
+	results = []
+	try:
+		write_registry(patients, notes)
+		for mode, workers in runs:
+			store = DataStore(autosave=True, eager=mode, workers=workers)
+			results.append((mode, workers, store.load_times))
+			store.close()
+	finally:
+		os.chdir(working_directory)
+		shutil.rmtree(directory)
+	return results
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('modes', nargs='*', default=EAGER_MODES)
+	parser.add_argument('--patients', type=int, default=5000)
+	parser.add_argument('--notes', type=int, default=20)
+	parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+	args = parser.parse_args()
+
+	runs = [(None, None)]
+	for mode in args.modes:
+		runs += [(mode, None)] if mode == 'serial' else [(mode, workers) for workers in args.workers]
+
+	print('%d patients of %d notes' % (args.patients, args.notes))
+	print('  %8s %7s' % ('mode', 'workers') + ''.join(' %9s' % (phase) for phase in PHASES) + ' %9s' % ('total'))
+	for mode, workers, times in run(runs, args.patients, args.notes):
+		print('  %8s %7s' % (mode or 'lazy', workers or '-')
+			+ ''.join(' %9.3f' % (times[phase]) if phase in times else ' %9s' % ('-') for phase in PHASES)
+			+ ' %9.3f' % (sum(times.values())))
+
+if __name__ == '__main__':
+	main()
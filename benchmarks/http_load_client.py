@@ -0,0 +1,128 @@
+''' load client for the clinic HTTP service
+
+every client keeps one connection alive and its own session, and repeats a
+front desk and exam room mix: PHN lookups, name suggestions, a patient page,
+and notes on the current patient. The load patients are created first, in
+the server given by --url or else in one started over an in-memory registry.
+
+usage: python -m benchmarks.http_load_client [clients ...] [--url http://host:port] [--seconds n]
+'''
+import argparse
+import http.client
+import threading
+import time
+from json import loads, dumps
+from urllib.parse import urlsplit
+from clinic.data_store import DataStore
+from clinic.session_manager import SessionManager
+from clinic.http_server import ClinicHTTPServer
+
+PATIENTS = 10000
+FIRST_PHN = 9100000000
+PREFIXES = ['pa', 'patient 1', 'patient 12', 'load']
+
+class ClinicClient():
+	''' keep-alive JSON client of one session '''
+
+	def __init__(self, host, port):
+		self.connection = http.client.HTTPConnection(host, port)
+		self.headers = {'Content-Type': 'application/json'}
+
+	def request(self, method, path, body=None):
+		''' sends a request and returns the status and the decoded answer '''
+		self.connection.request(method, path, None if body is None else dumps(body), self.headers)
+		response = self.connection.getresponse()
+		answer = loads(response.read())
+		return response.status, answer
+
+	def login(self, username, password):
+		status, answer = self.request('POST', '/sessions', {"username": username, "password": password})
+		self.headers['X-Session'] = answer['session']
+
+	def close(self):
+		self.request('DELETE', '/sessions')
+		self.connection.close()
+
+def start_server():
+	''' starts a server over an in-memory registry, returns it with its host and port '''
+	session_manager = SessionManager(DataStore())
+	server = ClinicHTTPServer(('127.0.0.1', 0), session_manager)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	host, port = server.server_address[:2]
+	return server, host, port
+
+def create_patients(host, port):
+	''' creates the patients of the load, those already registered are kept '''
+	client = ClinicClient(host, port)
+	client.login("user", "123456")
+	for phn in range(FIRST_PHN, FIRST_PHN + PATIENTS):
+		client.request('POST', '/patients', {"phn": phn, "name": "Patient %d Load" % (phn - FIRST_PHN), "birth_date": "2000-01-01",
+			"phone": "250 000 0000", "email": "patient@gmail.com", "address": "1 Main St, Victoria"})
+	client.close()
+
+def work(host, port, worker, deadline, latencies, failures):
+	''' sends requests until the deadline, recording their latencies '''
+	client = ClinicClient(host, port)
+	client.login("user", "123456")
+	i = worker
+	while time.perf_counter() < deadline:
+		phn = FIRST_PHN + (i * 7919) % PATIENTS
+		for method, path, body in [
+			('GET', '/patients/%d' % (phn), None),
+			('GET', '/patients/suggestions?prefix=%s' % (PREFIXES[i % len(PREFIXES)].replace(' ', '+')), None),
+			('GET', '/patients?after=%d&limit=20' % (phn), None),
+			('PUT', '/current_patient', {"phn": phn}),
+			('POST', '/notes', {"text": "Note from client %d" % (worker)}),
+			('GET', '/notes', None)]:
+			start = time.perf_counter()
+			status, answer = client.request(method, path, body)
+			latencies.append(time.perf_counter() - start)
+			if status >= 300:
+				failures.append((method, path, status, answer))
+		i += 1
+	client.close()
+
+def percentile(values, fraction):
+	''' returns a percentile of sorted values '''
+	return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('clients', type=int, nargs='*', default=[1, 2, 4, 8, 16])
+	parser.add_argument('--url', help='a running server to load instead of a local one, the load patients are created in it')
+	parser.add_argument('--seconds', type=float, default=3.0)
+	args = parser.parse_args()
+
+	server = None
+	if args.url:
+		url = urlsplit(args.url)
+		host, port = url.hostname, url.port or 80
+	else:
+		server, host, port = start_server()
+	create_patients(host, port)
+
+	print('%d patients, server at %s:%d' % (PATIENTS, host, port))
+	print('  %8s %10s %12s %10s %10s %9s' % ('clients', 'requests', 'requests/s', 'p50 (ms)', 'p99 (ms)', 'failures'))
+	for clients in args.clients:
+		latencies = []
+		failures = []
+		start = time.perf_counter()
+		deadline = start + args.seconds
+		threads = [threading.Thread(target=work, args=(host, port, worker, deadline, latencies, failures)) for worker in range(clients)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - start
+		latencies.sort()
+		print('  %8d %10d %12.0f %10.2f %10.2f %9d' % (clients, len(latencies), len(latencies) / elapsed,
+			percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, len(failures)))
+
+	if server is not None:
+		server.shutdown()
+		server.server_close()
+		server.session_manager.close()
+		server.session_manager.store.close()
+
+if __name__ == '__main__':
+	main()
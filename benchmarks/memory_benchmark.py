@@ -0,0 +1,75 @@
+''' measures the memory taken by patients and notes with tracemalloc
+
+patients are built the way a loaded registry holds them, and notes the way
+a record holds them; the bytes are those still allocated once they are built
+
+usage: python -m benchmarks.memory_benchmark [--patients n] [--notes n]
+'''
+import argparse
+import datetime
+import gc
+import tracemalloc
+from clinic.patient import Patient
+from clinic.note import Note
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_columnar import PatientDAOColumnar
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+
+def measure(build, count):
+	''' returns the bytes per item still allocated after building count items '''
+	gc.collect()
+	tracemalloc.start()
+	start = tracemalloc.get_traced_memory()[0]
+	items = build(count)
+	gc.collect()
+	size = tracemalloc.get_traced_memory()[0] - start
+	tracemalloc.stop()
+	del items
+	return size / count
+
+def patients(count):
+	return [Patient(9000000000 + i, "Patient %d Doe" % (i), "2000-01-01", "250 000 0000",
+		"patient%d@gmail.com" % (i), "%d Main St, Victoria" % (i)) for i in range(count)]
+
+def patients_with_records(count):
+	built = patients(count)
+	for patient in built:
+		patient.get_patient_record()
+	return built
+
+def registry(count):
+	patient_dao = PatientDAOJSON()
+	patient_dao.create_patients(patients(count))
+	return patient_dao
+
+def columnar_registry(count):
+	patient_dao = PatientDAOColumnar()
+	patient_dao.create_patients(patients(count))
+	return patient_dao
+
+def notes(count):
+	timestamp = datetime.datetime(2024, 1, 1)
+	return [Note(i, "Patient note number %d." % (i), timestamp) for i in range(count)]
+
+def record(count):
+	note_dao = NoteDAOPickle()
+	for i in range(count):
+		note_dao.create_note("Patient note number %d." % (i))
+	return note_dao
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--patients', type=int, default=100000)
+	parser.add_argument('--notes', type=int, default=200000)
+	args = parser.parse_args()
+
+	print('  %-34s %10s' % ('', 'bytes each'))
+	print('  %-34s %10.0f' % ('patient', measure(patients, args.patients)))
+	print('  %-34s %10.0f' % ('patient with its record opened', measure(patients_with_records, args.patients)))
+	print('  %-34s %10.0f' % ('patient in a registry', measure(registry, args.patients)))
+	print('  %-34s %10.0f' % ('patient in a columnar registry', measure(columnar_registry, args.patients)))
+	print('  %-34s %10.0f' % ('note', measure(notes, args.notes)))
+	print('  %-34s %10.0f' % ('note in a record', measure(record, args.notes)))
+
+if __name__ == '__main__':
+	main()
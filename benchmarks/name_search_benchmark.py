@@ -0,0 +1,101 @@
+''' compares the trigram name index against a full scan of the patients and
+a scan of the packed name column of the patient table, and times the prefix
+index behind the name suggestions
+
+usage: python -m benchmarks.name_search_benchmark [size ...]
+'''
+import random
+import sys
+import time
+from clinic.dao.name_trigram_index import NameTrigramIndex
+from clinic.dao.name_prefix_index import NamePrefixIndex, name_terms, normalize_prefix, term_matches
+from clinic.dao.patient_table import PatientTable
+from clinic.patient import Patient
+
+SYLLABLES = ['al', 'an', 'ba', 'be', 'ca', 'da', 'de', 'el', 'en', 'fa', 'ga', 'ha', 'in', 'jo', 'ka',
+	'la', 'le', 'li', 'ma', 'mi', 'na', 'ne', 'no', 'or', 'pa', 'ra', 're', 'ri', 'sa', 'se', 'ta', 'to']
+QUERIES = ['Doe', 'Jo', 'Kaleno', 'Mira Sa', 'Tobe', 'zzz']
+PREFIXES = ['d', 'do', 'doe', 'ka', 'kale', 'mira s', 'zzz']
+SUGGESTION_LIMIT = 10
+
+def random_word(rng):
+	''' returns a random capitalized word '''
+	return ''.join(rng.choice(SYLLABLES) for i in range(rng.randint(2, 4))).capitalize()
+
+def build(size):
+	''' builds the names of a registry of the given size '''
+	rng = random.Random(size)
+	names = {}
+	for i in range(size):
+		names[9000000000 + i] = random_word(rng) + ' ' + random_word(rng)
+	# a few well known names
+	names[8000000000] = 'John Doe'
+	names[8000000001] = 'Mary Doe'
+	return names
+
+def scan(names, search_string):
+	''' the previous retrieval, a full scan of the names '''
+	return [key for key, name in names.items() if search_string in name]
+
+def scan_prefix(names, prefix, limit):
+	''' suggestions without the prefix index, a full scan of the names '''
+	prefix = normalize_prefix(prefix)
+	matches = sorted((term, key) for key, name in names.items() for term in name_terms(name) if term_matches(term, prefix))
+	keys = []
+	for term, key in matches:
+		if key not in keys:
+			keys.append(key)
+			if len(keys) == limit:
+				break
+	return keys
+
+def measure(function, *args, repeat=5):
+	''' returns the best time of some calls, in milliseconds '''
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		function(*args)
+		elapsed = (time.perf_counter() - start) * 1000
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def main():
+	sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+	for size in sizes:
+		names = build(size)
+
+		start = time.perf_counter()
+		index = NameTrigramIndex()
+		for key, name in names.items():
+			index.add(key, name)
+		build_time = time.perf_counter() - start
+		print('%d patients, index built in %.2f s' % (size, build_time))
+
+		table = PatientTable()
+		for key, name in names.items():
+			table[key] = Patient(key, name, '', '', '', '')
+
+		print('  %-10s %8s %12s %12s %12s' % ('query', 'matches', 'scan (ms)', 'index (ms)', 'column (ms)'))
+		for query in QUERIES:
+			matches = index.search(query)
+			assert matches == scan(names, query)
+			assert matches == table.search(query)
+			print('  %-10r %8d %12.3f %12.3f %12.3f' % (query, len(matches),
+				measure(scan, names, query), measure(index.search, query), measure(table.search, query)))
+
+		start = time.perf_counter()
+		prefix_index = NamePrefixIndex(names.items())
+		build_time = time.perf_counter() - start
+		print('  prefix index built in %.2f s' % (build_time))
+
+		print('  %-10s %8s %12s %12s' % ('prefix', 'matches', 'scan (ms)', 'index (ms)'))
+		for prefix in PREFIXES:
+			matches = prefix_index.search(prefix, SUGGESTION_LIMIT)
+			assert matches == scan_prefix(names, prefix, SUGGESTION_LIMIT)
+			print('  %-10r %8d %12.3f %12.3f' % (prefix, len(matches),
+				measure(scan_prefix, names, prefix, SUGGESTION_LIMIT, repeat=1),
+				measure(prefix_index.search, prefix, SUGGESTION_LIMIT)))
+
+if __name__ == '__main__':
+	main()
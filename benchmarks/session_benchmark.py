@@ -0,0 +1,68 @@
+''' measures the throughput of concurrent sessions sharing one data store
+
+every session runs on its own thread and repeats a front desk and exam room
+mix: PHN lookups, name suggestions, name searches, and notes on the current patient
+
+usage: python -m benchmarks.session_benchmark [sessions ...] [--backend json|sqlite] [--seconds n]
+'''
+import argparse
+import threading
+import time
+from clinic.data_store import DataStore
+from clinic.session_manager import SessionManager
+
+PATIENTS = 20000
+PREFIXES = ['pa', 'patient 1', 'patient 12', 'doe']
+
+def build(backend):
+	''' builds a data store with a registry of patients '''
+	manager = SessionManager(DataStore(backend=backend))
+	controller = manager.get_session(manager.login("user", "123456"))
+	controller.import_patients([{"phn": 9000000000 + i, "name": "Patient %d Doe" % (i), "birth_date": "2000-01-01",
+		"phone": "250 000 0000", "email": "patient@gmail.com", "address": "1 Main St, Victoria"} for i in range(PATIENTS)])
+	return manager
+
+def work(manager, worker, deadline, counts):
+	''' runs operations in a session of its own until the deadline, counting them '''
+	controller = manager.get_session(manager.login("user", "123456"))
+	operations = 0
+	i = worker
+	while time.perf_counter() < deadline:
+		phn = 9000000000 + (i * 7919) % PATIENTS
+		controller.search_patient(phn)
+		controller.suggest_patients(PREFIXES[i % len(PREFIXES)])
+		controller.retrieve_patients_page("Patient %d" % (i % 1000), limit=20)
+		controller.set_current_patient(phn)
+		controller.create_note("Note from session %d" % (worker))
+		controller.list_notes()
+		controller.unset_current_patient()
+		operations += 7
+		i += 1
+	counts[worker] = operations
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('sessions', type=int, nargs='*', default=[1, 2, 4, 8, 16])
+	parser.add_argument('--backend', default='json', choices=['json', 'sqlite'])
+	parser.add_argument('--seconds', type=float, default=3.0)
+	args = parser.parse_args()
+
+	manager = build(args.backend)
+	print('%d patients, %s backend' % (PATIENTS, args.backend))
+	print('  %8s %12s %14s' % ('sessions', 'operations', 'operations/s'))
+	for sessions in args.sessions:
+		counts = [0] * sessions
+		start = time.perf_counter()
+		deadline = start + args.seconds
+		threads = [threading.Thread(target=work, args=(manager, worker, deadline, counts)) for worker in range(sessions)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - start
+		print('  %8d %12d %14.0f' % (sessions, sum(counts), sum(counts) / elapsed))
+	manager.close()
+	manager.store.close()
+
+if __name__ == '__main__':
+	main()
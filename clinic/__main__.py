@@ -1,27 +1,49 @@
 import os
 import sys
+import argparse
 #from clinic.cli.clinic_cli import ClinicCLI
-import clinic.gui.clinic_gui
-from PyQt6.QtWidgets import QApplication
-from clinic.gui.clinic_gui import ClinicGUI
+
+def usage():
+	print('\nCorrect Command usage:')
+	print('python -m clinic option [--host host] [port]')
+	print('where option is either cli, gui or serve,')
+	print('and serve listens on the given host (127.0.0.1 by default,')
+	print('0.0.0.0 for every interface) and port (8000 by default)')
 
 def main():
 	# You can run either a command-line interface (CLI) 
-	# or a graphical user interface (GUI) to your clinic.
-	if len(sys.argv) != 2:
+	# or a graphical user interface (GUI) to your clinic,
+	# or serve it over HTTP to several workstations.
+	if len(sys.argv) < 2 or (len(sys.argv) > 2 and sys.argv[1] != 'serve'):
 		print('ERROR: wrong number of arguments')
-		print('\nCorrect Command usage:')
-		print('python -m clinic option')
-		print('where option is either cli or gui')
+		usage()
 		sys.exit()
 
 	if sys.argv[1] == 'gui':
+		# PyQt is only needed by the GUI
+		import clinic.gui.clinic_gui
 		clinic.gui.clinic_gui.main()
+	elif sys.argv[1] == 'serve':
+		from clinic.http_server import serve
+		# other workstations reach the server only if it listens on one of their networks
+		parser = argparse.ArgumentParser(prog='python -m clinic serve')
+		parser.add_argument('--host', default='127.0.0.1')
+		parser.add_argument('port', nargs='?', default='8000')
+		args, unknown = parser.parse_known_args(sys.argv[2:])
+		if unknown:
+			print('ERROR: wrong arguments')
+			usage()
+			sys.exit()
+		try:
+			port = int(args.port)
+		except ValueError:
+			print('ERROR: the port must be a number')
+			usage()
+			sys.exit()
+		serve(host=args.host, port=port)
 	else:
 		print('ERROR: Wrong argument')
-		print('\nCorrect Command usage:')
-		print('python -m clinic option')
-		print('where option is either cli or gui')
+		usage()
 
 if __name__ == '__main__':
 	main()
\ No newline at end of file
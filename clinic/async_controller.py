@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from clinic.controller import Controller
+from clinic.dao.patient_dao import PAGE_SIZE, SUGGESTION_LIMIT
+
+# threads that serve read operations at the same time
+READ_WORKERS = 4
+
+class AsyncController():
+	''' asyncio facade over a controller, with an awaitable for every operation
+
+		The controller blocks on file I/O and on the data locks, so its calls
+		run on executors and the event loop keeps running. Reads go to a pool
+		of threads and never queue behind writes. Writes go, in the order they
+		were awaited, to a single thread of their own.
+	'''
+
+	def __init__(self, controller=None, read_workers=READ_WORKERS):
+		''' constructs a facade over a controller, creating one if none is given '''
+
+		# a controller given by the caller is closed by the caller
+		self.owns_controller = controller is None
+		if controller is None:
+			controller = Controller()
+		self.controller = controller
+		self.read_executor = ThreadPoolExecutor(read_workers, thread_name_prefix='clinic-read')
+		self.write_executor = ThreadPoolExecutor(1, thread_name_prefix='clinic-write')
+
+	async def read(self, function, *args):
+		''' runs a reading controller operation on the read executor '''
+
+		return await asyncio.get_running_loop().run_in_executor(self.read_executor, function, *args)
+
+	async def write(self, function, *args):
+		''' runs a writing controller operation on the write executor '''
+
+		return await asyncio.get_running_loop().run_in_executor(self.write_executor, function, *args)
+
+	async def close(self):
+		''' waits for the pending operations, then closes the controller if the facade created it '''
+
+		loop = asyncio.get_running_loop()
+		# shutting down waits for the threads, which must not block the loop
+		await loop.run_in_executor(None, self.read_executor.shutdown)
+		await loop.run_in_executor(None, self.write_executor.shutdown)
+		if self.owns_controller:
+			await loop.run_in_executor(None, self.controller.close)
+
+	async def login(self, username, password):
+		return await self.write(self.controller.login, username, password)
+
+	async def logout(self):
+		return await self.write(self.controller.logout)
+
+	async def search_patient(self, phn):
+		return await self.read(self.controller.search_patient, phn)
+
+	async def create_patient(self, phn, name, birth_date, phone, email, address):
+		return await self.write(self.controller.create_patient, phn, name, birth_date, phone, email, address)
+
+	async def import_patients(self, rows, numbered=False):
+		return await self.write(self.controller.import_patients, rows, numbered)
+
+	async def retrieve_patients(self, name):
+		return await self.read(self.controller.retrieve_patients, name)
+
+	async def update_patient(self, original_phn, phn, name, birth_date, phone, email, address):
+		return await self.write(self.controller.update_patient, original_phn, phn, name, birth_date, phone, email, address)
+
+	async def delete_patient(self, phn):
+		return await self.write(self.controller.delete_patient, phn)
+
+	async def list_patients(self):
+		return await self.read(self.controller.list_patients)
+
+	async def iter_patients(self, after_phn=None, limit=None):
+		''' yields the patients in PHN order, fetching them a page at a time '''
+
+		while limit is None or limit > 0:
+			page_size = PAGE_SIZE if limit is None else min(limit, PAGE_SIZE)
+			# the controller streams lazily, the page must be read on the executor
+			page = await self.read(lambda: list(self.controller.iter_patients(after_phn, page_size)))
+			for patient in page:
+				yield patient
+			if len(page) < page_size:
+				return
+			after_phn = page[-1].phn
+			if limit is not None:
+				limit -= len(page)
+
+	async def retrieve_patients_page(self, name, after_phn=None, limit=PAGE_SIZE):
+		return await self.read(self.controller.retrieve_patients_page, name, after_phn, limit)
+
+	async def suggest_patients(self, prefix, limit=SUGGESTION_LIMIT):
+		return await self.read(self.controller.suggest_patients, prefix, limit)
+
+	async def set_current_patient(self, phn):
+		return await self.write(self.controller.set_current_patient, phn)
+
+	async def get_current_patient(self):
+		return await self.read(self.controller.get_current_patient)
+
+	async def unset_current_patient(self):
+		return await self.write(self.controller.unset_current_patient)
+
+	async def search_note(self, code):
+		return await self.read(self.controller.search_note, code)
+
+	async def create_note(self, text):
+		return await self.write(self.controller.create_note, text)
+
+	async def retrieve_notes(self, search_string):
+		return await self.read(self.controller.retrieve_notes, search_string)
+
+	async def update_note(self, code, new_text):
+		return await self.write(self.controller.update_note, code, new_text)
+
+	async def delete_note(self, code):
+		return await self.write(self.controller.delete_note, code)
+
+	async def list_notes(self):
+		return await self.read(self.controller.list_notes)
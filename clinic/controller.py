@@ -2,47 +2,49 @@ import hashlib
 from clinic.patient import Patient
 from clinic.patient_record import PatientRecord
 from clinic.note import Note
+from clinic.patient_import import ImportReport, PATIENT_FIELDS
 from clinic.exception.invalid_login_exception import InvalidLoginException
 from clinic.exception.duplicate_login_exception import DuplicateLoginException
 from clinic.exception.invalid_logout_exception import InvalidLogoutException
 from clinic.exception.illegal_access_exception import IllegalAccessException
 from clinic.exception.illegal_operation_exception import IllegalOperationException
 from clinic.exception.no_current_patient_exception import NoCurrentPatientException
-from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao import PAGE_SIZE, SUGGESTION_LIMIT
+from clinic.data_store import DataStore
+from clinic.dao.durability import STRICT
 from json import loads, dumps
 
 class Controller():
 	''' controller class that receives the system's operations '''
 
-	def __init__(self, autosave=False):
-		''' construct a controller class '''
-
-		self.autosave = autosave
+	def __init__(self, autosave=False, journal=False, backend='json', store=None, durability=STRICT, segments=False,
+			checkpoint=False, eager=None, workers=None):
+		''' construct a controller class, sharing a data store if one is given '''
 
+		# the session state: who is logged in and the current patient
 		self.username = None
 		self.password = None
 		self.logged = False
 
 		self.current_patient = None
 
-		if self.autosave:
-			self.users = self.load_users()
-		else:
-			self.users = \
-			{"user":"8d969eef6ecad3c29a3a629280e686cf0c3f5d5a86aff3ca12020c923adc6c92", \
-			"ali":"6394ffec21517605c1b426d43e6fa7eb0cff606ded9c2956821c2c36bfee2810", \
-			"kala":"e5268ad137eec951a48a5e5da52558c7727aaa537c8b308b5e403e6b434e036e"}
-
-		self.patient_dao = PatientDAOJSON(self.autosave)
+		# the data store outlives the session, it is only closed with the session that loaded it
+		self.owns_store = store is None
+		if store is None:
+			store = DataStore(autosave, journal, backend, durability, segments, checkpoint, eager, workers)
+		self.store = store
+		self.autosave = store.autosave
+		self.journal = store.journal
+		self.backend = store.backend
+		self.users = store.users
+		self.patient_dao = store.patient_dao
+		self.durability = store.durability
 
 
-	def load_users(self):
-		users = {}
-		with open('clinic/users.txt', 'r') as file:
-			for line in file:
-				tokens = line.strip().split(',')
-				users[tokens[0]] = tokens[1]
-		return users
+	def close(self):
+		''' release the files held by the data access objects, unless the data store is shared '''
+		if self.owns_store:
+			self.store.close()
 
 	def get_password_hash(self, password):
 		encoded_password = password.encode('utf-8')     # Convert the password to bytes
@@ -75,9 +77,15 @@ class Controller():
 			self.username = None
 			self.password = None
 			self.logged = False
-			self.current_patient = None
+			self.release_current_patient()
 			return True
 
+	def release_current_patient(self):
+		''' lets other sessions change the current patient again '''
+		if self.current_patient:
+			self.store.release_patient(self.current_patient.phn)
+			self.current_patient = None
+
 	def search_patient(self, phn):
 		''' user searches a patient '''
 		# must be logged in to do operation
@@ -92,19 +100,79 @@ class Controller():
 		if not self.logged:
 			raise IllegalAccessException("Illegal Access: Must login first.")
 
-		# patient already exists, do not create them
-		if self.search_patient(phn):
-			raise IllegalOperationException("Illegal Operation: Cannot add a patient with a PHN that is already registered.")
+		with self.patient_dao.lock.writing():
+			# patient already exists, do not create them
+			if self.search_patient(phn):
+				raise IllegalOperationException("Illegal Operation: Cannot add a patient with a PHN that is already registered.")
+
+			# finally, create a new patient
+			patient = Patient(phn, name, birth_date, phone, email, address, self.autosave, durability=self.durability)
+			return self.patient_dao.create_patient(patient)
 
-		# finally, create a new patient
-		patient = Patient(phn, name, birth_date, phone, email, address, self.autosave)
-		return self.patient_dao.create_patient(patient)
+	def import_patients(self, rows, numbered=False):
+		''' user imports many patients at once, rows that cannot be imported are reported
+
+			With numbered, the rows are (line number, row) pairs, as the readers of
+			clinic.patient_import yield them.
+		'''
+		# must be logged in to do operation
+		if not self.logged:
+			raise IllegalAccessException("Illegal Access: Must login first.")
+
+		report = ImportReport()
+		candidates = []
+		imported_phns = set()
+		for row_number, row in (rows if numbered else enumerate(rows, 1)):
+			if not isinstance(row, dict):
+				report.add_error(row_number, "Row is not a patient record.")
+				continue
+
+			values = {}
+			for field in PATIENT_FIELDS:
+				value = row.get(field)
+				values[field] = '' if value is None else str(value).strip()
+			missing_fields = [field for field in PATIENT_FIELDS if not values[field]]
+			if missing_fields:
+				report.add_error(row_number, "Missing fields: %s." % (", ".join(missing_fields)))
+				continue
+
+			try:
+				phn = int(values['phn'])
+			except ValueError:
+				report.add_error(row_number, "PHN must be a valid number.")
+				continue
+
+			# patient appears earlier in the rows, do not create them
+			if phn in imported_phns:
+				report.add_error(row_number, "PHN %d appears more than once." % (phn))
+				continue
+
+			imported_phns.add(phn)
+			candidates.append((row_number, Patient(phn, values['name'], values['birth_date'], values['phone'],
+				values['email'], values['address'], self.autosave, durability=self.durability)))
+
+		# the rows are read without holding the registry, only the checks and the write lock it
+		with self.patient_dao.lock.writing():
+			patients = []
+			for row_number, patient in candidates:
+				# patient already exists, do not create them
+				if self.patient_dao.search_patient(patient.phn):
+					report.add_error(row_number, "PHN %d is already registered." % (patient.phn))
+					continue
+				patients.append(patient)
+
+			# create every valid patient with a single write
+			if patients:
+				report.imported = self.patient_dao.create_patients(patients)
+		report.errors.sort()
+		return report
 
 	def retrieve_patients(self, name):
 		''' user retrieves the patients that satisfy a search criterion '''
 		# must be logged in to do operation
 		if not self.logged:
 			raise IllegalAccessException("Illegal Access: Must login first.")
+
 		return self.patient_dao.retrieve_patients(name)
 
 	def update_patient(self, original_phn, phn, name, birth_date, phone, email, address):
@@ -113,23 +181,31 @@ class Controller():
 		if not self.logged:
 			raise IllegalAccessException("Illegal Access: Must login first.")
 
-		patient = self.search_patient(original_phn)
+		with self.patient_dao.lock.writing():
+			patient = self.search_patient(original_phn)
 
-		# patient does not exist, cannot update
-		if not patient:
-			raise IllegalOperationException("Illegal Operation: Cannot update an inexistent patient.")
+			# patient does not exist, cannot update
+			if not patient:
+				raise IllegalOperationException("Illegal Operation: Cannot update an inexistent patient.")
 
-		# patient is current patient, cannot update
-		if self.current_patient:
-			if patient == self.current_patient:
-				raise IllegalOperationException("Illegal Operation: Cannot update the current patient, unset patient first.")
+			# patient is current patient, cannot update
+			if self.current_patient:
+				if patient == self.current_patient:
+					raise IllegalOperationException("Illegal Operation: Cannot update the current patient, unset patient first.")
 
-		if original_phn != phn:
-			if self.search_patient(phn):
-				raise IllegalOperationException("Illegal Operation: Cannot update a patient with a new PHN that is already registered.")
+			# patient is the current patient of another session, cannot update
+			if self.store.is_held(original_phn):
+				raise IllegalOperationException("Illegal Operation: Cannot update a patient that another session has as current patient.")
+
+			if original_phn != phn:
+				if self.search_patient(phn):
+					raise IllegalOperationException("Illegal Operation: Cannot update a patient with a new PHN that is already registered.")
 
-		patient = Patient(phn, name, birth_date, phone, email, address)
-		return self.patient_dao.update_patient(original_phn, patient)
+			# a patient keeps their record, so that their notes are never numbered twice
+			updated_patient = Patient(phn, name, birth_date, phone, email, address, self.autosave, durability=self.durability)
+			if original_phn == phn:
+				updated_patient.record = patient.record
+			return self.patient_dao.update_patient(original_phn, updated_patient)
 			
 	def delete_patient(self, phn):
 		''' user deletes a patient '''
@@ -137,19 +213,24 @@ class Controller():
 		if not self.logged:
 			raise IllegalAccessException("Illegal Access: Must login first.")
 
-		# first, search the patient by key
-		patient = self.search_patient(phn)
+		with self.patient_dao.lock.writing():
+			# first, search the patient by key
+			patient = self.search_patient(phn)
 
-		# patient does not exist, cannot delete
-		if not patient:
-			raise IllegalOperationException("Illegal Operation: Cannot delete an inexistent patient.")
+			# patient does not exist, cannot delete
+			if not patient:
+				raise IllegalOperationException("Illegal Operation: Cannot delete an inexistent patient.")
 
-		# patient is current patient, cannot delete
-		if self.current_patient:
-			if patient == self.current_patient:
-				raise IllegalOperationException("Illegal Operation: Cannot delete the current patient, unset patient first.")
+			# patient is current patient, cannot delete
+			if self.current_patient:
+				if patient == self.current_patient:
+					raise IllegalOperationException("Illegal Operation: Cannot delete the current patient, unset patient first.")
+
+			# patient is the current patient of another session, cannot delete
+			if self.store.is_held(phn):
+				raise IllegalOperationException("Illegal Operation: Cannot delete a patient that another session has as current patient.")
 
-		return self.patient_dao.delete_patient(phn)
+			return self.patient_dao.delete_patient(phn)
 
 	def list_patients(self):
 		''' user lists all patients '''
@@ -159,6 +240,31 @@ class Controller():
 
 		return self.patient_dao.list_patients()
 
+	def iter_patients(self, after_phn=None, limit=None):
+		''' user streams the patients in PHN order, starting after a given PHN '''
+		# must be logged in to do operation
+		if not self.logged:
+			raise IllegalAccessException("Illegal Access: Must login first.")
+
+		return self.patient_dao.iter_patients(after_phn, limit)
+
+	def retrieve_patients_page(self, name, after_phn=None, limit=PAGE_SIZE):
+		''' user retrieves a page of the patients that satisfy a search criterion,
+			in PHN order after a given PHN '''
+		# must be logged in to do operation
+		if not self.logged:
+			raise IllegalAccessException("Illegal Access: Must login first.")
+
+		return self.patient_dao.retrieve_patients_page(name, after_phn, limit)
+
+	def suggest_patients(self, prefix, limit=SUGGESTION_LIMIT):
+		''' user gets the first patients with a name word starting with what was typed so far '''
+		# must be logged in to do operation
+		if not self.logged:
+			raise IllegalAccessException("Illegal Access: Must login first.")
+
+		return self.patient_dao.suggest_patients(prefix, limit)
+
 	def set_current_patient(self, phn):
 		''' user sets the current patient '''
 
@@ -166,15 +272,20 @@ class Controller():
 		if not self.logged:
 			raise IllegalAccessException("Illegal Access: Must login first.")
 
-		# first, search the patient by key
-		patient = self.search_patient(phn)
+		# no session updates or deletes the patient while it is being set
+		with self.patient_dao.lock.reading():
+			# first, search the patient by key
+			patient = self.search_patient(phn)
 
-		# patient does not exist
-		if not patient:
-			raise IllegalOperationException("Illegal Operation: Cannot set the current patient to an inexistent patient.")
+			# patient does not exist
+			if not patient:
+				raise IllegalOperationException("Illegal Operation: Cannot set the current patient to an inexistent patient.")
 
-		# patient exists, set them to be the current patient
-		self.current_patient = patient
+			# patient exists, load their notes and set them to be the current patient
+			patient.get_patient_record().load_notes()
+			self.store.hold_patient(phn)
+			self.release_current_patient()
+			self.current_patient = patient
 
 
 	def get_current_patient(self):
@@ -194,7 +305,7 @@ class Controller():
 			raise IllegalAccessException("Illegal Access: Must login first.")
 
 		# unset current patient
-		self.current_patient = None
+		self.release_current_patient()
 
 
 	def search_note(self, code):
@@ -0,0 +1,112 @@
+''' binary checkpoints of a patient table, read back in one sequential read
+
+A checkpoint holds the arrays and buffers of the table as they are in memory:
+a header with the magic, the version, the byte order, the number of sections
+and the stamp of the patients file it mirrors, then each section with its
+typecode, its length and its CRC32. Sections start on 8-byte boundaries, so
+that they can also be mapped. The patients file stays the snapshot every
+backend reads; a checkpoint is only used while the stamp still matches it.
+'''
+import os
+import sys
+import struct
+import zlib
+from array import array
+from clinic.dao.patient_table import PatientTable
+from clinic.dao.recovery import CHECKPOINT_MAGIC, read_file, replace_file
+from clinic.exception.damaged_record_exception import DamagedRecordException
+
+CHECKPOINT_VERSION = 1
+
+# magic, version, byte order, number of sections, and inode, size and modification time of the patients file
+HEADER = struct.Struct('<8sIcIqqq')
+
+# typecode, length (in bytes) and CRC32 of each section
+SECTION_HEADER = struct.Struct('<cqI')
+
+# byte buffers are written with the typecode of unsigned bytes
+BYTES = b'B'
+
+BYTE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+def file_stamp(filename):
+	''' returns the inode, size and modification time of a file, which change whenever it is replaced '''
+
+	try:
+		stat = os.stat(filename)
+	except FileNotFoundError:
+		return (0, -1, 0)
+	return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def aligned(position):
+	''' returns a position rounded up to the next 8-byte boundary '''
+
+	return (position + 7) & ~7
+
+def padding(size):
+	''' returns the zero bytes that bring a size to the next 8-byte boundary '''
+
+	return bytes(aligned(size) - size)
+
+def checkpoint_chunks(sections, stamp):
+	''' yields the header and the sections of a checkpoint '''
+
+	header = HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, BYTE_ORDER, len(sections), *stamp)
+	yield header + padding(len(header))
+	for section in sections:
+		typecode = BYTES if isinstance(section, bytearray) else section.typecode.encode('ascii')
+		data = memoryview(section).cast('B')
+		section_header = SECTION_HEADER.pack(typecode, len(data), zlib.crc32(data))
+		yield section_header + padding(len(section_header))
+		yield data
+		yield padding(len(data))
+
+def write_checkpoint(filename, table, stamp, sync=True):
+	''' writes a table to a checkpoint file, with the stamp of the patients file it mirrors,
+		returns the number of bytes written '''
+
+	return replace_file(filename, checkpoint_chunks(table.sections(), stamp), sync)
+
+def read_checkpoint(filename, durability=None):
+	''' reads a table from a checkpoint file, returns it and the stamp of the patients file it mirrors '''
+
+	sections, stamp = read_sections(read_file(filename), filename)
+	return PatientTable.from_sections(sections, durability), stamp
+
+def read_sections(data, filename):
+	''' returns the verified sections of the data of a checkpoint file and the stamp of the patients file it mirrors '''
+
+	if len(data) < HEADER.size:
+		raise DamagedRecordException("Truncated checkpoint %s." % (filename))
+	magic, version, byte_order, count, *stamp = HEADER.unpack_from(data)
+	if magic != CHECKPOINT_MAGIC:
+		raise DamagedRecordException("%s is not a checkpoint." % (filename))
+	if version != CHECKPOINT_VERSION:
+		raise DamagedRecordException("Unknown version %d of checkpoint %s." % (version, filename))
+
+	view = memoryview(data)
+	position = aligned(HEADER.size)
+	sections = []
+	for i in range(count):
+		if position + SECTION_HEADER.size > len(data):
+			raise DamagedRecordException("Truncated checkpoint %s." % (filename))
+		typecode, length, checksum = SECTION_HEADER.unpack_from(data, position)
+		position = aligned(position + SECTION_HEADER.size)
+		section_data = view[position:position + length]
+		if len(section_data) < length or zlib.crc32(section_data) != checksum:
+			raise DamagedRecordException("Damaged section %d of checkpoint %s." % (i, filename))
+		position = aligned(position + length)
+
+		if typecode == BYTES:
+			sections.append(bytearray(section_data))
+			continue
+		# the items of the sections must have the size they had when written
+		try:
+			section = array(typecode.decode('ascii'))
+			section.frombytes(section_data)
+		except ValueError:
+			raise DamagedRecordException("Unreadable section %d of checkpoint %s." % (i, filename))
+		if byte_order != BYTE_ORDER:
+			section.byteswap()
+		sections.append(section)
+	return sections, tuple(stamp)
@@ -0,0 +1,118 @@
+import threading
+import time
+
+STRICT = 'strict'
+GROUP = 'group'
+LAZY = 'lazy'
+DURABILITY_MODES = [STRICT, GROUP, LAZY]
+
+# how long mutations gather before a group flush, in seconds
+GROUP_WINDOW = 0.005
+
+# how long mutations wait before a lazy flush, in seconds
+LAZY_INTERVAL = 1.0
+
+class Durability():
+	''' policy that decides when the mutations logged by the DAOs reach the disk
+
+		strict: every mutation is written and synced before its operation returns.
+		group: the mutations that arrive within a short window are written and
+		synced together, by a background thread.
+		lazy: mutations are written on a timer without syncing, and synced when
+		the store is closed.
+
+		With group and lazy, operations return before their mutations are on the
+		disk: a crash loses at most the last window or interval of mutations.
+		A DAO takes part by keeping its mutations pending and writing them in
+		flush_pending(sync). DAOs that write to a shared file may leave that
+		file pending in turn, it is flushed in the same pass.
+	'''
+
+	def __init__(self, mode=STRICT, group_window=GROUP_WINDOW, lazy_interval=LAZY_INTERVAL):
+		''' constructs a durability policy, starting its flusher thread if it needs one '''
+
+		if mode not in DURABILITY_MODES:
+			raise ValueError("Unknown durability mode: %s" % (mode))
+		self.mode = mode
+		self.delay = group_window if mode == GROUP else lazy_interval
+		self.condition = threading.Condition()
+
+		# DAOs with pending mutations, in the order they got their first one
+		self.pending = {}
+		self.deadline = None
+		self.closed = False
+
+		# a flush runs at a time, so that flush() also waits for the one in progress
+		self.flush_lock = threading.Lock()
+		self.error = None
+
+		self.thread = None
+		if self.mode != STRICT:
+			self.thread = threading.Thread(target=self.run, name='clinic-flusher', daemon=True)
+			self.thread.start()
+
+	def write(self, dao):
+		''' takes note that a DAO has a pending mutation, flushing it now when strict '''
+
+		if self.mode == STRICT:
+			dao.flush_pending(True)
+			return
+		with self.condition:
+			if not self.closed:
+				self.pending[dao] = None
+				if self.deadline is None:
+					self.deadline = time.monotonic() + self.delay
+					self.condition.notify()
+				return
+		# mutations after closing are not left behind
+		dao.flush_pending(True)
+
+	def run(self):
+		''' flushes the pending mutations once their window or interval is over '''
+
+		while True:
+			with self.condition:
+				while not self.closed and (self.deadline is None or self.deadline > time.monotonic()):
+					self.condition.wait(None if self.deadline is None else self.deadline - time.monotonic())
+				if self.closed:
+					return
+			try:
+				self.flush_pending(self.mode == GROUP)
+			except Exception as e:
+				# reported by the next flush or by closing
+				self.error = e
+
+	def flush_pending(self, sync):
+		''' writes the mutations pending so far, and what the flushed DAOs leave pending '''
+
+		with self.flush_lock:
+			while True:
+				with self.condition:
+					daos = list(self.pending)
+					self.pending.clear()
+					self.deadline = None
+				if not daos:
+					return
+				for dao in daos:
+					dao.flush_pending(sync)
+
+	def flush(self):
+		''' writes and syncs every pending mutation before returning '''
+
+		self.flush_pending(True)
+		error, self.error = self.error, None
+		if error is not None:
+			raise error
+
+	def close(self):
+		''' stops the flusher thread and flushes what is left '''
+
+		with self.condition:
+			self.closed = True
+			self.condition.notify()
+		if self.thread is not None:
+			self.thread.join()
+		self.flush()
+
+# strict policy for the DAOs that are given none, it keeps no state of its own
+STRICT_DURABILITY = Durability()
\ No newline at end of file
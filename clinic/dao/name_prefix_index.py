@@ -0,0 +1,85 @@
+from bisect import bisect_left, insort
+from operator import itemgetter
+
+def name_terms(name):
+	''' returns the normalized terms of a name, the whole name and the rest of it
+		from every later word, so that a prefix can match any word of the name '''
+
+	words = name.casefold().split()
+	return {' '.join(words[i:]) for i in range(len(words))}
+
+def normalize_prefix(prefix):
+	''' normalizes a prefix typed by the user like the terms of a name '''
+
+	normalized = ' '.join(prefix.casefold().split())
+	# keep a trailing space, it tells that the last word is complete
+	if normalized and prefix[-1:].isspace():
+		normalized += ' '
+	return normalized
+
+def term_matches(term, prefix):
+	''' checks whether a term matches a normalized prefix, a prefix ending with a space
+		matches a term that ends with its last word as well as one that goes on '''
+
+	return term.startswith(prefix) or (prefix.endswith(' ') and term == prefix[:-1])
+
+class NamePrefixIndex():
+	''' in-memory sorted index that answers prefix searches over patient names '''
+
+	def __init__(self, names=()):
+		''' constructs an index of some key and name pairs, sorting it once '''
+
+		# key -> terms of the indexed name
+		self.terms = {}
+
+		# sorted list of (term, key) pairs
+		self.entries = []
+		for key, name in names:
+			terms = name_terms(name)
+			self.terms[key] = terms
+			self.entries.extend((term, key) for term in terms)
+
+		# two stable sorts on single fields are faster than comparing the pairs
+		self.entries.sort(key=itemgetter(1))
+		self.entries.sort(key=itemgetter(0))
+
+	def add(self, key, name):
+		''' indexes a name, replacing the name previously indexed for the same key '''
+
+		self.remove(key)
+		terms = name_terms(name)
+		self.terms[key] = terms
+		for term in terms:
+			insort(self.entries, (term, key))
+
+	def remove(self, key):
+		''' removes a key from the index '''
+
+		terms = self.terms.pop(key, None)
+		if terms is None:
+			return
+		for term in terms:
+			del self.entries[bisect_left(self.entries, (term, key))]
+
+	def search(self, prefix, limit):
+		''' returns up to limit keys whose names have a word starting with the prefix,
+			ordered by the matching term '''
+
+		prefix = normalize_prefix(prefix)
+		if not prefix:
+			return []
+
+		keys = []
+		seen = set()
+		# a complete last word also matches the term ending with it, which sorts just before
+		word = prefix.rstrip(' ')
+		i = bisect_left(self.entries, (word,))
+		while i < len(self.entries) and len(keys) < limit:
+			term, key = self.entries[i]
+			if not term.startswith(word) or (term > prefix and not term.startswith(prefix)):
+				break
+			if term_matches(term, prefix) and key not in seen:
+				seen.add(key)
+				keys.append(key)
+			i += 1
+		return keys
@@ -0,0 +1,76 @@
+class NameTrigramIndex():
+	''' in-memory trigram index that answers substring searches over patient names '''
+
+	def __init__(self):
+		''' constructs an empty index '''
+
+		# key -> name and key -> insertion number, to verify and order results
+		self.names = {}
+		self.sequence = {}
+		self.counter = 0
+
+		# trigram -> set of keys whose names contain the trigram
+		self.trigrams = {}
+
+	def name_trigrams(self, name):
+		''' returns the set of trigrams of a name '''
+
+		return {name[i:i+3] for i in range(len(name) - 2)}
+
+	def add(self, key, name):
+		''' indexes a name, replacing the name previously indexed for the same key '''
+
+		if key in self.names:
+			self.remove_trigrams(key, self.names[key])
+		else:
+			self.counter += 1
+			self.sequence[key] = self.counter
+		self.names[key] = name
+
+		for trigram in self.name_trigrams(name):
+			keys = self.trigrams.get(trigram)
+			if keys is None:
+				self.trigrams[trigram] = {key}
+			else:
+				keys.add(key)
+
+	def remove(self, key):
+		''' removes a key from the index '''
+
+		name = self.names.pop(key, None)
+		if name is None:
+			return
+		self.sequence.pop(key)
+		self.remove_trigrams(key, name)
+
+	def remove_trigrams(self, key, name):
+		''' removes the postings of a key for the trigrams of a name '''
+
+		for trigram in self.name_trigrams(name):
+			keys = self.trigrams.get(trigram)
+			if keys is not None:
+				keys.discard(key)
+				if not keys:
+					del self.trigrams[trigram]
+
+	def search(self, search_string):
+		''' returns the keys whose names contain the search string, in insertion order '''
+
+		# too short to have a trigram, verify every name
+		if len(search_string) < 3:
+			return [key for key, name in self.names.items() if search_string in name]
+
+		# candidates must contain every trigram of the search string
+		postings = []
+		for trigram in self.name_trigrams(search_string):
+			keys = self.trigrams.get(trigram)
+			if keys is None:
+				return []
+			postings.append(keys)
+		postings.sort(key=len)
+		candidates = postings[0].intersection(*postings[1:])
+
+		# trigrams may appear apart in the name, verify the candidates
+		keys = [key for key in candidates if search_string in self.names[key]]
+		keys.sort(key=self.sequence.__getitem__)
+		return keys
@@ -1,121 +1,305 @@
 import os
 import datetime
-from pickle import load, dump
+import struct
+from pickle import loads, dumps
 from clinic.dao.note_dao import NoteDAO
+from clinic.dao.note_text_index import NoteTextIndex
+from clinic.dao.rw_lock import RWLock
+from clinic.dao.durability import STRICT_DURABILITY
+from clinic.dao.recovery import RECORD_MAGIC, LOG_MAGIC, MAGIC_LENGTH, frame, scan_frames, read_file, replace_file, keep_damaged
 from clinic.note import Note
 
+# logs of the older format frame each mutation by its length only
+LEGACY_FRAME_HEADER = struct.Struct('<I')
+
+# log size (in bytes) under which the log is never compacted
+COMPACTION_THRESHOLD = 64 * 1024
+
+def scan_legacy_frames(data):
+	''' returns the data of the frames of a log of the older format, none damaged, and where they end '''
+
+	log_frames = []
+	position = 0
+	while position + LEGACY_FRAME_HEADER.size <= len(data):
+		(length,) = LEGACY_FRAME_HEADER.unpack_from(data, position)
+		end = position + LEGACY_FRAME_HEADER.size + length
+		if end > len(data):
+			break
+		log_frames.append(data[position + LEGACY_FRAME_HEADER.size:end])
+		position = end
+	return log_frames, 0, position
+
 class NoteDAOPickle(NoteDAO):
-	''' DAO class that handles note persistence '''
+	''' DAO class that handles note persistence
+
+		Each patient record has its own reader-writer lock, so notes of
+		different patients are written at the same time. Mutations are kept
+		pending until the durability policy flushes them to the log.
+	'''
 
 
-	def __init__(self, phn=None, autosave=False):
+	def __init__(self, phn=None, autosave=False, durability=None):
 		''' constructs a DAO for notes '''
 
+		self.lock = RWLock()
 		self.counter = 0
+		self.text_index = NoteTextIndex()
+
+		# records are many, those without a policy share the strict one
+		if durability is None:
+			durability = STRICT_DURABILITY
+		self.durability = durability
+		self.pending = []
 
 		self.autosave = autosave
 		if self.autosave:
 			records_directory = 'clinic/records'
 			filename = str(phn) + '.dat'
 			self.filename = os.path.join(records_directory, filename)
+			self.log_filename = os.path.join(records_directory, str(phn) + '.log')
+			# notes are only read from the file when first needed
+			self.notes = None
+		else:
+			self.notes = {}
+
+	def load_notes(self, loaded=None):
+		''' loads the notes from the record file if not loaded yet
+
+			Notes read ahead by a worker are given as loaded: the notes,
+			whether they must be written back, and the sizes of the
+			snapshot and of the log.
+		'''
+
+		if self.notes is not None:
+			return
+		with self.lock.writing():
+			# another thread may have loaded them while this one waited
+			if self.notes is not None:
+				return
+
+			if loaded is None:
+				notes, rewrite = self.read_notes()
+			else:
+				notes, rewrite, self.snapshot_size, self.log_size = loaded
+			if notes:
+				self.counter = next(reversed(notes))
+
+			for note in notes.values():
+				self.text_index.add(note.code, note.text)
+
+			# only publish the notes once they are complete, readers check them without the lock
+			self.notes = notes
+
+			# write the intact notes back when some were damaged
+			if rewrite:
+				self.save_notes()
+
+	def read_notes(self):
+		''' reads the notes of the record file and its log, returns them and whether they must be written back '''
+
+		# the file keeps the notes in code order, each in its own checksummed frame
+		notes = {}
+		data = read_file(self.filename)
+		damaged = 0
+		if data.startswith(RECORD_MAGIC):
+			note_frames, damaged, intact_end = scan_frames(data, MAGIC_LENGTH)
+			# the record file is replaced whole, even its last frame cannot be torn
+			damaged += intact_end < len(data)
+			for note_frame in note_frames:
+				try:
+					note = loads(note_frame)
+				except Exception:
+					damaged += 1
+					continue
+				notes[note.code] = note
+		elif data:
+			# files of the older format keep a plain list of notes, without checksums
 			try:
-				with open(self.filename, 'rb') as file:
-					self.notes = load(file)
-					self.counter = self.notes[-1].code
-			except:
-				self.notes = []
+				for note in loads(data):
+					notes[note.code] = note
+			except Exception:
+				damaged += 1
+		self.snapshot_size = len(data)
+		if damaged:
+			keep_damaged(self.filename, damaged)
+
+		# then apply the mutations logged after the file was written
+		rewrite_log = self.replay_log(notes)
+		return notes, damaged > 0 or rewrite_log
+
+	def replay_log(self, notes):
+		''' applies the intact logged mutations to some notes, returns whether the log must be written back '''
+
+		data = read_file(self.log_filename)
+		legacy = data and not data.startswith(LOG_MAGIC)
+		if legacy:
+			log_frames, damaged, intact_end = scan_legacy_frames(data)
 		else:
-			self.notes = []
+			log_frames, damaged, intact_end = scan_frames(data, MAGIC_LENGTH)
+
+		for log_frame in log_frames:
+			try:
+				operation, value = loads(log_frame)
+			except Exception:
+				damaged += 1
+				continue
+			if operation == 'put':
+				notes[value.code] = value
+			elif operation == 'delete':
+				notes.pop(value, None)
+
+		if damaged:
+			keep_damaged(self.log_filename, damaged)
+		elif intact_end < len(data) and not legacy:
+			# drop a torn last mutation so that new ones are appended after intact ones
+			with open(self.log_filename, 'r+b') as file:
+				file.truncate(intact_end)
+		self.log_size = min(intact_end, len(data))
+		return damaged > 0 or legacy
+
+	def append_log(self, operation, value):
+		''' adds one mutation to the pending mutations of the log '''
+
+		self.pending.append(frame(dumps((operation, value))))
+		self.durability.write(self)
+
+	def flush_pending(self, sync=True):
+		''' appends the pending mutations to the log, compacting it when it outgrows the file '''
+
+		with self.lock.writing():
+			if not self.pending:
+				return
+			data = b''.join(self.pending)
+			self.pending = []
+			self.log_size += self.write_log(data, sync)
+
+			if self.log_size > max(COMPACTION_THRESHOLD, self.snapshot_size):
+				self.save_notes()
+
+	def write_log(self, data, sync):
+		''' appends framed mutations to the log, returns the number of bytes written '''
+
+		if not self.log_size:
+			data = LOG_MAGIC + data
+		with open(self.log_filename, 'ab') as file:
+			file.write(data)
+			if sync:
+				file.flush()
+				os.fsync(file.fileno())
+		return len(data)
+
+	def save_notes(self):
+		''' saves all notes to the record file and empties the log '''
+
+		note_frames = [frame(dumps(note)) for note in self.notes.values()]
+		self.snapshot_size = replace_file(self.filename, [RECORD_MAGIC] + note_frames)
+
+		if os.path.exists(self.log_filename):
+			os.remove(self.log_filename)
+		self.log_size = 0
 
 	def search_note(self, key):
 		''' searches a note in a patient record '''
 
-		for note in self.notes:
-			if note.code == key:
-				return note
-		return None
+		self.load_notes()
+
+		with self.lock.reading():
+			return self.notes.get(key)
  
 	def create_note(self, text):
 		''' creates a note in a patient record '''
 
-		self.counter += 1
-		current_time = datetime.datetime.now()
-		new_note = Note(self.counter, text, current_time)
-		self.notes.append(new_note)
+		self.load_notes()
 
-		# if persistence is set, save all notes
-		if self.autosave:
-			with open(self.filename, 'wb') as file:
-				dump(self.notes, file)
+		with self.lock.writing():
+			self.counter += 1
+			current_time = datetime.datetime.now()
+			new_note = Note(self.counter, text, current_time)
+			self.notes[new_note.code] = new_note
+			self.text_index.add(new_note.code, new_note.text)
+
+			# if persistence is set, log the new note
+			if self.autosave:
+				self.append_log('put', new_note)
 
-		return new_note
+			return new_note
 
 	def retrieve_notes(self, search_string):
 		''' retrieves notes by text in a patient record '''
 
-		# retrieve existing notes
-		retrieved_notes = []
-		for note in self.notes:
-			if search_string in note.text:
-				retrieved_notes.append(note)
-		return retrieved_notes
+		self.load_notes()
+
+		with self.lock.reading():
+			# only the notes found by the index can contain the search string
+			candidates = self.text_index.candidates(search_string)
+
+			if candidates is None:
+				notes = self.notes.values()
+			elif not candidates:
+				return []
+			else:
+				# codes are given in increasing order, the same order as the notes
+				notes = [self.notes[code] for code in sorted(candidates)]
+
+			# retrieve existing notes
+			retrieved_notes = []
+			for note in notes:
+				if search_string in note.text:
+					retrieved_notes.append(note)
+			return retrieved_notes
  
 	def update_note(self, key, new_text):
 		''' updates a note in a patient record '''
 
-		updated_note = None
+		self.load_notes()
 
-		# first, search the note by code
-		for note in self.notes:
-			if note.code == key:
-				updated_note = note
-				break
+		with self.lock.writing():
+			# first, search the note by code
+			updated_note = self.notes.get(key)
 
-		# note does not exist
-		if not updated_note:
-			return False
+			# note does not exist
+			if not updated_note:
+				return False
 
-		# note exists, update fields
-		updated_note.text = new_text
-		updated_note.timestamp = datetime.datetime.now()
+			# note exists, update fields
+			updated_note.text = new_text
+			updated_note.timestamp = datetime.datetime.now()
+			self.text_index.add(updated_note.code, updated_note.text)
 
-		# if persistence is set, save all notes
-		if self.autosave:
-			with open(self.filename, 'wb') as file:
-				dump(self.notes, file)
+			# if persistence is set, log the updated note
+			if self.autosave:
+				self.append_log('put', updated_note)
 
-		return True
+			return True
 
 	def delete_note(self, key):
 		''' deletes a note in a patient record '''
 
-		note_to_delete_index = -1
+		self.load_notes()
 
-		# first, search the note by code
-		for i in range(len(self.notes)):
-			if self.notes[i].code == key:
-				note_to_delete_index = i
-				break
+		with self.lock.writing():
+			# note does not exist
+			if key not in self.notes:
+				return False
 
-		# note does not exist
-		if note_to_delete_index == -1:
-			return False
+			# note exists, delete note
+			del self.notes[key]
+			self.text_index.remove(key)
 
-		# note exists, delete note
-		self.notes.pop(note_to_delete_index)
+			# if persistence is set, log the deletion
+			if self.autosave:
+				self.append_log('delete', key)
 
-		# if persistence is set, save all notes
-		if self.autosave:
-			with open(self.filename, 'wb') as file:
-				dump(self.notes, file)
-
-		return True
+			return True
  
 	def list_notes(self):
 		''' lists all notes from a patient record '''
 
- 		# list existing notes
-		notes_list = []
-		for i in range(-1, -len(self.notes)-1, -1):
-			notes_list.append(self.notes[i])
-		return notes_list
+		self.load_notes()
+
+		with self.lock.reading():
+	 		# list existing notes
+			notes_list = []
+			for note in reversed(self.notes.values()):
+				notes_list.append(note)
+			return notes_list
@@ -0,0 +1,43 @@
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.note_segment_store import LOG, SNAPSHOT, snapshot_data
+
+class NoteDAOSegment(NoteDAOPickle):
+	''' DAO class that handles the notes of a patient kept in the shared segment store
+
+		Notes are loaded, logged and compacted like those of the record
+		files, but flushes are appended to the store as extents, and the
+		store itself is synced by the durability policy.
+	'''
+
+	def __init__(self, phn, store, durability=None):
+		''' constructs a DAO for the notes of a patient '''
+
+		super().__init__(durability=durability)
+		self.phn = phn
+		self.store = store
+		self.autosave = True
+
+		# notes are only read from the store when first needed
+		self.notes = None
+
+	def read_notes(self):
+		''' reads the notes of the patient's extents, returns them and whether they must be written back '''
+
+		notes, self.snapshot_size, self.log_size, damaged = self.store.read_notes(self.phn)
+		return notes, damaged > 0
+
+	def write_log(self, data, sync):
+		''' appends framed mutations to the store, returns the number of bytes written '''
+
+		self.store.write(self.phn, LOG, data)
+		self.durability.write(self.store)
+		return len(data)
+
+	def save_notes(self):
+		''' writes all notes as a snapshot extent, superseding the earlier extents '''
+
+		data = snapshot_data(self.notes.values())
+		self.store.write(self.phn, SNAPSHOT, data)
+		self.durability.write(self.store)
+		self.snapshot_size = len(data)
+		self.log_size = 0
@@ -0,0 +1,95 @@
+import datetime
+from clinic.dao.note_dao import NoteDAO
+from clinic.note import Note
+
+class NoteDAOSQLite(NoteDAO):
+	''' DAO class that handles note persistence in a SQLite database '''
+
+	def __init__(self, connect, phn, lock):
+		''' constructs a DAO for the notes of one patient, sharing the patient DAO's connections and lock '''
+
+		self.connect = connect
+		self.phn = phn
+		self.lock = lock
+
+	def make_note(self, row):
+		''' builds a note from a notes table row '''
+
+		code, text, timestamp = row
+		return Note(code, text, datetime.datetime.fromisoformat(timestamp))
+
+	def load_notes(self):
+		''' notes are read from the database on each operation, nothing to load '''
+
+		pass
+
+	def search_note(self, key):
+		''' searches a note in a patient record '''
+
+		with self.lock.reading():
+			connection = self.connect()
+			row = connection.execute(
+				'SELECT code, text, timestamp FROM notes WHERE phn = ? AND code = ?',
+				(self.phn, key)).fetchone()
+			if row is None:
+				return None
+			return self.make_note(row)
+
+	def create_note(self, text):
+		''' creates a note in a patient record '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			current_time = datetime.datetime.now()
+			with connection:
+				row = connection.execute(
+					'SELECT COALESCE(MAX(code), 0) + 1 FROM notes WHERE phn = ?',
+					(self.phn,)).fetchone()
+				code = row[0]
+				connection.execute(
+					'INSERT INTO notes (phn, code, text, timestamp) VALUES (?, ?, ?, ?)',
+					(self.phn, code, text, current_time.isoformat()))
+			return Note(code, text, current_time)
+
+	def retrieve_notes(self, search_string):
+		''' retrieves notes by text in a patient record '''
+
+		with self.lock.reading():
+			connection = self.connect()
+			rows = connection.execute(
+				'SELECT code, text, timestamp FROM notes WHERE phn = ? AND instr(text, ?) > 0 ORDER BY code',
+				(self.phn, search_string))
+			return [self.make_note(row) for row in rows]
+
+	def update_note(self, key, new_text):
+		''' updates a note in a patient record '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			current_time = datetime.datetime.now()
+			with connection:
+				cursor = connection.execute(
+					'UPDATE notes SET text = ?, timestamp = ? WHERE phn = ? AND code = ?',
+					(new_text, current_time.isoformat(), self.phn, key))
+			return cursor.rowcount > 0
+
+	def delete_note(self, key):
+		''' deletes a note in a patient record '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			with connection:
+				cursor = connection.execute(
+					'DELETE FROM notes WHERE phn = ? AND code = ?',
+					(self.phn, key))
+			return cursor.rowcount > 0
+
+	def list_notes(self):
+		''' lists all notes from a patient record '''
+
+		with self.lock.reading():
+			connection = self.connect()
+			rows = connection.execute(
+				'SELECT code, text, timestamp FROM notes WHERE phn = ? ORDER BY code DESC',
+				(self.phn,))
+			return [self.make_note(row) for row in rows]
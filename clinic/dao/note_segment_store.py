@@ -0,0 +1,375 @@
+''' single-directory store of the notes of every patient, in a few large append-only segment files
+
+Each flush of a patient's notes is appended to the active segment as one
+extent: a checksummed frame holding the PHN, the kind of the extent and the
+framed notes or mutations. An index maps every PHN to the extents holding its
+notes, from its last snapshot extent on. The index is checkpointed when the
+active segment fills up and when the store is closed; the extents appended
+after the checkpoint are found again by scanning the end of the segments.
+
+usage: python -m clinic.dao.note_segment_store [--keep]
+
+migrates the per-patient record files of clinic/records to segment files,
+removing the record files unless --keep is given.
+'''
+import argparse
+import logging
+import os
+import re
+import shutil
+import struct
+import threading
+from pickle import loads, dumps
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.recovery import FRAME_HEADER, MAGIC_LENGTH, SEGMENT_MAGIC, INDEX_MAGIC, frame, frame_end, scan_frames, \
+	scan_frame_positions, read_file, replace_file, sync_directory
+
+RECORDS_DIRECTORY = os.path.join('clinic', 'records')
+INDEX_FILENAME = 'notes.idx'
+SEGMENT_PATTERN = re.compile(r'notes-(\d{6})\.seg$')
+
+# PHN and kind at the start of the data of each extent
+EXTENT_HEADER = struct.Struct('<qB')
+
+# a log extent holds framed mutations, a snapshot extent every note of the patient
+LOG = 0
+SNAPSHOT = 1
+
+# size (in bytes) after which a new segment is started
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# open store of each records directory
+open_stores = {}
+
+def segment_store(directory=RECORDS_DIRECTORY):
+	''' returns the open store of a records directory, or None when its notes are kept one file per patient '''
+
+	return open_stores.get(directory)
+
+def has_segments(directory=RECORDS_DIRECTORY):
+	''' checks whether the notes of a records directory were moved to segment files '''
+
+	return os.path.exists(os.path.join(directory, INDEX_FILENAME))
+
+def replay_extents(extents):
+	''' returns the notes of a patient's (kind, data) extents, the size of its snapshot
+		and of its later log extents, and the number of damaged frames '''
+
+	notes = {}
+	snapshot_size = log_size = 0
+	damaged = 0
+	for kind, data in extents:
+		note_frames, frame_damage, intact_end = scan_frames(data)
+		damaged += frame_damage + (intact_end < len(data))
+		if kind == SNAPSHOT:
+			notes = {}
+			snapshot_size = len(data)
+			log_size = 0
+		else:
+			log_size += len(data)
+		for note_frame in note_frames:
+			try:
+				value = loads(note_frame)
+			except Exception:
+				damaged += 1
+				continue
+			if kind == SNAPSHOT:
+				notes[value.code] = value
+			elif value[0] == 'put':
+				notes[value[1].code] = value[1]
+			elif value[0] == 'delete':
+				notes.pop(value[1], None)
+	return notes, snapshot_size, log_size, damaged
+
+def valid_extent(data):
+	''' checks whether the data of a frame found past damage is an extent, rather than a note framed inside one '''
+
+	if len(data) < EXTENT_HEADER.size:
+		return False
+	phn, kind = EXTENT_HEADER.unpack_from(data)
+	if kind not in (LOG, SNAPSHOT) or phn <= 0:
+		return False
+	# the rest must be whole note frames, only a snapshot of no notes is empty
+	note_data = data[EXTENT_HEADER.size:]
+	if not note_data:
+		return kind == SNAPSHOT
+	note_frames, damaged, intact_end = scan_frames(note_data)
+	return not damaged and intact_end == len(note_data)
+
+def snapshot_data(notes):
+	''' returns the data of a snapshot extent of some notes '''
+
+	return b''.join([frame(dumps(note)) for note in notes])
+
+class NoteSegmentStore():
+	''' the notes of every patient of a records directory, in append-only segment files
+
+		Extents are written to the active segment and synced when the
+		durability policy flushes the store. Once a segment is full, the
+		sealed segments that are mostly superseded are collected: the notes
+		they still hold are written again as snapshots, and they are removed.
+	'''
+
+	def __init__(self, directory=RECORDS_DIRECTORY, segment_size=SEGMENT_SIZE):
+		''' opens the store of a directory, creating it if needed '''
+
+		self.directory = directory
+		self.index_filename = os.path.join(directory, INDEX_FILENAME)
+		self.segment_size = segment_size
+		self.lock = threading.Lock()
+
+		# PHN -> (segment, offset, length) of its extents, from its last snapshot on
+		self.extents = {}
+
+		# segment -> its size, and the bytes of its extents still in use
+		self.sizes = {}
+		self.live = {}
+
+		self.unsynced = False
+		os.makedirs(directory, exist_ok=True)
+		self.open_segments()
+		open_stores[directory] = self
+
+	def segment_filename(self, segment):
+		''' returns the name of a segment file '''
+
+		return os.path.join(self.directory, 'notes-%06d.seg' % (segment))
+
+	def open_segments(self):
+		''' reads the index and the extents appended after it, and opens the active segment '''
+
+		segments = sorted(int(match.group(1)) for match in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if match)
+		checkpoint = self.read_index(segments)
+		if checkpoint is None:
+			start_segment, start_position = (segments[0] if segments else 0), MAGIC_LENGTH
+		else:
+			start_segment, start_position, self.extents = checkpoint
+
+		for segment in segments:
+			if segment < start_segment:
+				self.sizes[segment] = os.path.getsize(self.segment_filename(segment))
+			else:
+				position = start_position if segment == start_segment else MAGIC_LENGTH
+				self.sizes[segment] = self.scan_segment(segment, position, segment == segments[-1])
+
+		self.live = dict.fromkeys(segments, 0)
+		for extents in self.extents.values():
+			for segment, offset, length in extents:
+				self.live[segment] += length
+
+		if segments:
+			self.active = segments[-1]
+			self.active_file = open(self.segment_filename(self.active), 'ab')
+		else:
+			self.start_segment(1)
+		if checkpoint is None:
+			self.write_index()
+
+	def read_index(self, segments):
+		''' returns the active segment, its size and the extents of the index, or None if it cannot be used '''
+
+		data = read_file(self.index_filename)
+		if not data:
+			return None
+		if data.startswith(INDEX_MAGIC) and frame_end(data, MAGIC_LENGTH) is not None:
+			segment, size, extents = loads(data[MAGIC_LENGTH + FRAME_HEADER.size:])
+			# the index is only written once the segments are synced, they cannot be shorter
+			referenced = {extent[0] for patient_extents in extents.values() for extent in patient_extents}
+			if segment in segments and referenced.issubset(segments) \
+				and os.path.getsize(self.segment_filename(segment)) >= size:
+				return segment, size, extents
+		logger.warning("%s: damaged or outdated index, the segments are scanned again", self.index_filename)
+		return None
+
+	def scan_segment(self, segment, position, last):
+		''' indexes the extents of a segment from a position, returns where its intact extents end '''
+
+		filename = self.segment_filename(segment)
+		data = read_file(filename)
+		if not data.startswith(SEGMENT_MAGIC):
+			logger.warning("%s: not a segment file, it is skipped", filename)
+			return len(data)
+
+		positions, damaged, intact_end = scan_frame_positions(data, position, valid_extent)
+		for start, end in positions:
+			phn, kind = EXTENT_HEADER.unpack_from(data, start + FRAME_HEADER.size)
+			extent = (segment, start, end - start)
+			if kind == SNAPSHOT:
+				self.extents[phn] = [extent]
+			else:
+				self.extents.setdefault(phn, []).append(extent)
+
+		# damaged extents stay in the segment, only the intact ones are read
+		if damaged:
+			logger.warning("%s: skipped %d damaged extents", filename, damaged)
+		if intact_end < len(data) and last:
+			# drop a torn last extent, new ones go after the intact ones
+			with open(filename, 'r+b') as file:
+				file.truncate(intact_end)
+			return intact_end
+		return len(data)
+
+	def start_segment(self, segment):
+		''' makes a new segment the active one '''
+
+		self.active = segment
+		self.active_file = open(self.segment_filename(segment), 'wb')
+		self.active_file.write(SEGMENT_MAGIC)
+		self.active_file.flush()
+		self.sizes[segment] = MAGIC_LENGTH
+		self.live[segment] = 0
+		self.unsynced = True
+
+	def write_index(self):
+		''' syncs the active segment, then checkpoints the index of every extent '''
+
+		self.sync()
+		replace_file(self.index_filename, [INDEX_MAGIC, frame(dumps((self.active, self.sizes[self.active], self.extents)))])
+
+	def sync(self):
+		''' syncs what was written to the active segment '''
+
+		if self.unsynced:
+			os.fsync(self.active_file.fileno())
+			self.unsynced = False
+
+	def read_extents(self, phn):
+		''' returns the (kind, data) extents of a patient, without the damaged ones, and how many were damaged '''
+
+		extents = []
+		damaged = 0
+		for segment, offset, length in self.extents.get(phn, ()):
+			with open(self.segment_filename(segment), 'rb') as file:
+				file.seek(offset)
+				data = file.read(length)
+			if frame_end(data, 0) != length:
+				damaged += 1
+				continue
+			extent_phn, kind = EXTENT_HEADER.unpack_from(data, FRAME_HEADER.size)
+			extents.append((kind, data[FRAME_HEADER.size + EXTENT_HEADER.size:]))
+		if damaged:
+			logger.warning("%s: skipped %d damaged extents of the patient with PHN %d", self.directory, damaged, phn)
+		return extents, damaged
+
+	def append_extent(self, phn, kind, data):
+		''' appends an extent to the active segment, without syncing it '''
+
+		data = frame(EXTENT_HEADER.pack(phn, kind) + data)
+		extent = (self.active, self.sizes[self.active], len(data))
+		self.active_file.write(data)
+		# readers open the segment on their own, the extent must reach the file
+		self.active_file.flush()
+		self.unsynced = True
+		self.sizes[self.active] += len(data)
+		self.live[self.active] += len(data)
+
+		if kind == SNAPSHOT:
+			for segment, offset, length in self.extents.get(phn, ()):
+				self.live[segment] -= length
+			self.extents[phn] = [extent]
+		else:
+			self.extents.setdefault(phn, []).append(extent)
+
+	def read_notes(self, phn):
+		''' returns the notes of a patient, the size of its snapshot and of its later log extents,
+			and the number of damaged extents and frames '''
+
+		with self.lock:
+			extents, damaged = self.read_extents(phn)
+		notes, snapshot_size, log_size, frame_damage = replay_extents(extents)
+		return notes, snapshot_size, log_size, damaged + frame_damage
+
+	def write(self, phn, kind, data):
+		''' appends a log or snapshot extent of a patient, it is synced when the store is flushed '''
+
+		with self.lock:
+			self.append_extent(phn, kind, data)
+			if self.sizes[self.active] >= self.segment_size:
+				self.sync()
+				self.active_file.close()
+				self.start_segment(self.active + 1)
+				self.collect_garbage()
+
+	def collect_garbage(self):
+		''' writes the notes still held by mostly superseded sealed segments again, then removes them '''
+
+		collected = [segment for segment in sorted(self.sizes)
+			if segment != self.active and self.live.get(segment, 0) * 2 < self.sizes[segment]]
+		for segment in collected:
+			phns = [phn for phn, extents in self.extents.items() if any(extent[0] == segment for extent in extents)]
+			for phn in phns:
+				extents, damaged = self.read_extents(phn)
+				notes, snapshot_size, log_size, frame_damage = replay_extents(extents)
+				self.append_extent(phn, SNAPSHOT, snapshot_data(notes.values()))
+
+		# the segments are only removed once the index no longer needs them
+		self.write_index()
+		for segment in collected:
+			os.remove(self.segment_filename(segment))
+			del self.sizes[segment]
+			self.live.pop(segment, None)
+
+	def flush_pending(self, sync=True):
+		''' syncs the extents written so far if asked, for the durability policy '''
+
+		if sync:
+			with self.lock:
+				self.sync()
+
+	def close(self):
+		''' checkpoints the index and closes the active segment '''
+
+		with self.lock:
+			if open_stores.get(self.directory) is self:
+				del open_stores[self.directory]
+			self.write_index()
+			self.active_file.close()
+
+def migrate(keep=False):
+	''' moves the notes of the per-patient record files to segment files, returns the number of patients moved '''
+
+	directory = RECORDS_DIRECTORY
+	phns = sorted({int(name.split('.')[0]) for name in os.listdir(directory)
+		if re.match(r'\d+\.(dat|log)$', name)})
+
+	# the segments are built aside, the index is moved in last: a directory is
+	# only seen as migrated once every patient was moved
+	build_directory = os.path.join(directory, 'segments.tmp')
+	shutil.rmtree(build_directory, ignore_errors=True)
+	store = NoteSegmentStore(build_directory)
+	for phn in phns:
+		note_dao = NoteDAOPickle(phn, autosave=True)
+		note_dao.load_notes()
+		store.write(phn, SNAPSHOT, snapshot_data(note_dao.notes.values()))
+	store.close()
+
+	names = sorted(name for name in os.listdir(build_directory) if SEGMENT_PATTERN.match(name))
+	for name in names + [INDEX_FILENAME]:
+		os.replace(os.path.join(build_directory, name), os.path.join(directory, name))
+	sync_directory(os.path.join(directory, INDEX_FILENAME))
+	shutil.rmtree(build_directory)
+
+	if not keep:
+		for phn in phns:
+			for extension in ('.dat', '.log'):
+				filename = os.path.join(directory, str(phn) + extension)
+				if os.path.exists(filename):
+					os.remove(filename)
+	return len(phns)
+
+def main():
+	parser = argparse.ArgumentParser(description='Moves the per-patient record files of clinic/records to segment files.')
+	parser.add_argument('--keep', action='store_true', help='keep the per-patient record files')
+	args = parser.parse_args()
+
+	logging.basicConfig(format='%(message)s')
+	if has_segments():
+		print('%s: the notes are already kept in segment files' % (RECORDS_DIRECTORY))
+		return
+	count = migrate(keep=args.keep)
+	print('%s: moved the notes of %d patients to segment files' % (RECORDS_DIRECTORY, count))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,81 @@
+import re
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+class NoteTextIndex():
+	''' inverted index from the tokens of the notes' texts to the notes' codes '''
+
+	def __init__(self):
+		''' constructs an empty index '''
+
+		# token -> set of codes, and code -> tokens to unindex updated or deleted notes
+		self.postings = {}
+		self.note_tokens = {}
+
+	def add(self, code, text):
+		''' indexes a note's text, replacing the text previously indexed for the same code '''
+
+		self.remove(code)
+		tokens = set(TOKEN_PATTERN.findall(text))
+		self.note_tokens[code] = tokens
+		for token in tokens:
+			codes = self.postings.get(token)
+			if codes is None:
+				self.postings[token] = {code}
+			else:
+				codes.add(code)
+
+	def remove(self, code):
+		''' removes a note's code from the index '''
+
+		tokens = self.note_tokens.pop(code, None)
+		if tokens is None:
+			return
+		for token in tokens:
+			codes = self.postings[token]
+			codes.discard(code)
+			if not codes:
+				del self.postings[token]
+
+	def candidates(self, search_string):
+		''' returns the codes of the notes that may contain the search string,
+			or None when the search string has no token to narrow the search '''
+
+		# a token of the search string is whole in the text unless it touches
+		# the start or the end of the search string
+		whole_tokens = []
+		partial_tokens = []
+		for match in TOKEN_PATTERN.finditer(search_string):
+			at_start = match.start() == 0
+			at_end = match.end() == len(search_string)
+			if at_start or at_end:
+				partial_tokens.append((match.group(), at_start, at_end))
+			else:
+				whole_tokens.append(match.group())
+
+		if whole_tokens:
+			postings = []
+			for token in whole_tokens:
+				codes = self.postings.get(token)
+				if codes is None:
+					return set()
+				postings.append(codes)
+			postings.sort(key=len)
+			return postings[0].intersection(*postings[1:])
+
+		if not partial_tokens:
+			return None
+
+		# look the longest partial token up in the vocabulary
+		fragment, at_start, at_end = max(partial_tokens, key=lambda partial: len(partial[0]))
+		candidates = set()
+		for token, codes in self.postings.items():
+			if at_start and at_end:
+				matches = fragment in token
+			elif at_start:
+				matches = token.endswith(fragment)
+			else:
+				matches = token.startswith(fragment)
+			if matches:
+				candidates.update(codes)
+		return candidates
@@ -1,4 +1,11 @@
 from abc import ABC, abstractmethod
+
+# number of patients in a page of results
+PAGE_SIZE = 100
+
+# number of patients suggested while a name is typed
+SUGGESTION_LIMIT = 10
+
 class PatientDAO(ABC):
     @abstractmethod
     def search_patient(self, key):
@@ -7,6 +14,9 @@ class PatientDAO(ABC):
     def create_patient(self, patient):
         pass
     @abstractmethod
+    def create_patients(self, patients):
+        pass
+    @abstractmethod
     def retrieve_patients(self, search_string):
         pass
     @abstractmethod
@@ -18,4 +28,13 @@ class PatientDAO(ABC):
     @abstractmethod
     def list_patients(self):
         pass
+    @abstractmethod
+    def iter_patients(self, after_phn=None, limit=None):
+        pass
+    @abstractmethod
+    def retrieve_patients_page(self, search_string, after_phn=None, limit=PAGE_SIZE):
+        pass
+    @abstractmethod
+    def suggest_patients(self, prefix, limit=SUGGESTION_LIMIT):
+        pass
 
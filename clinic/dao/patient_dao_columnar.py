@@ -0,0 +1,147 @@
+import os
+import logging
+import threading
+from itertools import islice
+from clinic.dao.patient_dao_json import PatientDAOJSON, COMPACTION_THRESHOLD
+from clinic.dao.patient_table import PatientTable, MERGE_THRESHOLD
+from clinic.dao.checkpoint import read_checkpoint, write_checkpoint, file_stamp
+from clinic.dao.name_prefix_index import NamePrefixIndex
+from clinic.dao.rw_lock import RWLock
+from clinic.dao.durability import Durability
+from clinic.exception.damaged_record_exception import DamagedRecordException
+
+logger = logging.getLogger(__name__)
+
+class PatientDAOColumnar(PatientDAOJSON):
+	''' DAO class that keeps the patients in a column-oriented table
+
+		Each field is packed in a column of its own and patients are only
+		built when returned, so a large registry takes a fraction of the
+		memory. Names are searched by scanning their packed column. The
+		files are those of the JSON DAO. When checkpoint is set, the table is
+		also written as a binary checkpoint when the journal is compacted and
+		when the DAO is closed, and read back in one go while the patients file
+		was not replaced since. PHNs must be integers.
+	'''
+
+	def __init__(self, autosave=False, journal=False, compaction_threshold=COMPACTION_THRESHOLD, durability=None,
+			checkpoint=False):
+		''' constructs a DAO for patients '''
+
+		self.autosave = autosave
+		self.journal = journal
+		self.checkpoint = checkpoint
+		self.compaction_threshold = compaction_threshold
+		self.lock = RWLock()
+
+		if durability is None:
+			durability = Durability()
+		self.durability = durability
+		self.snapshot_dirty = False
+		self.patients = PatientTable(durability)
+
+		# the table scans its name column itself, it serves as the name index
+		self.name_index = self.patients
+
+		# the prefix index needs every name, it is only built for the first suggestion
+		self.prefix_index = None
+		self.index_lock = threading.Lock()
+
+		if self.autosave:
+			patients_file_directory = 'clinic'
+			self.filename = os.path.join(patients_file_directory, 'patients.json')
+			self.journal_filename = os.path.join(patients_file_directory, 'patients.journal')
+			self.old_journal_filename = self.journal_filename + '.old'
+			self.checkpoint_filename = os.path.join(patients_file_directory, 'patients.ckpt')
+			self.load_snapshot()
+
+			if self.journal:
+				self.open_journal()
+
+			# sort the loaded PHNs once, rather than as they were added; the few replayed over a checkpoint can wait
+			if len(self.patients.recent) > MERGE_THRESHOLD:
+				self.patients.merge_recent()
+
+			# a missing or stale checkpoint is written again, replaying the journal over it again is harmless
+			if self.checkpoint and not self.loaded_checkpoint:
+				self.write_checkpoint(self.all_patients())
+
+	def put_patient(self, patient):
+		''' puts a patient in the table and the prefix index '''
+
+		# the index goes first, a patient it refuses is left out of the table
+		if self.prefix_index is not None:
+			self.prefix_index.add(patient.phn, patient.name)
+		self.patients[patient.phn] = patient
+
+	def pop_patient(self, key):
+		''' removes a patient from the table and the prefix index '''
+
+		self.patients.pop(key)
+		if self.prefix_index is not None:
+			self.prefix_index.remove(key)
+
+	def get_prefix_index(self):
+		''' returns the name prefix index, building it the first time '''
+
+		# readers may ask at the same time, only one of them builds it
+		with self.index_lock:
+			if self.prefix_index is None:
+				self.prefix_index = NamePrefixIndex(self.patients.names())
+		return self.prefix_index
+
+	def load_snapshot(self):
+		''' loads the patients from the checkpoint if it mirrors the patients file, else from the patients file '''
+
+		self.loaded_checkpoint = False
+		self.checkpoint_stamp = None
+		if self.checkpoint and os.path.exists(self.checkpoint_filename):
+			try:
+				patients, stamp = read_checkpoint(self.checkpoint_filename, self.durability)
+			except DamagedRecordException as exception:
+				logger.warning("%s, reading the patients file instead", exception)
+				stamp = None
+			# another backend may have replaced the patients file since
+			if stamp == file_stamp(self.filename):
+				self.patients = self.name_index = patients
+				self.loaded_checkpoint = True
+				self.checkpoint_stamp = stamp
+				return
+		super().load_snapshot()
+
+	def write_checkpoint(self, patients):
+		''' writes the patients, a view of a table, to the checkpoint of the current patients file '''
+
+		self.checkpoint_stamp = file_stamp(self.filename)
+		write_checkpoint(self.checkpoint_filename, patients.table, self.checkpoint_stamp)
+
+	def snapshot_compacted(self, patients):
+		''' writes the checkpoint of the patients file a compaction wrote '''
+
+		if self.checkpoint:
+			self.write_checkpoint(patients)
+
+	def close(self):
+		''' writes the pending changes, and the checkpoint if the patients file was written since the last one '''
+
+		super().close()
+		with self.lock.writing():
+			if self.autosave and self.checkpoint and self.checkpoint_stamp != file_stamp(self.filename):
+				self.write_checkpoint(self.all_patients())
+
+	def all_patients(self):
+		''' returns every patient, to be written to a snapshot '''
+
+		# copying the columns is cheaper than building every patient up front
+		return self.patients.copy().values()
+
+	def retrieve_patients(self, search_string):
+		''' retrieves patients by text '''
+
+		with self.lock.reading():
+			return [self.patients.patient(row) for row in self.patients.search_rows(search_string)]
+
+	def patients_page(self, after_phn, limit):
+		''' returns up to limit patients in PHN order after a given PHN, under the read lock '''
+
+		return [self.patients.patient(row) for row in islice(self.patients.sorted_rows(after_phn), limit)]
@@ -1,97 +1,387 @@
 import os
-from clinic.dao.patient_dao import PatientDAO
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from heapq import nsmallest
+from clinic.dao.patient_dao import PatientDAO, PAGE_SIZE, SUGGESTION_LIMIT
 from clinic.patient import Patient
 from clinic.dao.patient_encoder import PatientEncoder
 from clinic.dao.patient_decoder import PatientDecoder
+from clinic.dao.name_trigram_index import NameTrigramIndex
+from clinic.dao.name_prefix_index import NamePrefixIndex
+from clinic.dao.rw_lock import RWLock
+from clinic.dao.durability import Durability
+from clinic.dao.recovery import seal_line, scan_lines, read_file, replace_file, keep_damaged
 from json import loads, dumps
 
+logger = logging.getLogger(__name__)
+
+# journal size (in bytes) after which the journal is folded into the snapshot
+COMPACTION_THRESHOLD = 1024 * 1024
+
 class PatientDAOJSON(PatientDAO):
-	''' DAO class that handles patient persistence '''
+	''' DAO class that handles patient persistence
+
+		The registry is guarded by a reader-writer lock: lookups and searches
+		run in parallel, changes and the writes to the files run one at a time.
+		Changes are kept pending until the durability policy flushes them.
+	'''
 
-	def __init__(self, autosave=False):
+	def __init__(self, autosave=False, journal=False, compaction_threshold=COMPACTION_THRESHOLD, durability=None):
 		''' constructs a DAO for patients '''
-		
+
 		self.autosave = autosave
+		self.journal = journal
+		self.compaction_threshold = compaction_threshold
+		self.lock = RWLock()
+		self.patients = {}
+
+		if durability is None:
+			durability = Durability()
+		self.durability = durability
+		self.snapshot_dirty = False
 
 		if self.autosave:
 			patients_file_directory = 'clinic'
 			self.filename = os.path.join(patients_file_directory, 'patients.json')
-			self.patients = {}
+			self.journal_filename = os.path.join(patients_file_directory, 'patients.journal')
+			self.old_journal_filename = self.journal_filename + '.old'
+			self.load_snapshot()
+
+			if self.journal:
+				self.open_journal()
+
+		# index the names of the loaded patients for retrieval and suggestions, and their PHNs for paging
+		self.name_index = NameTrigramIndex()
+		for patient in self.patients.values():
+			self.name_index.add(patient.phn, patient.name)
+		self.prefix_index = NamePrefixIndex((patient.phn, patient.name) for patient in self.patients.values())
+		self.sorted_phns = sorted(self.patients)
+
+	def put_patient(self, patient):
+		''' puts a patient in the registry and its indexes '''
+
+		# the indexes go first, a patient they refuse is left out of the registry
+		self.name_index.add(patient.phn, patient.name)
+		self.prefix_index.add(patient.phn, patient.name)
+		if patient.phn not in self.patients:
+			insort(self.sorted_phns, patient.phn)
+		self.patients[patient.phn] = patient
+
+	def pop_patient(self, key):
+		''' removes a patient from the registry and its indexes '''
+
+		self.patients.pop(key)
+		self.name_index.remove(key)
+		self.prefix_index.remove(key)
+		del self.sorted_phns[bisect_left(self.sorted_phns, key)]
+
+	def get_name_index(self):
+		''' returns the name index '''
+
+		return self.name_index
+
+	def get_prefix_index(self):
+		''' returns the name prefix index '''
+
+		return self.prefix_index
+
+	def load_snapshot(self):
+		''' loads the intact patients of the patients file, writing them back if some were damaged '''
+
+		data = read_file(self.filename)
+		patient_lines, damaged, intact_end = scan_lines(data)
+		for patient_json in patient_lines:
 			try:
-				with open(self.filename, 'r') as file:
-					for patient_json in file:
-						patient = loads(patient_json, cls=PatientDecoder)
-						 
-						self.patients[patient.phn] = patient
-			except:
-				pass
+				patient = loads(patient_json, cls=PatientDecoder, durability=self.durability)
+			except ValueError:
+				damaged += 1
+				continue
+			self.patients[patient.phn] = patient
+
+		# the patients file is replaced whole, even its last line cannot be torn
+		if damaged or intact_end < len(data):
+			keep_damaged(self.filename, damaged + (intact_end < len(data)))
+			self.write_snapshot(self.all_patients())
+
+	def open_journal(self):
+		''' replays the journal over the snapshot and opens it for appending '''
+
+		self.journal_lock = threading.Lock()
+		self.compaction_thread = None
+		self.pending_journal = []
+
+		# a previous compaction did not finish, replay its journal first
+		interrupted_compaction = os.path.exists(self.old_journal_filename)
+		damaged = False
+		if interrupted_compaction:
+			damaged = self.replay_journal(self.old_journal_filename)
+		damaged = self.replay_journal(self.journal_filename) or damaged
+
+		# fold what was replayed into a new snapshot, dropping the damaged entries from the journal
+		if interrupted_compaction or damaged:
+			self.write_snapshot(self.all_patients())
+			if interrupted_compaction:
+				os.remove(self.old_journal_filename)
+			self.journal_file = open(self.journal_filename, 'wb')
 		else:
-			self.patients = {}
+			self.journal_file = open(self.journal_filename, 'ab')
+		self.journal_size = self.journal_file.tell()
+
+	def replay_journal(self, filename):
+		''' applies every intact journal entry in a file to the loaded patients, returns whether some were damaged '''
+
+		data = read_file(filename)
+		entry_lines, damaged, intact_end = scan_lines(data)
+		for entry_json in entry_lines:
+			try:
+				entry = loads(entry_json, cls=PatientDecoder, durability=self.durability)
+			except ValueError:
+				damaged += 1
+				continue
+			self.replay_entry(entry)
+
+		if damaged:
+			keep_damaged(filename, damaged)
+		elif intact_end < len(data):
+			# drop a torn last entry from an interrupted write, new entries go after the intact ones
+			with open(filename, 'r+b') as file:
+				file.truncate(intact_end)
+		return damaged > 0
+
+	def replay_entry(self, entry):
+		''' applies one journal entry to the loaded patients '''
+
+		if entry['op'] == 'put':
+			patient = entry['patient']
+			self.patients[patient.phn] = patient
+		elif entry['op'] == 'delete':
+			self.patients.pop(entry['phn'], None)
+
+	def all_patients(self):
+		''' returns every patient, to be written to a snapshot '''
+
+		return list(self.patients.values())
+
+	def write_snapshot(self, patients, sync=True):
+		''' writes all the given patients to the patients file, one sealed line each '''
+
+		replace_file(self.filename, (seal_line(dumps(patient, cls=PatientEncoder)) for patient in patients), sync)
+
+	def append_journal(self, *entries):
+		''' adds entries to the pending journal entries '''
+
+		entry_lines = b''.join([seal_line(dumps(entry, cls=PatientEncoder)) for entry in entries])
+		with self.journal_lock:
+			self.pending_journal.append(entry_lines)
+		self.durability.write(self)
+
+	def write_journal(self, sync):
+		''' writes the pending entries to the journal, compacting it when it grows too big '''
+
+		with self.journal_lock:
+			if not self.pending_journal:
+				return
+			entry_lines = b''.join(self.pending_journal)
+			self.pending_journal = []
+			self.journal_file.write(entry_lines)
+			self.journal_file.flush()
+			if sync:
+				os.fsync(self.journal_file.fileno())
+			self.journal_size += len(entry_lines)
+			# a journal left aside by a failed compaction is only folded when the patients are loaded again
+			must_compact = self.journal_size >= self.compaction_threshold \
+				and self.compaction_thread is None and not os.path.exists(self.old_journal_filename)
+			if must_compact:
+				# move the full journal aside and start an empty one
+				self.journal_file.close()
+				os.replace(self.journal_filename, self.old_journal_filename)
+				self.journal_file = open(self.journal_filename, 'wb')
+				self.journal_size = 0
+				patients = self.all_patients()
+				self.compaction_thread = threading.Thread(target=self.compact_journal, args=(patients,), daemon=True)
+				self.compaction_thread.start()
+
+	def compact_journal(self, patients):
+		''' folds the moved-aside journal into a new snapshot '''
+
+		try:
+			self.write_snapshot(patients)
+			self.snapshot_compacted(patients)
+			os.remove(self.old_journal_filename)
+		except Exception:
+			logger.exception("%s: compaction failed, the moved-aside journal is kept", self.journal_filename)
+		finally:
+			with self.journal_lock:
+				self.compaction_thread = None
+
+	def snapshot_compacted(self, patients):
+		''' called once a compaction wrote the patients file, nothing else is written here '''
+
+		pass
+
+	def save_patient(self, patient):
+		''' persists a created or updated patient '''
+
+		self.save_patients([patient])
+
+	def save_patients(self, patients):
+		''' persists created or updated patients with a single write '''
+
+		if self.journal:
+			self.append_journal(*[{"op": "put", "patient": patient} for patient in patients])
+		else:
+			self.snapshot_dirty = True
+			self.durability.write(self)
+
+	def save_deletion(self, key):
+		''' persists a deleted patient '''
+
+		if self.journal:
+			self.append_journal({"op": "delete", "phn": key})
+		else:
+			self.snapshot_dirty = True
+			self.durability.write(self)
+
+	def flush_pending(self, sync=True):
+		''' writes the pending changes, syncing them to the disk if asked '''
+
+		with self.lock.writing():
+			if self.journal:
+				self.write_journal(sync)
+			elif self.snapshot_dirty:
+				self.snapshot_dirty = False
+				self.write_snapshot(self.patients.values(), sync)
+
+	def close(self):
+		''' writes the pending changes, waits for a running compaction and closes the journal '''
+
+		with self.lock.writing():
+			if self.autosave:
+				self.flush_pending()
+			if self.autosave and self.journal:
+				compaction_thread = self.compaction_thread
+				if compaction_thread:
+					compaction_thread.join()
+				self.journal_file.close()
+
+	def find_patient(self, key):
+		''' finds a patient, the caller holds the lock '''
+
+		return self.patients.get(key)
 
 	def search_patient(self, key):
 		''' searches a patient '''
 
-		return self.patients.get(key)
+		with self.lock.reading():
+			return self.find_patient(key)
 
 	def create_patient(self, patient):
 		''' creates a patient '''
 
-		self.patients[patient.phn] = patient
+		with self.lock.writing():
+			self.put_patient(patient)
 
-		# if persistence is set, save all patients
-		if self.autosave:
-			with open(self.filename, 'w') as file:
-				for key in self.patients:
-					patient_json = dumps(self.patients[key], cls=PatientEncoder)
-					file.write('%s\n' % (patient_json))
+			# if persistence is set, save the patient
+			if self.autosave:
+				self.save_patient(patient)
+
+			return patient
+
+	def create_patients(self, patients):
+		''' creates many patients, persisting them once '''
+
+		with self.lock.writing():
+			for patient in patients:
+				self.put_patient(patient)
+
+			# if persistence is set, save the patients
+			if self.autosave:
+				self.save_patients(patients)
 
-		return patient
+			return patients
 
 	def retrieve_patients(self, search_string):
 		''' retrieves patients by text '''
 
-		retrieved_patients = []
-		for patient in self.patients.values():
-			if search_string in patient.name:
-				retrieved_patients.append(patient)
-		return retrieved_patients
+		with self.lock.reading():
+			retrieved_patients = []
+			for key in self.name_index.search(search_string):
+				retrieved_patients.append(self.patients[key])
+			return retrieved_patients
+
+	def retrieve_patients_page(self, search_string, after_phn=None, limit=PAGE_SIZE):
+		''' retrieves a page of patients by text, in PHN order after a given PHN '''
+
+		with self.lock.reading():
+			keys = self.get_name_index().search(search_string)
+			if after_phn is not None:
+				keys = [key for key in keys if key > after_phn]
+			keys = sorted(keys) if limit is None else nsmallest(limit, keys)
+			return [self.find_patient(key) for key in keys]
+
+	def suggest_patients(self, prefix, limit=SUGGESTION_LIMIT):
+		''' suggests patients with a name word starting with a prefix '''
+
+		with self.lock.reading():
+			return [self.find_patient(key) for key in self.get_prefix_index().search(prefix, limit)]
 
 	def update_patient(self, key, patient):
 		''' updates a patient '''
 
-		# treat different keys as a separate case
-		if key != patient.phn:
-			self.patients.pop(key)
-		self.patients[patient.phn] = patient
+		with self.lock.writing():
+			# treat different keys as a separate case
+			if key != patient.phn:
+				self.pop_patient(key)
+				if self.autosave and self.journal:
+					self.save_deletion(key)
+			self.put_patient(patient)
 
-		# if persistence is set, save all patients
-		if self.autosave:
-			with open(self.filename, 'w') as file:
-				for key in self.patients:
-					patient_json = dumps(self.patients[key], cls=PatientEncoder)
-					file.write('%s\n' % (patient_json))
+			# if persistence is set, save the patient
+			if self.autosave:
+				self.save_patient(patient)
 
-		return True
+			return True
 
 	def delete_patient(self, key):
 		''' deletes a patient '''
 
-		# patient exists, delete patient
-		self.patients.pop(key)
+		with self.lock.writing():
+			# patient exists, delete patient
+			self.pop_patient(key)
 
-		# if persistence is set, save all patients
-		if self.autosave:
-			with open(self.filename, 'w') as file:
-				for key in self.patients:
-					patient_json = dumps(self.patients[key], cls=PatientEncoder)
-					file.write('%s\n' % (patient_json))
+			# if persistence is set, save the deletion
+			if self.autosave:
+				self.save_deletion(key)
 
-		return True
+			return True
 
 	def list_patients(self):
 		''' lists all patients '''
 
-		patients_list = []
-		for patient in self.patients.values():
-			patients_list.append(patient)
-		return patients_list
+		with self.lock.reading():
+			patients_list = []
+			for patient in self.patients.values():
+				patients_list.append(patient)
+			return patients_list
+
+	def patients_page(self, after_phn, limit):
+		''' returns up to limit patients in PHN order after a given PHN, under the read lock '''
+
+		start = 0 if after_phn is None else bisect_right(self.sorted_phns, after_phn)
+		return [self.patients[key] for key in self.sorted_phns[start:start + limit]]
+
+	def iter_patients(self, after_phn=None, limit=None):
+		''' yields the patients in PHN order, starting after a given PHN '''
+
+		# read a page at a time, so that changes in between are seen and no lock is held while yielding
+		while limit is None or limit > 0:
+			page_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit)
+			with self.lock.reading():
+				page = self.patients_page(after_phn, page_size)
+			yield from page
+			if len(page) < page_size:
+				return
+			after_phn = page[-1].phn
+			if limit is not None:
+				limit -= len(page)
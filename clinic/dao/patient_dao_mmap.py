@@ -0,0 +1,434 @@
+import os
+import mmap
+import threading
+import struct
+import weakref
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from json import loads, dumps
+from clinic.dao.patient_dao_json import PatientDAOJSON, COMPACTION_THRESHOLD
+from clinic.dao.patient_encoder import PatientEncoder
+from clinic.dao.patient_decoder import PatientDecoder
+from clinic.dao.name_trigram_index import NameTrigramIndex
+from clinic.dao.name_prefix_index import NamePrefixIndex
+from clinic.dao.rw_lock import RWLock
+from clinic.dao.durability import Durability
+from clinic.dao.recovery import seal_line, open_line, replace_file, salvage_file
+from clinic.exception.damaged_record_exception import DamagedRecordException
+
+# magic, size and modification time of the indexed patients file, number of patients
+INDEX_HEADER = struct.Struct('<8sqqq')
+INDEX_MAGIC = b'PHNIDX01'
+
+# number of decoded snapshot patients kept, the least recently used are dropped first
+DECODED_LIMIT = 10000
+
+class PatientDAOMmap(PatientDAOJSON):
+	''' DAO class that reads patients from the memory-mapped patients file on demand
+
+		The patients file is only read through a sidecar index from PHN to
+		byte offset, so only the lines that are asked for get decoded. Changes
+		are journaled and kept in memory; they reach the patients file when the
+		journal is compacted, and the mapped file is reopened on the next start.
+		PHNs must be integers.
+	'''
+
+	def __init__(self, autosave=False, compaction_threshold=COMPACTION_THRESHOLD, durability=None):
+		''' constructs a DAO for patients '''
+
+		self.autosave = autosave
+		self.journal = autosave
+		self.compaction_threshold = compaction_threshold
+		self.lock = RWLock()
+
+		if durability is None:
+			durability = Durability()
+		self.durability = durability
+
+		# patients created or updated after the snapshot was written,
+		# and snapshot patients deleted after it was written
+		self.patients = {}
+		self.deleted = set()
+
+		# recently decoded snapshot patients, filled by readers one key at a time, and every
+		# decoded patient still in use, so that a patient never gets two records
+		self.decoded = OrderedDict()
+		self.decoded_limit = DECODED_LIMIT
+		self.decoded_lock = threading.Lock()
+		self.in_use = weakref.WeakValueDictionary()
+
+		# PHNs sorted with their line offsets, and PHNs in file order
+		self.snapshot = None
+		self.phns = array('q')
+		self.offsets = array('q')
+		self.file_order = array('q')
+
+		# the name indexes need every name, they are only built for the first retrieval or suggestion
+		self.name_index = None
+		self.prefix_index = None
+		self.index_lock = threading.Lock()
+
+		if self.autosave:
+			patients_file_directory = 'clinic'
+			self.filename = os.path.join(patients_file_directory, 'patients.json')
+			self.index_filename = os.path.join(patients_file_directory, 'patients.idx')
+			self.journal_filename = os.path.join(patients_file_directory, 'patients.journal')
+			self.old_journal_filename = self.journal_filename + '.old'
+			self.open_snapshot()
+			self.open_journal()
+
+	def open_snapshot(self, salvage=True):
+		''' maps the patients file and loads or rebuilds its index, salvaging a damaged file '''
+
+		try:
+			file = open(self.filename, 'rb')
+		except FileNotFoundError:
+			return
+		with file:
+			if os.fstat(file.fileno()).st_size == 0:
+				return
+			self.snapshot = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		if not self.read_index():
+			entries = []
+			damaged = False
+			position = 0
+			while position < len(self.snapshot):
+				end = self.line_end(position)
+				line = self.snapshot[position:end]
+				if line.strip():
+					patient_json = open_line(line)
+					try:
+						entries.append((loads(patient_json)['phn'], position))
+					except (TypeError, ValueError, KeyError):
+						damaged = True
+				position = end + 1
+
+			# write back the intact patients, then index the new file
+			if damaged and salvage:
+				self.snapshot.close()
+				self.snapshot = None
+				salvage_file(self.filename)
+				self.open_snapshot(salvage=False)
+				return
+			self.set_index(entries)
+			self.write_index(entries)
+
+	def read_index(self):
+		''' loads the sidecar index, returns whether it matches the patients file '''
+
+		status = os.stat(self.filename)
+		try:
+			with open(self.index_filename, 'rb') as file:
+				magic, size, modified, count = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+				if magic != INDEX_MAGIC or size != status.st_size or modified != status.st_mtime_ns:
+					return False
+				self.phns.fromfile(file, count)
+				self.offsets.fromfile(file, count)
+				self.file_order.fromfile(file, count)
+		except (OSError, EOFError, struct.error):
+			self.phns = array('q')
+			self.offsets = array('q')
+			self.file_order = array('q')
+			return False
+		return True
+
+	def set_index(self, entries):
+		''' sets the in-memory index from (PHN, offset) pairs in file order '''
+
+		self.file_order = array('q', [phn for phn, offset in entries])
+		entries = sorted(entries)
+		self.phns = array('q', [phn for phn, offset in entries])
+		self.offsets = array('q', [offset for phn, offset in entries])
+
+	def write_index(self, entries):
+		''' writes the sidecar index of the patients file from (PHN, offset) pairs in file order '''
+
+		status = os.stat(self.filename)
+		sorted_entries = sorted(entries)
+		# the index is rebuilt from the patients file when lost, it is not synced
+		replace_file(self.index_filename, [
+			INDEX_HEADER.pack(INDEX_MAGIC, status.st_size, status.st_mtime_ns, len(entries)),
+			array('q', [phn for phn, offset in sorted_entries]).tobytes(),
+			array('q', [offset for phn, offset in sorted_entries]).tobytes(),
+			array('q', [phn for phn, offset in entries]).tobytes()], sync=False)
+
+	def write_snapshot(self, patients, sync=True):
+		''' writes all the given patients to the patients file, one sealed line each, with its index '''
+
+		entries = []
+
+		def patient_lines():
+			position = 0
+			for patient in patients:
+				line = seal_line(dumps(patient, cls=PatientEncoder))
+				entries.append((patient.phn, position))
+				position += len(line)
+				yield line
+
+		replace_file(self.filename, patient_lines(), sync)
+		self.write_index(entries)
+
+	def line_end(self, position):
+		''' returns where the snapshot line starting at a position ends '''
+
+		end = self.snapshot.find(b'\n', position)
+		if end == -1:
+			end = len(self.snapshot)
+		return end
+
+	def snapshot_offset(self, key):
+		''' returns the offset of a patient's line in the snapshot, or None '''
+
+		if not isinstance(key, int):
+			return None
+		i = bisect_left(self.phns, key)
+		if i < len(self.phns) and self.phns[i] == key:
+			return self.offsets[i]
+		return None
+
+	def snapshot_line(self, key):
+		''' returns the checked JSON line of a patient in the snapshot '''
+
+		offset = self.snapshot_offset(key)
+		# lines are only checked when read, the whole file is only checked when indexed
+		patient_json = open_line(self.snapshot[offset:self.line_end(offset)])
+		if patient_json is None:
+			raise DamagedRecordException("Damaged record of the patient with PHN %d in %s." % (key, self.filename))
+		return patient_json
+
+	def snapshot_patient(self, key, cache=True):
+		''' decodes a patient from the snapshot '''
+
+		with self.decoded_lock:
+			patient = self.in_use.get(key)
+			if patient is not None and cache:
+				self.keep_decoded(key, patient)
+		if patient is None:
+			patient = loads(self.snapshot_line(key), cls=PatientDecoder, durability=self.durability)
+			if cache:
+				with self.decoded_lock:
+					# another reader may have decoded the same patient meanwhile
+					patient = self.in_use.setdefault(key, patient)
+					self.keep_decoded(key, patient)
+		return patient
+
+	def keep_decoded(self, key, patient):
+		''' marks a decoded patient as the most recently used, dropping the least recently used past the limit '''
+
+		self.decoded[key] = patient
+		self.decoded.move_to_end(key)
+		while len(self.decoded) > self.decoded_limit:
+			self.decoded.popitem(last=False)
+
+	def snapshot_name(self, key):
+		''' reads a patient's name from the snapshot without building the patient '''
+
+		return loads(self.snapshot_line(key))['name']
+
+	def iter_patients_view(self, patients, deleted, cache=True):
+		''' yields the patients in registry order, given the changes after the snapshot '''
+
+		for key in self.file_order:
+			if key in deleted:
+				continue
+			patient = patients.get(key)
+			if patient is None:
+				patient = self.snapshot_patient(key, cache)
+			yield patient
+
+		# then the patients that were added after the snapshot
+		for key, patient in patients.items():
+			if key in deleted or self.snapshot_offset(key) is None:
+				yield patient
+
+	def all_patients(self):
+		''' returns every patient, to be written to a snapshot '''
+
+		# the snapshot is never remapped, copying the changes gives a stable view
+		return self.iter_patients_view(dict(self.patients), set(self.deleted), cache=False)
+
+	def replay_entry(self, entry):
+		''' applies one journal entry to the changes after the snapshot '''
+
+		if entry['op'] == 'put':
+			patient = entry['patient']
+			self.patients[patient.phn] = patient
+		elif entry['op'] == 'delete':
+			self.forget_patient(entry['phn'])
+
+	def forget_patient(self, key):
+		''' removes a patient from memory, remembering it was deleted from the snapshot '''
+
+		self.patients.pop(key, None)
+		self.forget_decoded(key)
+		if self.snapshot_offset(key) is not None:
+			self.deleted.add(key)
+		if self.name_index is not None:
+			self.name_index.remove(key)
+		if self.prefix_index is not None:
+			self.prefix_index.remove(key)
+
+	def index_name(self, key, name):
+		''' indexes the name of a patient in the name indexes built so far '''
+
+		if self.name_index is not None:
+			self.name_index.add(key, name)
+		if self.prefix_index is not None:
+			self.prefix_index.add(key, name)
+
+	def iter_names(self):
+		''' yields the PHN and name of every patient, in insertion order '''
+
+		for key in self.file_order:
+			if key in self.deleted:
+				continue
+			patient = self.patients.get(key)
+			yield key, patient.name if patient else self.snapshot_name(key)
+		for key, patient in self.patients.items():
+			if key in self.deleted or self.snapshot_offset(key) is None:
+				yield key, patient.name
+
+	def get_name_index(self):
+		''' returns the name index, building it the first time '''
+
+		# readers may ask at the same time, only one of them builds it
+		with self.index_lock:
+			if self.name_index is None:
+				name_index = NameTrigramIndex()
+				for key, name in self.iter_names():
+					name_index.add(key, name)
+				self.name_index = name_index
+		return self.name_index
+
+	def get_prefix_index(self):
+		''' returns the name prefix index, building it the first time '''
+
+		with self.index_lock:
+			if self.prefix_index is None:
+				self.prefix_index = NamePrefixIndex(self.iter_names())
+		return self.prefix_index
+
+	def close(self):
+		''' waits for a running compaction and closes the journal and the mapped file '''
+
+		with self.lock.writing():
+			super().close()
+			if self.snapshot is not None:
+				self.snapshot.close()
+
+	def find_patient(self, key, cache=True):
+		''' finds a patient among the changes or in the snapshot, the caller holds the lock '''
+
+		patient = self.patients.get(key)
+		if patient is not None or key in self.deleted:
+			return patient
+		if self.snapshot_offset(key) is None:
+			return None
+		return self.snapshot_patient(key, cache)
+
+	def create_patient(self, patient):
+		''' creates a patient '''
+
+		with self.lock.writing():
+			self.patients[patient.phn] = patient
+			self.index_name(patient.phn, patient.name)
+
+			# if persistence is set, save the patient
+			if self.autosave:
+				self.save_patient(patient)
+
+			return patient
+
+	def create_patients(self, patients):
+		''' creates many patients, persisting them once '''
+
+		with self.lock.writing():
+			for patient in patients:
+				self.patients[patient.phn] = patient
+				self.index_name(patient.phn, patient.name)
+
+			# if persistence is set, save the patients
+			if self.autosave:
+				self.save_patients(patients)
+
+			return patients
+
+	def retrieve_patients(self, search_string):
+		''' retrieves patients by text '''
+
+		with self.lock.reading():
+			retrieved_patients = []
+			for key in self.get_name_index().search(search_string):
+				retrieved_patients.append(self.find_patient(key))
+			return retrieved_patients
+
+	def forget_decoded(self, key):
+		''' drops a decoded snapshot patient that was changed or deleted '''
+
+		with self.decoded_lock:
+			self.decoded.pop(key, None)
+			self.in_use.pop(key, None)
+
+	def update_patient(self, key, patient):
+		''' updates a patient '''
+
+		with self.lock.writing():
+			# treat different keys as a separate case
+			if key != patient.phn:
+				self.forget_patient(key)
+				if self.autosave:
+					self.save_deletion(key)
+			self.patients[patient.phn] = patient
+			self.forget_decoded(patient.phn)
+			self.index_name(patient.phn, patient.name)
+
+			# if persistence is set, save the patient
+			if self.autosave:
+				self.save_patient(patient)
+
+			return True
+
+	def delete_patient(self, key):
+		''' deletes a patient '''
+
+		with self.lock.writing():
+			self.forget_patient(key)
+
+			# if persistence is set, save the deletion
+			if self.autosave:
+				self.save_deletion(key)
+
+			return True
+
+	def list_patients(self):
+		''' lists all patients '''
+
+		with self.lock.reading():
+			return list(self.iter_patients_view(self.patients, self.deleted))
+
+	def patients_page(self, after_phn, limit):
+		''' returns up to limit patients in PHN order after a given PHN, under the read lock '''
+
+		# merge the sorted snapshot PHNs with the PHNs changed after the snapshot
+		start = 0 if after_phn is None else bisect_right(self.phns, after_phn)
+		snapshot_keys = (self.phns[i] for i in range(start, len(self.phns)))
+		changed_keys = sorted([key for key in self.patients if after_phn is None or key > after_phn])
+
+		page = []
+		previous_key = None
+		for key in merge(snapshot_keys, changed_keys):
+			if key == previous_key:
+				continue
+			previous_key = key
+
+			# streamed patients are not kept decoded
+			patient = self.find_patient(key, cache=False)
+			if patient is None:
+				continue
+			page.append(patient)
+			if len(page) == limit:
+				break
+		return page
@@ -0,0 +1,304 @@
+import os
+import sqlite3
+import threading
+from clinic.dao.patient_dao import PatientDAO, PAGE_SIZE, SUGGESTION_LIMIT
+from clinic.dao.note_dao_sqlite import NoteDAOSQLite
+from clinic.dao.name_prefix_index import name_terms, normalize_prefix, term_matches
+from clinic.dao.rw_lock import RWLock
+from clinic.dao.durability import Durability, STRICT, GROUP, LAZY
+from clinic.patient import Patient
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS patients (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	phn INTEGER NOT NULL UNIQUE,
+	name TEXT NOT NULL COLLATE NOCASE,
+	birth_date TEXT NOT NULL,
+	phone TEXT NOT NULL,
+	email TEXT NOT NULL,
+	address TEXT NOT NULL
+);
+DROP INDEX IF EXISTS patients_name;
+CREATE TABLE IF NOT EXISTS name_terms (
+	term TEXT NOT NULL,
+	phn INTEGER NOT NULL,
+	PRIMARY KEY (term, phn)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS name_terms_phn ON name_terms (phn);
+CREATE TABLE IF NOT EXISTS notes (
+	phn INTEGER NOT NULL,
+	code INTEGER NOT NULL,
+	text TEXT NOT NULL,
+	timestamp TEXT NOT NULL,
+	PRIMARY KEY (phn, code)
+) WITHOUT ROWID;
+'''
+
+# trigram index of the names, kept up to date by triggers; substring searches of three
+# characters or more look it up rather than scanning every name
+NAME_SEARCH_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS patient_names USING fts5(
+	name, content='patients', content_rowid='id', tokenize='trigram case_sensitive 1');
+CREATE TRIGGER IF NOT EXISTS patient_names_insert AFTER INSERT ON patients BEGIN
+	INSERT INTO patient_names (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS patient_names_delete AFTER DELETE ON patients BEGIN
+	INSERT INTO patient_names (patient_names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS patient_names_update AFTER UPDATE OF name ON patients BEGIN
+	INSERT INTO patient_names (patient_names, rowid, name) VALUES ('delete', old.id, old.name);
+	INSERT INTO patient_names (rowid, name) VALUES (new.id, new.name);
+END;
+'''
+
+# shortest search string the trigram index can look up
+TRIGRAM_LENGTH = 3
+
+PATIENT_COLUMNS = 'phn, name, birth_date, phone, email, address'
+
+# SQLite batches the syncs of its write-ahead log itself, each durability mode maps to how often it syncs
+SYNCHRONOUS = {STRICT: 'FULL', GROUP: 'NORMAL', LAZY: 'OFF'}
+
+class PatientDAOSQLite(PatientDAO):
+	''' DAO class that handles patient persistence in a SQLite database '''
+
+	def __init__(self, autosave=False, durability=None):
+		''' constructs a DAO for patients '''
+
+		self.autosave = autosave
+		if durability is None:
+			durability = Durability()
+		self.durability = durability
+
+		# each thread has its own connection, shared with the patients' note DAOs; writers
+		# still take the lock alone, readers share it
+		self.lock = RWLock()
+		self.connections = {}
+		self.connections_lock = threading.Lock()
+
+		# without persistence the database only lives in memory, shared by the connections of this DAO
+		if self.autosave:
+			patients_file_directory = 'clinic'
+			self.filename = os.path.join(patients_file_directory, 'clinic.db')
+		else:
+			self.filename = 'file:clinic-%d?mode=memory&cache=shared' % (id(self))
+
+		# this connection keeps an in-memory database alive until the DAO is closed
+		self.main_connection = self.open_connection()
+		if self.autosave:
+			self.main_connection.execute('PRAGMA journal_mode=WAL')
+		self.main_connection.executescript(SCHEMA)
+
+		# databases created before name suggestions have their terms indexed once
+		connection = self.main_connection
+		if connection.execute('SELECT NOT EXISTS (SELECT 1 FROM name_terms) AND EXISTS (SELECT 1 FROM patients)').fetchone()[0]:
+			with connection:
+				self.index_names(connection, connection.execute('SELECT phn, name FROM patients').fetchall())
+
+		# the trigram index needs SQLite's FTS5 module, without it every name is scanned
+		self.name_search = True
+		try:
+			indexed = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'patient_names'").fetchone()
+			connection.executescript(NAME_SEARCH_SCHEMA)
+			if not indexed:
+				with connection:
+					connection.execute("INSERT INTO patient_names (patient_names) VALUES ('rebuild')")
+		except sqlite3.OperationalError:
+			self.name_search = False
+
+	def open_connection(self):
+		''' opens a connection to the database '''
+
+		# statements are prepared once and reused from the connection's statement cache, the
+		# connection is only used by one thread but may be closed by another
+		connection = sqlite3.connect(self.filename, uri=True, check_same_thread=False, cached_statements=128)
+		if self.autosave:
+			connection.execute('PRAGMA synchronous=%s' % (SYNCHRONOUS[self.durability.mode]))
+		return connection
+
+	def connect(self):
+		''' returns the connection of the calling thread, opening it the first time '''
+
+		thread = threading.current_thread()
+		connection = self.connections.get(thread)
+		if connection is None:
+			connection = self.open_connection()
+			with self.connections_lock:
+				# the connections of finished threads are closed
+				for finished in [other for other in self.connections if not other.is_alive()]:
+					self.connections.pop(finished).close()
+				self.connections[thread] = connection
+		return connection
+
+	def make_patient(self, row):
+		''' builds a patient whose record is kept in the same database '''
+
+		phn, name, birth_date, phone, email, address = row
+		return Patient(phn, name, birth_date, phone, email, address, self.autosave,
+			NoteDAOSQLite(self.connect, phn, self.lock))
+
+	def index_names(self, connection, names):
+		''' indexes the name terms of some PHN and name pairs, within the caller's transaction '''
+
+		connection.executemany('INSERT OR IGNORE INTO name_terms (term, phn) VALUES (?, ?)',
+			[(term, phn) for phn, name in names for term in name_terms(name)])
+
+	def close(self):
+		''' closes the database '''
+
+		with self.lock.writing():
+			with self.connections_lock:
+				for connection in self.connections.values():
+					connection.close()
+				self.connections.clear()
+			self.main_connection.close()
+
+	def search_patient(self, key):
+		''' searches a patient '''
+
+		with self.lock.reading():
+			connection = self.connect()
+			row = connection.execute(
+				'SELECT ' + PATIENT_COLUMNS + ' FROM patients WHERE phn = ?', (key,)).fetchone()
+			if row is None:
+				return None
+			return self.make_patient(row)
+
+	def create_patient(self, patient):
+		''' creates a patient '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			row = (patient.phn, patient.name, patient.birth_date, patient.phone, patient.email, patient.address)
+			with connection:
+				connection.execute(
+					'INSERT INTO patients (' + PATIENT_COLUMNS + ') VALUES (?, ?, ?, ?, ?, ?)', row)
+				self.index_names(connection, [(patient.phn, patient.name)])
+			return self.make_patient(row)
+
+	def create_patients(self, patients):
+		''' creates many patients in a single transaction '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			rows = [(patient.phn, patient.name, patient.birth_date, patient.phone, patient.email, patient.address)
+				for patient in patients]
+			with connection:
+				connection.executemany(
+					'INSERT INTO patients (' + PATIENT_COLUMNS + ') VALUES (?, ?, ?, ?, ?, ?)', rows)
+				self.index_names(connection, [row[:2] for row in rows])
+			return [self.make_patient(row) for row in rows]
+
+	def name_condition(self, search_string):
+		''' returns the condition on the patients whose name contains a search string, and its parameters '''
+
+		if self.name_search and len(search_string) >= TRIGRAM_LENGTH:
+			# a quoted phrase of trigrams matches the names holding it
+			phrase = '"' + search_string.replace('"', '""') + '"'
+			return 'id IN (SELECT rowid FROM patient_names WHERE patient_names MATCH ?) AND instr(name, ?) > 0', \
+				(phrase, search_string)
+		return 'instr(name, ?) > 0', (search_string,)
+
+	def retrieve_patients(self, search_string):
+		''' retrieves patients by text '''
+
+		condition, parameters = self.name_condition(search_string)
+		with self.lock.reading():
+			connection = self.connect()
+			rows = connection.execute(
+				'SELECT ' + PATIENT_COLUMNS + ' FROM patients WHERE ' + condition + ' ORDER BY id', parameters)
+			return [self.make_patient(row) for row in rows]
+
+	def retrieve_patients_page(self, search_string, after_phn=None, limit=PAGE_SIZE):
+		''' retrieves a page of patients by text, in PHN order after a given PHN '''
+
+		condition, parameters = self.name_condition(search_string)
+		with self.lock.reading():
+			connection = self.connect()
+			rows = connection.execute(
+				'SELECT ' + PATIENT_COLUMNS + ' FROM patients WHERE ' + condition + ' AND phn > ? ORDER BY phn LIMIT ?',
+				parameters + (-1 if after_phn is None else after_phn, -1 if limit is None else limit))
+			return [self.make_patient(row) for row in rows]
+
+	def suggest_patients(self, prefix, limit=SUGGESTION_LIMIT):
+		''' suggests patients with a name word starting with a prefix '''
+
+		with self.lock.reading():
+			connection = self.connect()
+			prefix = normalize_prefix(prefix)
+			if not prefix:
+				return []
+
+			# walk the term index from the prefix on, until enough distinct patients are found
+			cursor = connection.execute(
+				'SELECT ' + ', '.join('p.' + column for column in PATIENT_COLUMNS.split(', ')) +
+				', t.term FROM name_terms t JOIN patients p ON p.phn = t.phn WHERE t.term >= ? AND t.term < ? ORDER BY t.term, t.phn',
+				(prefix.rstrip(' '), prefix + '\U0010ffff'))
+			patients = []
+			seen = set()
+			for row in cursor:
+				if len(patients) >= limit:
+					break
+				if term_matches(row[-1], prefix) and row[0] not in seen:
+					seen.add(row[0])
+					patients.append(self.make_patient(row[:-1]))
+			cursor.close()
+			return patients
+
+	def update_patient(self, key, patient):
+		''' updates a patient '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			row = (patient.phn, patient.name, patient.birth_date, patient.phone, patient.email, patient.address)
+			with connection:
+				if key != patient.phn:
+					# a patient with a new key goes last; notes stay with their PHN, as in the record files
+					connection.execute('DELETE FROM patients WHERE phn = ?', (key,))
+					connection.execute(
+						'INSERT INTO patients (' + PATIENT_COLUMNS + ') VALUES (?, ?, ?, ?, ?, ?)', row)
+				else:
+					connection.execute(
+						'UPDATE patients SET name = ?, birth_date = ?, phone = ?, email = ?, address = ? WHERE phn = ?',
+						row[1:] + row[:1])
+				connection.execute('DELETE FROM name_terms WHERE phn = ?', (key,))
+				self.index_names(connection, [(patient.phn, patient.name)])
+			return True
+
+	def delete_patient(self, key):
+		''' deletes a patient '''
+
+		with self.lock.writing():
+			connection = self.connect()
+			with connection:
+				# notes stay with their PHN, as the record files of the other backends do
+				connection.execute('DELETE FROM patients WHERE phn = ?', (key,))
+				connection.execute('DELETE FROM name_terms WHERE phn = ?', (key,))
+			return True
+
+	def list_patients(self):
+		''' lists all patients '''
+
+		with self.lock.reading():
+			connection = self.connect()
+			rows = connection.execute('SELECT ' + PATIENT_COLUMNS + ' FROM patients ORDER BY id')
+			return [self.make_patient(row) for row in rows]
+
+	def iter_patients(self, after_phn=None, limit=None):
+		''' yields the patients in PHN order, starting after a given PHN '''
+
+		# fetch a page at a time, so that no cursor stays open between pages
+		while limit is None or limit > 0:
+			page_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit)
+			with self.lock.reading():
+				connection = self.connect()
+				rows = connection.execute(
+					'SELECT ' + PATIENT_COLUMNS + ' FROM patients WHERE phn > ? ORDER BY phn LIMIT ?',
+					(-1 if after_phn is None else after_phn, page_size)).fetchall()
+			if not rows:
+				return
+			for row in rows:
+				yield self.make_patient(row)
+			after_phn = rows[-1][0]
+			if limit is not None:
+				limit -= len(rows)
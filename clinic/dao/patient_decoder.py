@@ -4,13 +4,14 @@ from clinic.patient import Patient
 class PatientDecoder(JSONDecoder):
   ''' Decodes a patient from a JSON '''
 
-  def __init__(self, *args, **kwargs):
-    ''' constructs a patient decoder '''
+  def __init__(self, *args, durability=None, **kwargs):
+    ''' constructs a patient decoder, whose patients follow a durability policy '''
     super().__init__(object_hook=self.object_hook, *args, **kwargs)
+    self.durability = durability
 
   def object_hook(self, dct):
     ''' returns a patient as a JSON dictionary '''
     if '__type__' in dct and dct['__type__'] == 'Patient':
       return Patient(dct['phn'], dct['name'], dct['birth_date'], 
-        dct['phone'], dct['email'], dct['address'], dct['autosave'])
+        dct['phone'], dct['email'], dct['address'], dct['autosave'], durability=self.durability)
     return dct
@@ -0,0 +1,430 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from itertools import compress
+from clinic.patient import Patient
+from clinic.patient_record import EmptyRecord, EMPTY_RECORD
+
+# string fields of a patient, each packed in a column of its own
+STRING_FIELDS = ('name', 'birth_date', 'phone', 'email', 'address')
+
+# bytes of replaced strings under which a column is never compacted
+COLUMN_COMPACTION_THRESHOLD = 64 * 1024
+
+# deleted rows under which the table is never compacted
+ROW_COMPACTION_THRESHOLD = 1024
+
+# rows added since the PHNs were sorted under which they are not sorted again
+MERGE_THRESHOLD = 1024
+
+class StringColumn():
+	''' the strings of one field of every row, packed end to end in a single UTF-8 buffer
+
+		Replaced strings stay in the buffer until the column is compacted.
+		A searchable column also keeps its strings in buffer order, so that
+		a match found by scanning the buffer leads back to its row.
+	'''
+
+	def __init__(self, searchable=False):
+		''' constructs an empty column '''
+
+		self.data = bytearray()
+		self.starts = array('q')
+		self.lengths = array('I')
+		self.garbage = 0
+
+		# start and row of every non-empty string in the buffer, -1 for replaced ones
+		self.searchable = searchable
+		self.entry_starts = array('q')
+		self.entry_rows = array('q')
+
+	def copy(self):
+		''' returns a copy of the column '''
+
+		column = StringColumn(self.searchable)
+		column.data = bytearray(self.data)
+		column.starts = array('q', self.starts)
+		column.lengths = array('I', self.lengths)
+		column.garbage = self.garbage
+		column.entry_starts = array('q', self.entry_starts)
+		column.entry_rows = array('q', self.entry_rows)
+		return column
+
+	def get(self, row):
+		''' returns the string of a row '''
+
+		start = self.starts[row]
+		return self.data[start:start + self.lengths[row]].decode('utf-8')
+
+	def put(self, row, encoded):
+		''' appends the encoded string of a row to the buffer, returns where it starts '''
+
+		start = len(self.data)
+		self.data += encoded
+		if self.searchable and encoded:
+			self.entry_starts.append(start)
+			self.entry_rows.append(row)
+		return start
+
+	def append(self, text):
+		''' adds the string of a new row '''
+
+		encoded = text.encode('utf-8')
+		self.starts.append(self.put(len(self.starts), encoded))
+		self.lengths.append(len(encoded))
+
+	def set(self, row, text):
+		''' replaces the string of a row, unless it did not change '''
+
+		encoded = text.encode('utf-8')
+		start = self.starts[row]
+		if self.data[start:start + self.lengths[row]] == encoded:
+			return
+		self.clear(row)
+		self.starts[row] = self.put(row, encoded)
+		self.lengths[row] = len(encoded)
+
+	def clear(self, row):
+		''' empties the string of a row, compacting the column once half of it is garbage '''
+
+		length = self.lengths[row]
+		if not length:
+			return
+		if self.searchable:
+			i = bisect_left(self.entry_starts, self.starts[row])
+			self.entry_rows[i] = -1
+		self.lengths[row] = 0
+		self.garbage += length
+		if self.garbage > max(COLUMN_COMPACTION_THRESHOLD, len(self.data) // 2):
+			self.compact(range(len(self.starts)))
+
+	def compact(self, rows):
+		''' packs the strings of some rows in a new buffer, they become rows 0, 1, ... '''
+
+		data = bytearray()
+		self.entry_starts = array('q')
+		self.entry_rows = array('q')
+		starts = array('q')
+		lengths = array('I')
+		for new_row, row in enumerate(rows):
+			start = self.starts[row]
+			length = self.lengths[row]
+			if self.searchable and length:
+				self.entry_starts.append(len(data))
+				self.entry_rows.append(new_row)
+			starts.append(len(data))
+			lengths.append(length)
+			data += self.data[start:start + length]
+		self.data = data
+		self.starts = starts
+		self.lengths = lengths
+		self.garbage = 0
+
+	def search(self, text):
+		''' returns the rows whose strings contain a non-empty text, in no particular order '''
+
+		needle = text.encode('utf-8')
+		data = self.data
+		rows = []
+		position = data.find(needle)
+		while position != -1:
+			# the match belongs to the string starting last before it, if it ends within that string
+			i = bisect_right(self.entry_starts, position) - 1
+			row = self.entry_rows[i]
+			end = self.entry_starts[i] + self.lengths[row] if row >= 0 else -1
+			if position + len(needle) <= end:
+				rows.append(row)
+				position = data.find(needle, end)
+			else:
+				position = data.find(needle, position + 1)
+		return rows
+
+class TableRecord(EmptyRecord):
+	''' empty record of the patients built from a table, the records they open are kept by the table '''
+
+	__slots__ = ('records',)
+
+	def __init__(self, records):
+		''' constructs an empty record that keeps the opened records in a dict '''
+		super().__init__(note_dao=EMPTY_RECORD.note_dao)
+		self.records = records
+
+	def open(self, patient):
+		''' opens the record of a patient, or returns the one another copy of the patient opened '''
+		record = self.records.get(patient.phn)
+		if record is None:
+			record = super().open(patient)
+			self.records[patient.phn] = record
+		return record
+
+	def opened_record(self, patient):
+		''' returns the record another copy of the patient opened, or this one '''
+		return self.records.get(patient.phn, self)
+
+class PatientValues():
+	''' view of the patients of a table, built as they are iterated over '''
+
+	def __init__(self, table):
+		self.table = table
+
+	def __len__(self):
+		return len(self.table)
+
+	def __iter__(self):
+		return map(self.table.patient, self.table.live_rows())
+
+class PatientTable():
+	''' column-oriented registry of patients, used like a dict from PHN to patient
+
+		The PHNs are kept in an array, the other fields in packed string
+		columns, and patients are only built when they are returned. Rows
+		stay in insertion order; deleted rows are dropped when the table is
+		compacted. PHNs are found in a sorted array, those added since it was
+		sorted in a smaller dict and sorted list. PHNs must be integers.
+	'''
+
+	def __init__(self, durability=None):
+		''' constructs an empty table, whose patients save their notes with a durability policy '''
+
+		self.durability = durability
+		self.count = 0
+
+		# one entry per row, in insertion order
+		self.phns = array('q')
+		self.autosave = bytearray()
+		self.live = bytearray()
+		self.columns = [StringColumn(field == 'name') for field in STRING_FIELDS]
+		self.name_column = self.columns[0]
+
+		# PHNs sorted with their rows, and the PHNs added since with PHN -> row
+		self.index_phns = array('q')
+		self.index_rows = array('q')
+		self.recent_phns = []
+		self.recent = {}
+
+		# PHN -> record opened by a patient, shared by every patient built for the row
+		self.records = {}
+		self.empty_record = TableRecord(self.records)
+
+	def copy(self):
+		''' returns a copy of the rows, sharing the opened records '''
+
+		table = PatientTable(self.durability)
+		table.count = self.count
+		table.phns = array('q', self.phns)
+		table.autosave = bytearray(self.autosave)
+		table.live = bytearray(self.live)
+		table.columns = [column.copy() for column in self.columns]
+		table.name_column = table.columns[0]
+		table.index_phns = array('q', self.index_phns)
+		table.index_rows = array('q', self.index_rows)
+		table.recent_phns = list(self.recent_phns)
+		table.recent = dict(self.recent)
+		table.records = self.records
+		table.empty_record = self.empty_record
+		return table
+
+	def find_row(self, key):
+		''' returns the row of a PHN, or None '''
+
+		if not isinstance(key, int):
+			return None
+		row = self.recent.get(key)
+		if row is not None:
+			return row
+		i = bisect_left(self.index_phns, key)
+		if i < len(self.index_phns) and self.index_phns[i] == key:
+			row = self.index_rows[i]
+			if self.live[row]:
+				return row
+		return None
+
+	def patient(self, row):
+		''' builds the patient of a row '''
+
+		key = self.phns[row]
+		patient = Patient(key, *[column.get(row) for column in self.columns],
+			autosave=bool(self.autosave[row]), durability=self.durability)
+		patient.record = self.records.get(key, self.empty_record)
+		return patient
+
+	def live_rows(self):
+		''' returns an iterator over the rows that were not deleted, in insertion order '''
+
+		return compress(range(len(self.phns)), self.live)
+
+	def __len__(self):
+		return self.count
+
+	def __contains__(self, key):
+		return self.find_row(key) is not None
+
+	def __iter__(self):
+		return compress(self.phns, self.live)
+
+	def __getitem__(self, key):
+		row = self.find_row(key)
+		if row is None:
+			raise KeyError(key)
+		return self.patient(row)
+
+	def get(self, key, default=None):
+		''' returns the patient with a PHN, or a default '''
+
+		row = self.find_row(key)
+		if row is None:
+			return default
+		return self.patient(row)
+
+	def keys(self):
+		''' returns an iterator over the PHNs, in insertion order '''
+
+		return iter(self)
+
+	def values(self):
+		''' returns a view building the patients, in insertion order '''
+
+		return PatientValues(self)
+
+	def items(self):
+		''' returns an iterator over the PHN and patient pairs, in insertion order '''
+
+		return zip(iter(self), self.values())
+
+	def names(self):
+		''' returns an iterator over the PHN and name pairs, in insertion order '''
+
+		return zip(iter(self), map(self.name_column.get, self.live_rows()))
+
+	def __setitem__(self, key, patient):
+		''' stores the fields of a patient in its row, adding a row for a new PHN '''
+
+		row = self.find_row(key)
+		if row is None:
+			row = len(self.phns)
+			self.phns.append(key)
+			self.autosave.append(bool(patient.autosave))
+			self.live.append(1)
+			for column, field in zip(self.columns, STRING_FIELDS):
+				column.append(getattr(patient, field))
+			self.count += 1
+			self.recent[key] = row
+			insort(self.recent_phns, key)
+			if len(self.recent) > max(MERGE_THRESHOLD, len(self.index_phns) // 4):
+				self.merge_recent()
+		else:
+			self.autosave[row] = bool(patient.autosave)
+			for column, field in zip(self.columns, STRING_FIELDS):
+				column.set(row, getattr(patient, field))
+
+		# the row takes the record of the stored patient, like a dict would
+		record = patient.record
+		if not isinstance(record, EmptyRecord):
+			self.records[key] = record
+		elif record is not self.empty_record:
+			self.records.pop(key, None)
+
+	def pop(self, key, *default):
+		''' removes the row of a PHN and returns its patient, or a default '''
+
+		row = self.find_row(key)
+		if row is None:
+			if default:
+				return default[0]
+			raise KeyError(key)
+		patient = self.patient(row)
+
+		self.live[row] = 0
+		self.count -= 1
+		if self.recent.pop(key, None) is not None:
+			del self.recent_phns[bisect_left(self.recent_phns, key)]
+		self.records.pop(key, None)
+		for column in self.columns:
+			column.clear(row)
+
+		deleted = len(self.phns) - self.count
+		if deleted > max(ROW_COMPACTION_THRESHOLD, len(self.phns) // 2):
+			self.compact()
+		return patient
+
+	def merge_recent(self):
+		''' sorts the rows added since the last merge in with the sorted PHNs '''
+
+		if not self.recent:
+			return
+		rows = list(compress(self.index_rows, map(self.live.__getitem__, self.index_rows)))
+		rows.extend(sorted(self.recent.values(), key=self.phns.__getitem__))
+		# both runs are already sorted, sorting them only merges them
+		rows.sort(key=self.phns.__getitem__)
+		self.index_rows = array('q', rows)
+		self.index_phns = array('q', map(self.phns.__getitem__, rows))
+		self.recent_phns = []
+		self.recent = {}
+
+	def compact(self):
+		''' drops the deleted rows, renumbering the others '''
+
+		rows = list(self.live_rows())
+		self.phns = array('q', map(self.phns.__getitem__, rows))
+		self.autosave = bytearray(map(self.autosave.__getitem__, rows))
+		self.live = bytearray(b'\x01') * len(rows)
+		for column in self.columns:
+			column.compact(rows)
+
+		order = sorted(range(len(rows)), key=self.phns.__getitem__)
+		self.index_rows = array('q', order)
+		self.index_phns = array('q', map(self.phns.__getitem__, order))
+		self.recent_phns = []
+		self.recent = {}
+
+	def sections(self):
+		''' returns the arrays and buffers that hold the table, in the order from_sections takes them '''
+
+		self.merge_recent()
+		sections = [self.phns, self.autosave, self.live]
+		for column in self.columns:
+			sections += [column.data, column.starts, column.lengths, column.entry_starts, column.entry_rows]
+		return sections + [self.index_phns, self.index_rows]
+
+	@classmethod
+	def from_sections(cls, sections, durability=None):
+		''' builds a table from the arrays and buffers returned by sections() '''
+
+		table = cls(durability)
+		sections = iter(sections)
+		table.phns, table.autosave, table.live = next(sections), next(sections), next(sections)
+		for column in table.columns:
+			column.data, column.starts, column.lengths, column.entry_starts, column.entry_rows = \
+				[next(sections) for i in range(5)]
+			column.garbage = len(column.data) - sum(column.lengths)
+		table.index_phns, table.index_rows = next(sections), next(sections)
+		table.count = table.live.count(1)
+		return table
+
+	def search_rows(self, search_string):
+		''' returns the rows whose names contain the search string, in insertion order '''
+
+		if not search_string:
+			return list(self.live_rows())
+		rows = self.name_column.search(search_string)
+		rows.sort()
+		return rows
+
+	def search(self, search_string):
+		''' returns the PHNs whose names contain the search string, in insertion order '''
+
+		return [self.phns[row] for row in self.search_rows(search_string)]
+
+	def sorted_rows(self, after=None):
+		''' returns an iterator over the rows in increasing PHN order, after a given PHN '''
+
+		start = 0 if after is None else bisect_right(self.index_phns, after)
+		sorted_rows = (self.index_rows[i] for i in range(start, len(self.index_rows)) if self.live[self.index_rows[i]])
+		recent_start = 0 if after is None else bisect_right(self.recent_phns, after)
+		recent_rows = (self.recent[self.recent_phns[i]] for i in range(recent_start, len(self.recent_phns)))
+		return merge(sorted_rows, recent_rows, key=self.phns.__getitem__)
+
+	def sorted_keys(self, after=None):
+		''' returns an iterator over the PHNs in increasing order, after a given PHN '''
+
+		return map(self.phns.__getitem__, self.sorted_rows(after))
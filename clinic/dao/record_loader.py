@@ -0,0 +1,91 @@
+''' eager loading of the notes of every patient, read by a pool of workers
+
+Records are normally opened when their notes are first needed. Loading them
+eagerly runs in three phases: scan finds the patients that have notes on
+disk, read deserializes their notes on a thread or process pool, and index
+hands the notes to the records and builds their text indexes.
+'''
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.note_segment_store import RECORDS_DIRECTORY, replay_extents, segment_store
+
+# serial reads the notes on the calling thread, the others on a pool of workers
+EAGER_MODES = ('serial', 'thread', 'process')
+
+RECORD_PATTERN = re.compile(r'(\d+)\.(dat|log)$')
+
+logger = logging.getLogger(__name__)
+
+def read_record_file(phn):
+	''' reads the notes of a patient's record file and log, as load_notes takes them '''
+
+	note_dao = NoteDAOPickle(phn, autosave=True)
+	notes, rewrite = note_dao.read_notes()
+	return notes, rewrite, note_dao.snapshot_size, note_dao.log_size
+
+def read_record_extents(extents):
+	''' replays the extents of a patient read from the segment store, as load_notes takes them '''
+
+	extents, damaged = extents
+	notes, snapshot_size, log_size, frame_damage = replay_extents(extents)
+	return notes, damaged + frame_damage > 0, snapshot_size, log_size
+
+def recorded_phns(store, directory=RECORDS_DIRECTORY):
+	''' returns the PHNs of the patients with notes on disk '''
+
+	if store is not None:
+		return list(store.extents)
+	phns = set()
+	for filename in os.listdir(directory):
+		match = RECORD_PATTERN.match(filename)
+		if match:
+			phns.add(int(match.group(1)))
+	return sorted(phns)
+
+def load_records(patient_dao, mode='thread', workers=None):
+	''' loads the notes of every patient of a DAO, returns the seconds taken by each phase '''
+
+	if mode not in EAGER_MODES:
+		raise ValueError("Unknown eager loading mode: %s" % (mode))
+	times = {}
+
+	start = time.perf_counter()
+	store = segment_store()
+	patients = []
+	for phn in recorded_phns(store):
+		patient = patient_dao.search_patient(phn)
+		if patient is not None:
+			patients.append(patient)
+	times['scan'] = time.perf_counter() - start
+
+	# the segments are read in turn, only their extents are replayed by the workers
+	start = time.perf_counter()
+	if store is None:
+		task, arguments = read_record_file, [patient.phn for patient in patients]
+	else:
+		task = read_record_extents
+		arguments = []
+		for patient in patients:
+			with store.lock:
+				arguments.append(store.read_extents(patient.phn))
+	if mode == 'serial':
+		loaded = list(map(task, arguments))
+	else:
+		executor_class = ThreadPoolExecutor if mode == 'thread' else ProcessPoolExecutor
+		with executor_class(workers) as executor:
+			# processes take the patients in chunks, to pay the transfers less often
+			loaded = list(executor.map(task, arguments, chunksize=64))
+	times['read'] = time.perf_counter() - start
+
+	start = time.perf_counter()
+	for patient, notes in zip(patients, loaded):
+		patient.get_patient_record().note_dao.load_notes(notes)
+	times['index'] = time.perf_counter() - start
+
+	logger.info("loaded the notes of %d patients (%s, %s workers): %s", len(patients), mode, workers or 'default',
+		', '.join('%s %.3f s' % (phase, seconds) for phase, seconds in times.items()))
+	return times
@@ -0,0 +1,287 @@
+''' checksummed records, crash-safe file replacement, and the recovery of damaged data files
+
+Patients are stored one JSON document per line, each line sealed with the
+CRC32 of its text. Notes are stored as frames, each with the length and the
+CRC32 of its pickled data, after a magic that tells the file kind; segment
+files and their index frame their extents the same way. A record that does
+not match its checksum is skipped, and reading goes on with the next intact
+one. The index of the segments and the checkpoint of the patients are only
+derived from other files: a damaged one is set aside to be rebuilt.
+
+usage: python -m clinic.dao.recovery [--repair] [files ...]
+'''
+import argparse
+import glob
+import logging
+import os
+import shutil
+import struct
+import zlib
+
+# hexadecimal CRC32 and a space before the text of each patient line
+CHECKSUM_LENGTH = 8
+
+# length and CRC32 of the data of each note frame
+FRAME_HEADER = struct.Struct('<II')
+
+# longest frame looked for when skipping over damaged data: checking the CRC32 of a
+# frame of any length that fits at every offset would take time quadratic in the file
+RESYNC_LENGTH = 1024 * 1024
+
+# first bytes of the record files and of the logs of notes, of the segment files
+# and of their index, and of the checkpoints of the patients
+RECORD_MAGIC = b'CLNREC01'
+LOG_MAGIC = b'CLNLOG01'
+SEGMENT_MAGIC = b'CLNSEG01'
+INDEX_MAGIC = b'CLNIDX01'
+CHECKPOINT_MAGIC = b'CLNCKP01'
+MAGIC_LENGTH = 8
+
+logger = logging.getLogger(__name__)
+
+def seal_line(text):
+	''' returns a line of text prefixed with its CRC32 '''
+
+	if isinstance(text, str):
+		text = text.encode('utf-8')
+	return b'%08x %s\n' % (zlib.crc32(text), text)
+
+def open_line(line):
+	''' returns the text of a sealed line, or None if it does not match its checksum
+
+		Lines of older files have no checksum, they are returned as they are.
+	'''
+
+	if line.startswith(b'{'):
+		return line
+	if len(line) <= CHECKSUM_LENGTH or line[CHECKSUM_LENGTH:CHECKSUM_LENGTH + 1] != b' ':
+		return None
+	try:
+		checksum = int(line[:CHECKSUM_LENGTH], 16)
+	except ValueError:
+		return None
+	text = line[CHECKSUM_LENGTH + 1:]
+	return text if zlib.crc32(text) == checksum else None
+
+def scan_lines(data):
+	''' returns the texts of the intact lines, the number of damaged lines, and where the intact lines end
+
+		A last line without its newline was torn by an interrupted write:
+		it is left out, but not counted as damaged.
+	'''
+
+	lines = data.split(b'\n')
+	# what follows the last newline is the torn line, if any
+	intact_end = len(data) - len(lines.pop())
+	texts = []
+	damaged = 0
+	for line in lines:
+		line = line.rstrip(b'\r')
+		if line:
+			text = open_line(line)
+			if text is None:
+				damaged += 1
+			else:
+				texts.append(text)
+	return texts, damaged, intact_end
+
+def frame(data):
+	''' returns some data framed with its length and CRC32 '''
+
+	return FRAME_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+def frame_end(data, position, max_length=None):
+	''' returns where the frame at a position ends, or None if it is not intact or longer than max_length '''
+
+	if position + FRAME_HEADER.size > len(data):
+		return None
+	length, checksum = FRAME_HEADER.unpack_from(data, position)
+	start = position + FRAME_HEADER.size
+	end = start + length
+	# frames are never empty, eight zero bytes are not a frame
+	if not length or end > len(data) or (max_length is not None and length > max_length):
+		return None
+	if zlib.crc32(data[start:end]) != checksum:
+		return None
+	return end
+
+def scan_frames(data, position=0, accept=None):
+	''' returns the data of the intact frames from a position, the number of damaged
+		stretches skipped over, and where the intact frames end '''
+
+	positions, damaged, intact_end = scan_frame_positions(data, position, accept)
+	frames = [data[start + FRAME_HEADER.size:end] for start, end in positions]
+	return frames, damaged, intact_end
+
+def scan_frame_positions(data, position=0, accept=None):
+	''' returns where the intact frames from a position start and end, the number of
+		damaged stretches skipped over, and where the intact frames end
+
+		A damaged frame is skipped by looking for the next intact one, no
+		longer than RESYNC_LENGTH and whose data passes accept, when given:
+		frames may hold frames of their own, which must not be taken for the
+		next one. When there is none, the rest was torn by an interrupted
+		write: it is left out, but not counted as damaged.
+	'''
+
+	positions = []
+	damaged = 0
+	intact_end = position
+	while position < len(data):
+		end = frame_end(data, position)
+		if end is not None:
+			positions.append((position, end))
+			position = intact_end = end
+			continue
+		for next_position in range(position + 1, len(data) - FRAME_HEADER.size):
+			next_end = frame_end(data, next_position, RESYNC_LENGTH)
+			if next_end is not None and (accept is None or accept(data[next_position + FRAME_HEADER.size:next_end])):
+				damaged += 1
+				position = next_position
+				break
+		else:
+			break
+	return positions, damaged, intact_end
+
+def read_file(filename):
+	''' returns the contents of a file, empty if it does not exist '''
+
+	try:
+		with open(filename, 'rb') as file:
+			return file.read()
+	except FileNotFoundError:
+		return b''
+
+def sync_directory(filename):
+	''' syncs the directory of a file, so that its new name survives a crash '''
+
+	# directories cannot be opened for syncing on Windows
+	if os.name != 'posix':
+		return
+	descriptor = os.open(os.path.dirname(filename) or '.', os.O_RDONLY)
+	try:
+		os.fsync(descriptor)
+	finally:
+		os.close(descriptor)
+
+def replace_file(filename, chunks, sync=True):
+	''' writes chunks of data to a temporary file, then puts it in place of a file
+
+		The file is never truncated in place: a crash leaves either the old or
+		the new file. Returns the number of bytes written.
+	'''
+
+	temporary_filename = filename + '.tmp'
+	size = 0
+	with open(temporary_filename, 'wb') as file:
+		for chunk in chunks:
+			file.write(chunk)
+			size += len(chunk)
+		if sync:
+			file.flush()
+			os.fsync(file.fileno())
+	os.replace(temporary_filename, filename)
+	if sync:
+		sync_directory(filename)
+	return size
+
+def keep_damaged(filename, damaged):
+	''' keeps a copy of a damaged file before its intact records are written back '''
+
+	shutil.copyfile(filename, filename + '.damaged')
+	logger.warning("%s: skipped %d damaged records, the damaged file is kept as %s.damaged",
+		filename, damaged, filename)
+
+def scan_file(filename):
+	''' returns the intact records of a data file, the number of damaged ones, whether the
+		file ends with a torn record, and the chunks that write its intact records back
+
+		The chunks are None for a checkpoint, which is removed rather than
+		written back. Returns None for record files of the older format,
+		which have no checksums.
+	'''
+
+	data = read_file(filename)
+	magic = data[:MAGIC_LENGTH]
+	if magic in (RECORD_MAGIC, LOG_MAGIC):
+		records, damaged, intact_end = scan_frames(data, MAGIC_LENGTH)
+		chunks = [magic] + [frame(record) for record in records]
+	elif magic == SEGMENT_MAGIC:
+		# the extents hold frames of notes, which are not extents of their own
+		from clinic.dao.note_segment_store import valid_extent
+		records, damaged, intact_end = scan_frames(data, MAGIC_LENGTH, valid_extent)
+		chunks = [magic] + [frame(record) for record in records]
+	elif magic == INDEX_MAGIC:
+		# an index without its frame makes the store scan every segment again
+		records, damaged, intact_end = scan_frames(data, MAGIC_LENGTH)
+		chunks = [magic] + [frame(record) for record in records]
+	elif magic == CHECKPOINT_MAGIC:
+		# the checkpoint needs the patient table, which itself needs this module
+		from clinic.dao.checkpoint import read_sections
+		from clinic.exception.damaged_record_exception import DamagedRecordException
+		try:
+			records = read_sections(data, filename)[0]
+			damaged = 0
+		except DamagedRecordException:
+			records, damaged = [], 1
+		return records, damaged, False, None
+	elif data.startswith(b'\x80'):
+		return None
+	else:
+		records, damaged, intact_end = scan_lines(data)
+		chunks = [seal_line(record) for record in records]
+	return records, damaged, intact_end < len(data), chunks
+
+def salvage_file(filename):
+	''' writes back only the intact records of a damaged file, keeping a copy of it
+
+		Returns the number of intact and damaged records, or None for files
+		of the older format.
+	'''
+
+	scan = scan_file(filename)
+	if scan is None:
+		return None
+	records, damaged, torn, chunks = scan
+	if damaged or torn:
+		keep_damaged(filename, damaged + torn)
+		if chunks is None:
+			os.remove(filename)
+		else:
+			replace_file(filename, chunks)
+		# the extents of a segment move when it is written back, the index must be rebuilt
+		if chunks and chunks[0] == SEGMENT_MAGIC:
+			replace_file(os.path.join(os.path.dirname(filename), 'notes.idx'), [INDEX_MAGIC])
+	return len(records), damaged + torn
+
+def data_files(directory='clinic'):
+	''' lists the patient and note files of a data directory '''
+
+	filenames = [os.path.join(directory, name) for name in ['patients.json', 'patients.journal', 'patients.journal.old',
+		'patients.ckpt']]
+	filenames += sorted(glob.glob(os.path.join(directory, 'records', '*.dat')))
+	filenames += sorted(glob.glob(os.path.join(directory, 'records', '*.log')))
+	filenames += sorted(glob.glob(os.path.join(directory, 'records', 'notes-*.seg')))
+	filenames += [os.path.join(directory, 'records', 'notes.idx')]
+	return [filename for filename in filenames if os.path.exists(filename)]
+
+def main():
+	parser = argparse.ArgumentParser(description='Checks the clinic data files, salvaging the intact records of damaged ones.')
+	parser.add_argument('files', nargs='*')
+	parser.add_argument('--repair', action='store_true', help='write back the intact records of damaged files')
+	args = parser.parse_args()
+
+	logging.basicConfig(format='%(message)s')
+	for filename in args.files or data_files():
+		scan = scan_file(filename)
+		if scan is None:
+			print('%s: older format without checksums' % (filename))
+			continue
+		records, damaged, torn, chunks = scan
+		status = 'ok' if not damaged and not torn else '%d damaged%s' % (damaged, ', torn at the end' if torn else '')
+		print('%s: %d intact records, %s' % (filename, len(records), status))
+		if args.repair and (damaged or torn):
+			salvage_file(filename)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,102 @@
+import threading
+
+class RWLock():
+	''' reader-writer lock: many readers at once, or a single writer
+
+		Waiting writers go before new readers, so a steady flow of readers
+		cannot starve them. Both sides are reentrant, and the writer may also
+		read, but a reader cannot upgrade to writing.
+	'''
+
+	def __init__(self):
+		''' constructs an unlocked lock '''
+
+		self.condition = threading.Condition(threading.Lock())
+
+		# thread -> number of read acquisitions it holds
+		self.readers = {}
+		self.writer = None
+		self.writer_depth = 0
+		self.waiting_writers = 0
+
+		# reusable with-statement guards for either side
+		self.read_guard = LockGuard(self.acquire_read, self.release_read)
+		self.write_guard = LockGuard(self.acquire_write, self.release_write)
+
+	def acquire_read(self):
+		''' waits until no writer holds or waits for the lock, then reads '''
+
+		me = threading.get_ident()
+		with self.condition:
+			# nested reads must not wait behind writers, they would wait on themselves
+			if self.writer != me and me not in self.readers:
+				while self.writer is not None or self.waiting_writers:
+					self.condition.wait()
+			self.readers[me] = self.readers.get(me, 0) + 1
+
+	def release_read(self):
+		''' releases one read acquisition '''
+
+		me = threading.get_ident()
+		with self.condition:
+			count = self.readers[me] - 1
+			if count:
+				self.readers[me] = count
+			else:
+				del self.readers[me]
+				# only writers wait for the readers to leave
+				if not self.readers and self.waiting_writers:
+					self.condition.notify_all()
+
+	def acquire_write(self):
+		''' waits until nobody else holds the lock, then writes '''
+
+		me = threading.get_ident()
+		with self.condition:
+			if self.writer == me:
+				self.writer_depth += 1
+				return
+			if me in self.readers:
+				raise RuntimeError("Cannot upgrade a read lock to a write lock.")
+			self.waiting_writers += 1
+			try:
+				while self.writer is not None or self.readers:
+					self.condition.wait()
+			finally:
+				self.waiting_writers -= 1
+			self.writer = me
+			self.writer_depth = 1
+
+	def release_write(self):
+		''' releases one write acquisition '''
+
+		with self.condition:
+			self.writer_depth -= 1
+			if not self.writer_depth:
+				self.writer = None
+				self.condition.notify_all()
+
+	def reading(self):
+		''' returns a guard that holds the lock for reading during a with block '''
+
+		return self.read_guard
+
+	def writing(self):
+		''' returns a guard that holds the lock for writing during a with block '''
+
+		return self.write_guard
+
+class LockGuard():
+	''' with-statement guard that calls an acquire function on entry and a release function on exit '''
+
+	def __init__(self, acquire, release):
+		''' constructs a guard '''
+
+		self.acquire = acquire
+		self.release = release
+
+	def __enter__(self):
+		self.acquire()
+
+	def __exit__(self, exception_type, exception, traceback):
+		self.release()
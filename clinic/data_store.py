@@ -0,0 +1,111 @@
+import time
+import threading
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.dao.patient_dao_mmap import PatientDAOMmap
+from clinic.dao.patient_dao_columnar import PatientDAOColumnar
+from clinic.dao.durability import Durability, STRICT
+from clinic.dao.note_segment_store import NoteSegmentStore, has_segments
+from clinic.dao.record_loader import EAGER_MODES, load_records
+
+class DataStore():
+	''' class that holds the data shared by every session: the users and the patient DAO
+
+		A store is loaded once and outlives the sessions that use it, so
+		logging out and in again does not read the data files again.
+		Its durability mode (strict, group or lazy) decides when changes
+		reach the disk. Notes are kept in a file per patient, or in shared
+		segment files once the records were migrated or when asked. The
+		columnar backend can mirror its patients in a binary checkpoint.
+		The notes of the JSON and columnar backends can be loaded eagerly
+		by a pool of workers (eager is serial, thread or process), and
+		load_times holds the seconds taken by each phase of the start.
+		The store also knows which patients are the current patient of a
+		session, so that no session changes them under another.
+	'''
+
+	def __init__(self, autosave=False, journal=False, backend='json', durability=STRICT, segments=False,
+			checkpoint=False, eager=None, workers=None):
+		''' loads the users and opens the patient DAO and the note segments '''
+
+		if checkpoint and backend != 'columnar':
+			raise ValueError("Only the columnar backend keeps a checkpoint, not %s" % (backend))
+		if eager is not None and (eager not in EAGER_MODES or backend not in ('json', 'columnar')):
+			raise ValueError("Notes cannot be loaded eagerly in %s mode with the %s backend" % (eager, backend))
+		self.autosave = autosave
+		self.journal = journal
+		self.backend = backend
+		self.checkpoint = checkpoint
+		self.durability = Durability(durability)
+
+		# PHN -> number of sessions that have the patient as their current patient
+		self.current_patients = {}
+		self.current_lock = threading.Lock()
+
+		self.note_store = None
+		if self.autosave and (segments or has_segments()):
+			self.note_store = NoteSegmentStore()
+
+		if self.autosave:
+			self.users = self.load_users()
+		else:
+			self.users = \
+			{"user":"8d969eef6ecad3c29a3a629280e686cf0c3f5d5a86aff3ca12020c923adc6c92", \
+			"ali":"6394ffec21517605c1b426d43e6fa7eb0cff606ded9c2956821c2c36bfee2810", \
+			"kala":"e5268ad137eec951a48a5e5da52558c7727aaa537c8b308b5e403e6b434e036e"}
+
+		start = time.perf_counter()
+		if self.backend == 'json':
+			self.patient_dao = PatientDAOJSON(self.autosave, self.journal, durability=self.durability)
+		elif self.backend == 'sqlite':
+			self.patient_dao = PatientDAOSQLite(self.autosave, self.durability)
+		elif self.backend == 'mmap':
+			self.patient_dao = PatientDAOMmap(self.autosave, durability=self.durability)
+		elif self.backend == 'columnar':
+			self.patient_dao = PatientDAOColumnar(self.autosave, self.journal, durability=self.durability,
+				checkpoint=self.checkpoint)
+		else:
+			raise ValueError("Unknown storage backend: %s" % (self.backend))
+		self.load_times = {'patients': time.perf_counter() - start}
+
+		# records kept in memory are only loaded eagerly when they are saved
+		if eager is not None and self.autosave:
+			self.load_times.update(load_records(self.patient_dao, eager, workers))
+
+	def hold_patient(self, phn):
+		''' records that a session made a patient its current patient '''
+
+		with self.current_lock:
+			self.current_patients[phn] = self.current_patients.get(phn, 0) + 1
+
+	def release_patient(self, phn):
+		''' records that a session no longer has a patient as its current patient '''
+
+		with self.current_lock:
+			count = self.current_patients.pop(phn) - 1
+			if count:
+				self.current_patients[phn] = count
+
+	def is_held(self, phn):
+		''' checks whether a patient is the current patient of some session '''
+
+		with self.current_lock:
+			return phn in self.current_patients
+
+	def load_users(self):
+		''' loads the users and their password hashes '''
+
+		users = {}
+		with open('clinic/users.txt', 'r') as file:
+			for line in file:
+				tokens = line.strip().split(',')
+				users[tokens[0]] = tokens[1]
+		return users
+
+	def close(self):
+		''' flushes the pending changes and releases the files held by the patient DAO '''
+
+		self.durability.close()
+		self.patient_dao.close()
+		if self.note_store is not None:
+			self.note_store.close()
@@ -0,0 +1,2 @@
+class DamagedRecordException(Exception):
+	''' Damaged Record '''
\ No newline at end of file
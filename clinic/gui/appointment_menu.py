@@ -2,12 +2,14 @@ from PyQt6.QtWidgets import QWidget, QVBoxLayout, QWidget, QPushButton, QMessage
 from PyQt6.QtCore import QStringListModel
 from clinic.exception.illegal_access_exception import IllegalAccessException
 from clinic.exception.no_current_patient_exception import NoCurrentPatientException
+from clinic.gui.controller_executor import ControllerExecutor
 
 class AppointmentMenu(QWidget):
     
-    def __init__(self, controller, parent = None):
+    def __init__(self, controller, parent = None, executor = None):
         super().__init__(parent)
         self.controller = controller
+        self.executor = executor if executor is not None else ControllerExecutor(self)
         self.setWindowTitle("Appointment Menu")
         self.setup_ui()
 
@@ -41,60 +43,69 @@ class AppointmentMenu(QWidget):
 
     def create_note(self):
         """Add a note to the current patient's record."""
-        try:
-            text, ok = QInputDialog.getText(self, "Add Note", "Enter note for patient:")
-            if not ok or not text.strip():
-                return
-
-            text = text.strip()
-            self.controller.create_note(text)
-            QMessageBox.information(self, "Success", "Note added to the patient's record.")
-        except IllegalAccessException:
+        text, ok = QInputDialog.getText(self, "Add Note", "Enter note for patient:")
+        if not ok or not text.strip():
+            return
+
+        text = text.strip()
+        # Saving the note may write the record to disk, so it runs in the background
+        self.executor.submit(self.controller.create_note, text,
+                             on_result=lambda note: QMessageBox.information(self, "Success", "Note added to the patient's record."),
+                             on_error=self.show_create_note_error)
+
+    def show_create_note_error(self, error):
+        if isinstance(error, IllegalAccessException):
             QMessageBox.warning(self, "Access Denied", "You must log in first to add a note.")
-        except NoCurrentPatientException:
+        elif isinstance(error, NoCurrentPatientException):
             QMessageBox.warning(self, "Error", "Cannot add a note without a valid current patient.")
+        else:
+            QMessageBox.warning(self, "Error", str(error))
 
     def retrieve_notes(self):
         """Retrieve notes for the current patient."""
-        try:
-            search_string, ok = QInputDialog.getText(self, "Retrieve Notes", "Enter text to search in notes:")
-            if not ok or not search_string.strip():
-                return
-
-            search_string = search_string.strip()
-            
-            found_notes = self.controller.retrieve_notes(search_string)
-            if not found_notes:
-                QMessageBox.information(self, "No Results", f"No notes found for: {search_string}")
-                return
-            
-            dialog = QDialog(self)
-            dialog.setWindowTitle(f"Notes Found for: {search_string}")
-            dialog.resize(600, 400)
-            layout = QVBoxLayout(dialog)
-
-            # QPlainTextEdit to display notes
-            notes_display = QPlainTextEdit(dialog)
-            notes_display.setReadOnly(True)
-
-            # Populate the QPlainTextEdit with note data
-            for note in found_notes:
-                # Assuming each note has attributes: id, date, and text
-                note_text = f"Note ID: {note.code}\nDate: {note.timestamp}\nText: {note.text}\n\n"
-                notes_display.appendPlainText(note_text)
-
-            layout.addWidget(notes_display)
-
-            # Show the dialog
-            dialog.setLayout(layout)
-            dialog.exec()
-
-        except IllegalAccessException:
+        search_string, ok = QInputDialog.getText(self, "Retrieve Notes", "Enter text to search in notes:")
+        if not ok or not search_string.strip():
+            return
+
+        search_string = search_string.strip()
+        # Loading the notes may read the record from disk, so the search runs in the background
+        self.executor.submit(self.controller.retrieve_notes, search_string,
+                             on_result=lambda found_notes: self.show_found_notes(search_string, found_notes),
+                             on_error=self.show_retrieve_notes_error)
+
+    def show_found_notes(self, search_string, found_notes):
+        if not found_notes:
+            QMessageBox.information(self, "No Results", f"No notes found for: {search_string}")
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Notes Found for: {search_string}")
+        dialog.resize(600, 400)
+        layout = QVBoxLayout(dialog)
+
+        # QPlainTextEdit to display notes
+        notes_display = QPlainTextEdit(dialog)
+        notes_display.setReadOnly(True)
+
+        # Populate the QPlainTextEdit with note data
+        for note in found_notes:
+            # Assuming each note has attributes: id, date, and text
+            note_text = f"Note ID: {note.code}\nDate: {note.timestamp}\nText: {note.text}\n\n"
+            notes_display.appendPlainText(note_text)
+
+        layout.addWidget(notes_display)
+
+        # Show the dialog
+        dialog.setLayout(layout)
+        dialog.exec()
+
+    def show_retrieve_notes_error(self, error):
+        if isinstance(error, IllegalAccessException):
             QMessageBox.critical(self, "Error", "Please log in to retrieve notes.")
-        except NoCurrentPatientException:
+        elif isinstance(error, NoCurrentPatientException):
             QMessageBox.critical(self, "Error", "Cannot retrieve notes without a valid current patient.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An unexpected error occurred: {str(e)}") 
+        else:
+            QMessageBox.critical(self, "Error", f"An unexpected error occurred: {str(error)}")
 
     def update_note(self):
         """Update a note for the current patient."""
@@ -111,11 +122,9 @@ class AppointmentMenu(QWidget):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             new_text = dialog.textValue().strip()
             if new_text:
-                try:
-                    self.controller.update_note(int(code), new_text)
-                    QMessageBox.information(self, "Success", "Note updated successfully.")
-                except Exception as e:
-                    QMessageBox.warning(self, "Error", str(e))
+                self.executor.submit(self.controller.update_note, int(code), new_text,
+                                     on_result=lambda updated: QMessageBox.information(self, "Success", "Note updated successfully."),
+                                     on_error=lambda error: QMessageBox.warning(self, "Error", str(error)))
             else:
                 QMessageBox.warning(self, "Error", "Updated note content cannot be empty.")
 
@@ -126,35 +135,38 @@ class AppointmentMenu(QWidget):
             QMessageBox.critical(self, "Error", "No patient selected to delete notes.")
             return
 
-        try:
-            # Prompt the user to enter the note number
-            code, ok = QInputDialog.getInt(self, "Delete Note", "Enter Note Number:")
-            if not ok:
-                return  # User canceled
-
-            # Search for the note with the given code
-            note = self.controller.search_note(code)
-            if not note:
-                QMessageBox.warning(self, "Note Not Found", f"No note found with code #{code}.")
-                return
-
-            # Confirm the deletion
-            confirm = QMessageBox.question(
-                self,
-                "Confirm Deletion",
-                f"Are you sure you want to delete note #{note.code}?\n\n{note.text}",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-            )
-
-            if confirm == QMessageBox.StandardButton.Yes:
-                # Call the controller to delete the note
-                self.controller.delete_note(code)
-                QMessageBox.information(self, "Success", f"Note #{code} has been successfully deleted.")
-            else:
-                QMessageBox.information(self, "Cancelled", "Note deletion cancelled.")
+        # Prompt the user to enter the note number
+        code, ok = QInputDialog.getInt(self, "Delete Note", "Enter Note Number:")
+        if not ok:
+            return  # User canceled
+
+        # Search for the note with the given code, then ask for confirmation
+        self.executor.submit(self.controller.search_note, code,
+                             on_result=lambda note: self.confirm_delete_note(code, note),
+                             on_error=self.show_delete_note_error)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred while deleting the note: {str(e)}")
+    def confirm_delete_note(self, code, note):
+        if not note:
+            QMessageBox.warning(self, "Note Not Found", f"No note found with code #{code}.")
+            return
+
+        # Confirm the deletion
+        confirm = QMessageBox.question(
+            self,
+            "Confirm Deletion",
+            f"Are you sure you want to delete note #{note.code}?\n\n{note.text}",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+
+        if confirm == QMessageBox.StandardButton.Yes:
+            self.executor.submit(self.controller.delete_note, code,
+                                 on_result=lambda deleted: QMessageBox.information(self, "Success", f"Note #{code} has been successfully deleted."),
+                                 on_error=self.show_delete_note_error)
+        else:
+            QMessageBox.information(self, "Cancelled", "Note deletion cancelled.")
+
+    def show_delete_note_error(self, error):
+        QMessageBox.critical(self, "Error", f"An error occurred while deleting the note: {str(error)}")
 
     def list_all_notes(self):
         """Display the full record of the current patient, including all notes."""
@@ -162,38 +174,37 @@ class AppointmentMenu(QWidget):
             QMessageBox.critical(self, "Error", "No patient selected to list the record.")
             return
 
-        try:
-            # Get the list of notes for the current patient
-            notes = self.controller.list_notes()
-            
-            if not notes:
-                QMessageBox.information(self, "No Notes", "This patient has no notes in their record.")
-                return
+        # Loading the notes may read the record from disk, so it runs in the background
+        self.executor.submit(self.controller.list_notes,
+                             on_result=self.show_notes,
+                             on_error=lambda error: QMessageBox.critical(self, "Error", f"An error occurred while retrieving the patient record: {str(error)}"))
 
-            # Create a dialog to display the notes
-            dialog = QDialog(self)
-            dialog.setWindowTitle("Patient Record")
-            dialog.setModal(True)
-            dialog.resize(600, 400)
+    def show_notes(self, notes):
+        if not notes:
+            QMessageBox.information(self, "No Notes", "This patient has no notes in their record.")
+            return
 
-            # Create the layout for the dialog
-            layout = QVBoxLayout(dialog)
+        # Create a dialog to display the notes
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Patient Record")
+        dialog.setModal(True)
+        dialog.resize(600, 400)
 
-            # Create a QListView to display the notes
-            list_view = QListView(dialog)
-            list_model = QStringListModel()
+        # Create the layout for the dialog
+        layout = QVBoxLayout(dialog)
 
-            # Prepare the list of note strings to display
-            note_strings = [f"Note #{note.code}: {note.text}" for note in notes]
-            list_model.setStringList(note_strings)
+        # Create a QListView to display the notes
+        list_view = QListView(dialog)
+        list_model = QStringListModel()
 
-            list_view.setModel(list_model)
+        # Prepare the list of note strings to display
+        note_strings = [f"Note #{note.code}: {note.text}" for note in notes]
+        list_model.setStringList(note_strings)
 
-            # Add the list view to the dialog layout
-            layout.addWidget(list_view)
+        list_view.setModel(list_model)
 
-            # Show the dialog
-            dialog.exec()
+        # Add the list view to the dialog layout
+        layout.addWidget(list_view)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"An error occurred while retrieving the patient record: {str(e)}")
\ No newline at end of file
+        # Show the dialog
+        dialog.exec()
@@ -4,12 +4,16 @@ from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QTa
 from clinic.exception.invalid_login_exception import InvalidLoginException
 from clinic.gui.main_dashboard import MainDashboard
 from clinic.controller import Controller
+from clinic.data_store import DataStore
 
 class ClinicGUI(QMainWindow):
 
-    def __init__(self):
+    def __init__(self, store = None):
         super().__init__()
-        self.controller = Controller(autosave = True)
+        # The data store is loaded once and handed from one session to the next
+        if store is None:
+            store = DataStore(autosave = True)
+        self.controller = Controller(store = store)
         # Continue here with your code!
         self.setWindowTitle("Clinic Management System Login")
         self.setGeometry(100, 100, 400, 300)  # Set the size of the window
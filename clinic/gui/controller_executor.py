@@ -0,0 +1,92 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class TaskSignals(QObject):
+    """Signals a task uses to hand its outcome back to the UI thread."""
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class ControllerTask(QRunnable):
+    """Runs one controller operation on a pool thread."""
+    def __init__(self, function, args, kwargs, key=None):
+        super().__init__()
+        # The executor keeps the task until its outcome is delivered
+        self.setAutoDelete(False)
+        self.key = key
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = TaskSignals()
+
+    def cancel(self):
+        """Ask the task not to run, or to drop its outcome if it is already running."""
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(e)
+            return
+        self.signals.finished.emit(result)
+
+
+class ControllerExecutor(QObject):
+    """Runs controller operations off the UI thread and delivers their results or exceptions
+    back on the UI thread. Tasks submitted with the same key coalesce: a newer task cancels
+    the one still queued or running, whose outcome is then dropped. Only reads are keyed,
+    so writes are never dropped."""
+    def __init__(self, parent=None, max_threads=1):
+        super().__init__(parent)
+        # A single worker runs the tasks in the order they were submitted, so a patient chosen
+        # is current before their notes are handled, and a saved note is there for a later list
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.tasks = set()
+        self.latest = {}
+
+    def submit(self, function, *args, key=None, on_result=None, on_error=None, **kwargs):
+        """Run function(*args, **kwargs) on a pool thread and return the task."""
+        if key is not None and key in self.latest:
+            self.cancel(self.latest[key])
+
+        task = ControllerTask(function, args, kwargs, key)
+        task.signals.finished.connect(lambda result: self.deliver(task, key, on_result, result))
+        task.signals.failed.connect(lambda error: self.deliver(task, key, on_error, error))
+        self.tasks.add(task)
+        if key is not None:
+            self.latest[key] = task
+        self.pool.start(task)
+        return task
+
+    def cancel(self, task):
+        """Cancel a task, removing it from the queue if it has not started yet."""
+        task.cancel()
+        if self.pool.tryTake(task):
+            self.forget(task)
+
+    def deliver(self, task, key, callback, outcome):
+        """Hand a task's outcome to its callback, unless the task was superseded."""
+        self.forget(task)
+        if task.cancelled:
+            return
+        if key is not None:
+            if self.latest.get(key) is not task:
+                return
+            del self.latest[key]
+        if callback is not None:
+            callback(outcome)
+
+    def forget(self, task):
+        self.tasks.discard(task)
+
+    def shutdown(self):
+        """Cancel the queued reads and wait for the writes, queued or running, to finish."""
+        for task in list(self.tasks):
+            if task.key is not None:
+                self.cancel(task)
+        self.pool.waitForDone()
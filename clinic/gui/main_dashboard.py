@@ -1,15 +1,21 @@
-from PyQt6.QtCore import Qt, QAbstractTableModel
-from PyQt6.QtGui import QStandardItem, QStandardItemModel
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QPushButton, QSpacerItem, QSizePolicy, QVBoxLayout, QLineEdit, QPlainTextEdit, QDialog, QLabel, QMessageBox, QTableView, QHBoxLayout, QAbstractItemView, QInputDialog
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QStringListModel, QTimer
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QPushButton, QSpacerItem, QSizePolicy, QVBoxLayout, QLineEdit, QPlainTextEdit, QDialog, QLabel, QMessageBox, QTableView, QHBoxLayout, QAbstractItemView, QInputDialog, QCompleter
 from clinic.exception.invalid_logout_exception import InvalidLogoutException
 from clinic.exception.illegal_access_exception import IllegalAccessException
 from clinic.exception.illegal_operation_exception import IllegalOperationException
+from clinic.dao.patient_dao import PAGE_SIZE
+from clinic.gui.controller_executor import ControllerExecutor
+
+# Milliseconds without typing before the name suggestions are fetched
+SUGGESTION_DELAY = 250
 
 class MainDashboard(QMainWindow):
 
     def __init__(self, controller):
         super().__init__()
         self.controller = controller
+        # Controller operations run on a worker thread so the window stays responsive
+        self.executor = ControllerExecutor(self)
         self.setWindowTitle("Main Dashboard")
         self.resize(600, 600)
 
@@ -52,6 +58,19 @@ class MainDashboard(QMainWindow):
         self.search_input.setPlaceholderText("Enter Name")
         search_layout.addWidget(self.search_input)
 
+        # Suggest patients while the name is typed, once typing pauses
+        self.suggestions = []
+        self.suggestion_model = QStringListModel(self)
+        self.completer = QCompleter(self.suggestion_model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.activated[QModelIndex].connect(self.choose_suggestion)
+        self.search_input.setCompleter(self.completer)
+        self.suggestion_timer = QTimer(self)
+        self.suggestion_timer.setSingleShot(True)
+        self.suggestion_timer.setInterval(SUGGESTION_DELAY)
+        self.suggestion_timer.timeout.connect(self.suggest_patients)
+        self.search_input.textEdited.connect(self.suggestion_timer.start)
+
         self.search_name_button = QPushButton("Search by Name", self)
         self.search_name_button.clicked.connect(self.open_retrieve_patients_window)
         search_layout.addWidget(self.search_name_button)
@@ -85,12 +104,12 @@ class MainDashboard(QMainWindow):
     def open_appointment_menu(self):
         """Open the Appointment Menu window."""
         from clinic.gui.appointment_menu import AppointmentMenu  # Import the class
-        self.appointment_menu = AppointmentMenu(self.controller)
+        self.appointment_menu = AppointmentMenu(self.controller, executor=self.executor)
         self.appointment_menu.show()
 
     def open_create_patient_window(self):
         """Open the 'Create Patient' dialog."""
-        self.create_patient_window = self.CreatePatientWindow(self.controller)
+        self.create_patient_window = self.CreatePatientWindow(self.controller, self.executor)
         self.create_patient_window.exec()  # Show the dialog modally
 
     def open_search_patient_window(self):
@@ -104,11 +123,35 @@ class MainDashboard(QMainWindow):
             # Validate PHN as an integer
             phn = int(phn)
             # Open the search patient dialog with the PHN
-            self.search_patient_window = self.SearchPatientWindow(self.controller, phn)
+            self.search_patient_window = self.SearchPatientWindow(self.controller, phn, self.executor)
             self.search_patient_window.exec()  # Show the dialog modally
         except ValueError:
             QMessageBox.warning(self, "Input Error", "PHN must be a valid number.")
 
+    def suggest_patients(self):
+        """Fetch the patients whose names start with what was typed so far."""
+        prefix = self.search_input.text()
+        if not prefix.strip():
+            self.show_suggestions(prefix, [])
+            return
+        # Suggestions are best effort, a failed lookup just shows none
+        self.executor.submit(self.controller.suggest_patients, prefix, key="suggest_patients",
+                             on_result=lambda patients: self.show_suggestions(prefix, patients))
+
+    def show_suggestions(self, prefix, patients):
+        """Show the suggested patients, unless the name changed since they were fetched."""
+        if prefix != self.search_input.text():
+            return
+        self.suggestions = patients
+        self.suggestion_model.setStringList([patient.name for patient in patients])
+        if patients:
+            self.completer.complete()
+
+    def choose_suggestion(self, index):
+        """Fill in the PHN of the chosen patient, so they can be opened directly."""
+        if 0 <= index.row() < len(self.suggestions):
+            self.phn_input.setText(str(self.suggestions[index.row()].phn))
+
     def open_retrieve_patients_window(self):
         name = self.search_input.text().strip()
         if not name:
@@ -116,14 +159,17 @@ class MainDashboard(QMainWindow):
             return
 
         """Open the 'Retrieve Patients' dialog."""
-        self.retrieve_patients_window = self.RetrievePatientsWindow(self.controller, name)
+        self.retrieve_patients_window = self.RetrievePatientsWindow(self.controller, name, self.executor)
         self.retrieve_patients_window.show()  # Show the dialog modally
 
     def handle_logout(self):
         try:
             from clinic.gui.clinic_gui import ClinicGUI
+            # Saves still queued are written before the session ends
+            self.executor.shutdown()
             self.controller.logout()
-            self.login_window = ClinicGUI()
+            # The next session reuses the loaded data store
+            self.login_window = ClinicGUI(self.controller.store)
             self.login_window.show()
             self.close()
         except InvalidLogoutException: # This should never happen as the only way that the logout button should be accessed is when one is logged in
@@ -131,11 +177,27 @@ class MainDashboard(QMainWindow):
 
     def open_list_patients_dialog(self):
         """Open a dialog showing all patients."""
+        # Fetch the first page of patients in the background, the table view fetches the others while scrolling
+        model = PatientsCursorModel(self.controller)
+        self.list_patients_button.setEnabled(False)
+        self.executor.submit(model.fetch_page, key="list_patients",
+                             on_result=lambda page: self.show_list_patients_dialog(model, page),
+                             on_error=self.handle_list_patients_error)
+
+    def handle_list_patients_error(self, error):
+        self.list_patients_button.setEnabled(True)
+        if isinstance(error, IllegalAccessException):
+            self.show_message("Login Required", "Please log in to view the patients.")
+        else:
+            self.show_message("Error", f"An error occurred while listing the patients: {error}")
+
+    def show_list_patients_dialog(self, model, page):
+        """Show the dialog with the first page of patients."""
+        self.list_patients_button.setEnabled(True)
         try:
-            # Get the list of patients from the controller
-            patients = self.controller.list_patients()
+            model.add_page(page)
 
-            if not patients:
+            if model.rowCount() == 0:
                 QMessageBox.warning(self, "No Patients", "There are no patients registered in the clinic.")
                 return
 
@@ -145,21 +207,8 @@ class MainDashboard(QMainWindow):
             dialog.setModal(True)
             dialog.resize(600, 400)
 
-            # Create the table view and model
+            # Create the table view
             table_view = QTableView(dialog)
-            model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(['PHN', 'Name', 'Date of Birth', 'Phone Number', 'Email', 'Home Address'])
-
-            # Populate the model with patient data
-            for patient in patients:
-                phn_item = QStandardItem(str(patient.phn))
-                name_item = QStandardItem(patient.name)
-                dob_item = QStandardItem(patient.birth_date)
-                phone_item = QStandardItem(patient.phone)
-                email_item = QStandardItem(patient.email)
-                address_item = QStandardItem(patient.address)
-                model.appendRow([phn_item, name_item, dob_item, phone_item, email_item, address_item])
-
             table_view.setModel(model)
             table_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
 
@@ -176,35 +225,44 @@ class MainDashboard(QMainWindow):
 
     def start_appointment(self):
         """Start an appointment for the selected patient."""
-        try:
-            #Prompt the user to enter the PHN
-            phn, ok = QInputDialog.getText(self, "Choose Patient", "Enter Personal Health Number (PHN):")
-            if not ok:
-                return  # User pressed cancel or entered nothing
+        #Prompt the user to enter the PHN
+        phn, ok = QInputDialog.getText(self, "Choose Patient", "Enter Personal Health Number (PHN):")
+        if not ok:
+            return  # User pressed cancel or entered nothing
 
-            phn = phn.strip()
+        phn = phn.strip()
 
-            if not phn.isdigit():
-                QMessageBox.warning(self, "Invalid Input", "PHN must be a numeric value.")
-                return
-            
-            phn = int(phn)
-
-            # Set the current patient in the controller
-            self.controller.set_current_patient(phn)
-            current_patient = self.controller.get_current_patient()
-            #self.manage_notes_button.setEnabled(True)
-
-            # Show patient data in a dialog
-            self.show_patient_data_dialog(current_patient)
-            return True
-
-        except IllegalAccessException:
+        if not phn.isdigit():
+            QMessageBox.warning(self, "Invalid Input", "PHN must be a numeric value.")
+            return
+        
+        phn = int(phn)
+
+        # Setting the current patient reads their record from disk, so it runs in the background;
+        # notes cannot be managed until the patient is set
+        self.manage_notes_button.setEnabled(False)
+        self.executor.submit(self.choose_patient, phn,
+                             on_result=self.show_chosen_patient,
+                             on_error=lambda error: self.handle_start_appointment_error(error, phn))
+        return True
+
+    def show_chosen_patient(self, patient):
+        self.manage_notes_button.setEnabled(True)
+        self.show_patient_data_dialog(patient)
+
+    def choose_patient(self, phn):
+        """Set the current patient in the controller and return them, safe to call off the UI thread."""
+        self.controller.set_current_patient(phn)
+        return self.controller.get_current_patient()
+
+    def handle_start_appointment_error(self, error, phn):
+        self.manage_notes_button.setEnabled(True)
+        if isinstance(error, IllegalAccessException):
             self.show_message("Login Required", "Please log in to choose a patient.")
-        except IllegalOperationException:
+        elif isinstance(error, IllegalOperationException):
             self.show_message("Error", f"No patient is registered with PHN {phn}.")
-        except ValueError:
-            self.show_message("Invalid Input", "PHN must be a valid number.")
+        else:
+            self.show_message("Error", f"An error occurred while choosing the patient: {error}")
 
     def show_patient_data_dialog(self, patient):
         """Display the patient's data in a dialog."""
@@ -234,9 +292,10 @@ class MainDashboard(QMainWindow):
         msg.exec()
     
     class SearchPatientWindow(QDialog):                         # Opens a separate window when the user inputs a phn
-        def __init__(self, controller, phn=None):
+        def __init__(self, controller, phn=None, executor=None):
             super().__init__()
             self.controller = controller
+            self.executor = executor if executor is not None else ControllerExecutor(self)
             self.phn = phn
             self.setWindowTitle("Patient Profile")
             self.setGeometry(200, 200, 400, 400)
@@ -264,18 +323,25 @@ class MainDashboard(QMainWindow):
                 self.handle_search_patient(phn)
 
         def handle_search_patient(self, phn):
-            try:
-                patient = self.controller.search_patient(phn)
-                self.current_patient = patient
-                if patient:
-                    self.patient_display.setPlainText(self.format_patient_information(patient))
-                    self.delete_patient_button.setEnabled(True)
-                    for field in self.fields.values():
-                            field.setEnabled(True)
-                else:
-                    self.patient_display.setPlainText("There is no patient registered with this phn. Please try again.")
-            except IllegalAccessException:
-                    self.patient_data_display.setPlainText("Must login first.")
+            self.executor.submit(self.controller.search_patient, phn, key="search_patient",
+                                 on_result=self.show_patient,
+                                 on_error=self.show_search_error)
+
+        def show_patient(self, patient):
+            self.current_patient = patient
+            if patient:
+                self.patient_display.setPlainText(self.format_patient_information(patient))
+                self.delete_patient_button.setEnabled(True)
+                for field in self.fields.values():
+                        field.setEnabled(True)
+            else:
+                self.patient_display.setPlainText("There is no patient registered with this phn. Please try again.")
+
+        def show_search_error(self, error):
+            if isinstance(error, IllegalAccessException):
+                self.patient_display.setPlainText("Must login first.")
+            else:
+                self.patient_display.setPlainText(f"An error occurred while searching: {error}")
 
         def format_patient_information(self, patient):
             return f"PHN: {patient.phn}\nName: {patient.name}\nDate of Birth: {patient.birth_date}\nPhone Number: {patient.phone}\nEmail Address: {patient.email}\nHome Address: {patient.address}"
@@ -296,26 +362,38 @@ class MainDashboard(QMainWindow):
             )
 
             if confirm == QMessageBox.StandardButton.Yes:
-                try:
-                    # Attempt to delete the patient
-                    success = self.controller.delete_patient(phn)
-                    if success:
-                        QMessageBox.information(self, "Success", f"Patient {self.current_patient.name} has been deleted.")
-                        self.close()  # Close the window or reset the form
-                    else:
-                        QMessageBox.critical(self, "Delete Failed", "Failed to delete the patient. Please try again.")
-                except IllegalAccessException:
-                    QMessageBox.critical(self, "Access Denied", "You must be logged in to delete a patient.")
-                except IllegalOperationException:
-                    QMessageBox.critical(self, "Operation Not Allowed", "Cannot delete the current patient during an appointment.")
+                # Deleting the patient may rewrite the patients file, so it runs in the background
+                self.delete_patient_button.setEnabled(False)
+                name = self.current_patient.name
+                self.executor.submit(self.controller.delete_patient, phn,
+                                     on_result=lambda success: self.show_deletion(name, success),
+                                     on_error=self.show_delete_error)
             else:
                 QMessageBox.information(self, "Cancelled", "Patient deletion canceled.")
 
+        def show_deletion(self, name, success):
+            if success:
+                QMessageBox.information(self, "Success", f"Patient {name} has been deleted.")
+                self.close()  # Close the window or reset the form
+            else:
+                self.delete_patient_button.setEnabled(True)
+                QMessageBox.critical(self, "Delete Failed", "Failed to delete the patient. Please try again.")
+
+        def show_delete_error(self, error):
+            self.delete_patient_button.setEnabled(True)
+            if isinstance(error, IllegalAccessException):
+                QMessageBox.critical(self, "Access Denied", "You must be logged in to delete a patient.")
+            elif isinstance(error, IllegalOperationException):
+                QMessageBox.critical(self, "Operation Not Allowed", "Cannot delete the current patient during an appointment.")
+            else:
+                QMessageBox.critical(self, "Delete Failed", f"Failed to delete the patient: {error}")
+
 
     class CreatePatientWindow(QDialog):
-        def __init__(self, controller):
+        def __init__(self, controller, executor=None):
             super().__init__()
             self.controller = controller
+            self.executor = executor if executor is not None else ControllerExecutor(self)
             self.setWindowTitle("Add New Patient")
             self.setGeometry(200, 200, 400, 400)
 
@@ -354,37 +432,48 @@ class MainDashboard(QMainWindow):
             layout.addWidget(self.address_input)
 
             # Submit button
-            submit_button = QPushButton("Create Patient", self)
-            submit_button.clicked.connect(self.handle_create_patient)
-            layout.addWidget(submit_button)
+            self.submit_button = QPushButton("Create Patient", self)
+            self.submit_button.clicked.connect(self.handle_create_patient)
+            layout.addWidget(self.submit_button)
 
         def handle_create_patient(self):
             try:
                 phn = int(self.phn_input.text().strip())
-                name = self.name_input.text().strip()
-                birth_date = self.birth_date_input.text().strip()
-                phone = self.phone_input.text().strip()
-                email = self.email_input.text().strip()
-                address = self.address_input.text().strip()
-
-                # Call the controller to create the patient
-                self.controller.create_patient(phn, name, birth_date, phone, email, address)
-
-                # Show success message and close dialog
-                QMessageBox.information(self, "Success", "Patient added successfully!")
-                self.accept()  # Close the dialog
             except ValueError:
                 QMessageBox.critical(self, "Error", "PHN must be a valid number.")
-            except IllegalAccessException:
+                return
+            name = self.name_input.text().strip()
+            birth_date = self.birth_date_input.text().strip()
+            phone = self.phone_input.text().strip()
+            email = self.email_input.text().strip()
+            address = self.address_input.text().strip()
+
+            # Creating the patient may rewrite the patients file, so it runs in the background
+            self.submit_button.setEnabled(False)
+            self.executor.submit(self.controller.create_patient, phn, name, birth_date, phone, email, address,
+                                 on_result=self.show_created,
+                                 on_error=lambda error: self.show_create_error(error, phn))
+
+        def show_created(self, patient):
+            # Show success message and close dialog
+            QMessageBox.information(self, "Success", "Patient added successfully!")
+            self.accept()  # Close the dialog
+
+        def show_create_error(self, error, phn):
+            self.submit_button.setEnabled(True)
+            if isinstance(error, IllegalAccessException):
                 QMessageBox.critical(self, "Error", "You must log in first.")
-            except IllegalOperationException:
+            elif isinstance(error, IllegalOperationException):
                 QMessageBox.critical(self, "Error", f"A patient with PHN {phn} already exists.")
+            else:
+                QMessageBox.critical(self, "Error", f"An error occurred while creating the patient: {error}")
 
 
     class RetrievePatientsWindow(QWidget):                  # Opens a separate window when the user inputs a name and the corresponding patients appear
-        def __init__(self, controller, name = None):
+        def __init__(self, controller, name = None, executor = None):
             super().__init__()
             self.controller = controller
+            self.executor = executor if executor is not None else ControllerExecutor(self)
             self.setWindowTitle("Retrieve Patients by Name")
             self.resize(800, 600)
 
@@ -419,16 +508,24 @@ class MainDashboard(QMainWindow):
                 QMessageBox.warning(self, "Input Error", "Please enter a name to search.")
                 return
 
-            try:
-                found_patients = self.controller.retrieve_patients(search_string)
-                if found_patients:
-                    # Set up the QTableView with the results
-                    self.patients_table.setModel(PatientsTableModel(found_patients))
-                else:
-                    QMessageBox.information(self, "No Results", f"No patients found with name: {search_string}")
-                    self.patients_table.setModel(None)  # Clear the table
-            except IllegalAccessException:
+            # A newer search supersedes the one still running
+            self.executor.submit(self.controller.retrieve_patients, search_string, key="retrieve_patients",
+                                 on_result=lambda found_patients: self.show_found_patients(search_string, found_patients),
+                                 on_error=self.show_search_error)
+
+        def show_found_patients(self, search_string, found_patients):
+            if found_patients:
+                # Set up the QTableView with the results
+                self.patients_table.setModel(PatientsTableModel(found_patients))
+            else:
+                QMessageBox.information(self, "No Results", f"No patients found with name: {search_string}")
+                self.patients_table.setModel(None)  # Clear the table
+
+        def show_search_error(self, error):
+            if isinstance(error, IllegalAccessException):
                 QMessageBox.critical(self, "Access Error", "You must log in first.")
+            else:
+                QMessageBox.critical(self, "Error", f"An error occurred while searching: {error}")
 
 
 class PatientsTableModel(QAbstractTableModel):                                      # Opens a table when the List all Patients button is pressed
@@ -468,4 +565,40 @@ class PatientsTableModel(QAbstractTableModel):
                 return self.headers[section]
             if orientation == Qt.Orientation.Vertical:
                 return str(section + 1)
-        return None
\ No newline at end of file
+        return None
+
+
+class PatientsCursorModel(PatientsTableModel):
+    """Table model that fetches patients from the controller a page at a time, in PHN order."""
+    def __init__(self, controller, page_size=PAGE_SIZE):
+        super().__init__([])
+        self.controller = controller
+        self.page_size = page_size
+        self.exhausted = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        self.add_page(self.fetch_page())
+
+    def fetch_page(self):
+        """Fetch the page after the last patient fetched so far, safe to call off the UI thread."""
+        after_phn = self.patients[-1].phn if self.patients else None
+        return list(self.controller.iter_patients(after_phn, self.page_size))
+
+    def add_page(self, page):
+        """Append a fetched page to the model."""
+        if len(page) < self.page_size:
+            self.exhausted = True
+        if not page:
+            return
+
+        first_row = len(self.patients)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(page) - 1)
+        self.patients.extend(page)
+        self.endInsertRows()
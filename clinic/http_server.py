@@ -0,0 +1,306 @@
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import loads, dumps
+from urllib.parse import urlsplit, parse_qs
+from clinic.dao.patient_dao import PAGE_SIZE, SUGGESTION_LIMIT
+from clinic.data_store import DataStore
+from clinic.session_manager import SessionManager
+from clinic.exception.invalid_login_exception import InvalidLoginException
+from clinic.exception.duplicate_login_exception import DuplicateLoginException
+from clinic.exception.invalid_logout_exception import InvalidLogoutException
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.exception.illegal_operation_exception import IllegalOperationException
+from clinic.exception.no_current_patient_exception import NoCurrentPatientException
+
+# largest page of patients a client may ask for
+MAX_PAGE_SIZE = 1000
+
+# largest request body (in bytes) the server reads
+MAX_BODY_SIZE = 1024 * 1024
+
+# method, path and name of the handler method of each operation
+ROUTES = [
+	('POST', r'/sessions', 'login'),
+	('DELETE', r'/sessions', 'logout'),
+	('GET', r'/patients', 'list_patients'),
+	('POST', r'/patients', 'create_patient'),
+	('GET', r'/patients/suggestions', 'suggest_patients'),
+	('GET', r'/patients/(\d+)', 'search_patient'),
+	('PUT', r'/patients/(\d+)', 'update_patient'),
+	('DELETE', r'/patients/(\d+)', 'delete_patient'),
+	('GET', r'/current_patient', 'get_current_patient'),
+	('PUT', r'/current_patient', 'set_current_patient'),
+	('DELETE', r'/current_patient', 'unset_current_patient'),
+	('GET', r'/notes', 'list_notes'),
+	('POST', r'/notes', 'create_note'),
+	('GET', r'/notes/(\d+)', 'search_note'),
+	('PUT', r'/notes/(\d+)', 'update_note'),
+	('DELETE', r'/notes/(\d+)', 'delete_note'),
+]
+ROUTES = [(method, re.compile(pattern + '$'), name) for method, pattern, name in ROUTES]
+
+# HTTP status of each controller exception
+ERROR_STATUS = [
+	(InvalidLoginException, 401),
+	(IllegalAccessException, 401),
+	(DuplicateLoginException, 409),
+	(InvalidLogoutException, 409),
+	(NoCurrentPatientException, 409),
+	(IllegalOperationException, 409),
+]
+
+PATIENT_FIELDS = ['phn', 'name', 'birth_date', 'phone', 'email', 'address']
+
+def patient_json(patient):
+	''' converts a patient to its JSON object '''
+
+	return {field: getattr(patient, field) for field in PATIENT_FIELDS}
+
+def note_json(note):
+	''' converts a note to its JSON object '''
+
+	return {"code": note.code, "text": note.text, "timestamp": note.timestamp.isoformat()}
+
+class RequestError(Exception):
+	''' a request that cannot be served, with the HTTP status to answer '''
+
+	def __init__(self, status, message):
+		super().__init__(message)
+		self.status = status
+
+class ClinicRequestHandler(BaseHTTPRequestHandler):
+	''' serves the controller operations as JSON over HTTP
+
+		Connections are kept alive between requests. A client opens a session
+		with POST /sessions and passes the returned id in the X-Session header;
+		a session left unused for half an hour is closed.
+	'''
+
+	protocol_version = 'HTTP/1.1'
+	server_version = 'Clinic/1.0'
+
+	# responses are small, send them without waiting for the previous ones to be acknowledged
+	disable_nagle_algorithm = True
+
+	def do_GET(self):
+		self.dispatch('GET')
+
+	def do_POST(self):
+		self.dispatch('POST')
+
+	def do_PUT(self):
+		self.dispatch('PUT')
+
+	def do_DELETE(self):
+		self.dispatch('DELETE')
+
+	def log_request(self, code='-', size='-'):
+		''' logs requests only when the server is verbose '''
+
+		if self.server.verbose:
+			super().log_request(code, size)
+
+	def dispatch(self, method):
+		''' routes a request to its handler method and sends the JSON answer '''
+
+		url = urlsplit(self.path)
+		self.query = parse_qs(url.query)
+		try:
+			# the body must be read even when the request fails, the connection is reused
+			self.body = self.read_body()
+			for route_method, pattern, name in ROUTES:
+				match = pattern.match(url.path)
+				if match and route_method == method:
+					status, answer = getattr(self, name)(*match.groups())
+					break
+			else:
+				raise RequestError(404, "No operation at %s %s." % (method, url.path))
+		except RequestError as e:
+			status, answer = e.status, {"error": str(e)}
+		except (ValueError, KeyError, TypeError) as e:
+			status, answer = 400, {"error": "Bad request: %s" % (e)}
+		except Exception as e:
+			status, answer = self.error_status(e), {"error": str(e)}
+		self.send_json(status, answer)
+
+	def error_status(self, error):
+		''' returns the HTTP status of a controller exception, logging unexpected ones '''
+
+		for exception_type, status in ERROR_STATUS:
+			if isinstance(error, exception_type):
+				return status
+		self.log_error("Unexpected error: %r", error)
+		return 500
+
+	def read_body(self):
+		''' reads the JSON body of the request, if any '''
+
+		try:
+			length = int(self.headers.get('Content-Length') or 0)
+		except ValueError:
+			length = -1
+		if length < 0 or length > MAX_BODY_SIZE:
+			# the body is not read, the connection cannot be reused
+			self.close_connection = True
+			if length < 0:
+				raise RequestError(400, "Bad request: invalid Content-Length.")
+			raise RequestError(413, "The body must not exceed %d bytes." % (MAX_BODY_SIZE))
+		if not length:
+			return {}
+		body = loads(self.rfile.read(length))
+		if not isinstance(body, dict):
+			raise ValueError("the body must be a JSON object")
+		return body
+
+	def send_json(self, status, answer):
+		''' sends a JSON answer, keeping the connection open '''
+
+		data = dumps(answer).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(data)))
+		if self.close_connection:
+			self.send_header('Connection', 'close')
+		self.end_headers()
+		self.wfile.write(data)
+
+	def query_value(self, name, default=None):
+		''' returns a query string parameter '''
+
+		values = self.query.get(name)
+		return values[0] if values else default
+
+	def body_value(self, name, value_type, default=None):
+		''' returns a field of the body, checking its type before anything is changed '''
+
+		value = self.body.get(name, default)
+		# JSON booleans are ints to Python, they are not accepted as numbers
+		if not isinstance(value, value_type) or isinstance(value, bool):
+			raise RequestError(400, "Bad request: %s must be a %s." % (name, 'number' if value_type is int else 'string'))
+		return value
+
+	def patient_values(self):
+		''' returns the patient fields of the body after the PHN '''
+
+		return [self.body_value(field, str) for field in PATIENT_FIELDS[1:]]
+
+	def controller(self):
+		''' returns the controller of the request's session '''
+
+		return self.server.session_manager.get_session(self.headers.get('X-Session'))
+
+	def login(self):
+		session_id = self.server.session_manager.login(self.body_value('username', str), self.body_value('password', str))
+		return 201, {"session": session_id}
+
+	def logout(self):
+		self.controller()
+		self.server.session_manager.close_session(self.headers.get('X-Session'))
+		return 200, {}
+
+	def list_patients(self):
+		after_phn = self.query_value('after')
+		after_phn = None if after_phn is None else int(after_phn)
+		limit = max(1, min(int(self.query_value('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+		name = self.query_value('name')
+		if name is None:
+			patients = list(self.controller().iter_patients(after_phn, limit))
+		else:
+			patients = self.controller().retrieve_patients_page(name, after_phn, limit)
+		# the last PHN of a full page is where the next page starts
+		next_phn = patients[-1].phn if len(patients) == limit else None
+		return 200, {"patients": [patient_json(patient) for patient in patients], "next": next_phn}
+
+	def suggest_patients(self):
+		limit = max(1, min(int(self.query_value('limit', SUGGESTION_LIMIT)), MAX_PAGE_SIZE))
+		patients = self.controller().suggest_patients(self.query_value('prefix', ''), limit)
+		return 200, {"patients": [patient_json(patient) for patient in patients]}
+
+	def search_patient(self, phn):
+		patient = self.controller().search_patient(int(phn))
+		if patient is None:
+			raise RequestError(404, "No patient with PHN %s." % (phn))
+		return 200, patient_json(patient)
+
+	def create_patient(self):
+		patient = self.controller().create_patient(self.body_value('phn', int), *self.patient_values())
+		return 201, patient_json(patient)
+
+	def update_patient(self, phn):
+		self.controller().update_patient(int(phn), self.body_value('phn', int, int(phn)), *self.patient_values())
+		return 200, {}
+
+	def delete_patient(self, phn):
+		self.controller().delete_patient(int(phn))
+		return 200, {}
+
+	def get_current_patient(self):
+		patient = self.controller().get_current_patient()
+		return 200, {"patient": None if patient is None else patient_json(patient)}
+
+	def set_current_patient(self):
+		self.controller().set_current_patient(self.body_value('phn', int))
+		return 200, {}
+
+	def unset_current_patient(self):
+		self.controller().unset_current_patient()
+		return 200, {}
+
+	def list_notes(self):
+		search_string = self.query_value('search')
+		if search_string is None:
+			notes = self.controller().list_notes()
+		else:
+			notes = self.controller().retrieve_notes(search_string)
+		return 200, {"notes": [note_json(note) for note in notes]}
+
+	def create_note(self):
+		note = self.controller().create_note(self.body_value('text', str))
+		return 201, note_json(note)
+
+	def search_note(self, code):
+		note = self.controller().search_note(int(code))
+		if note is None:
+			raise RequestError(404, "No note with code %s." % (code))
+		return 200, note_json(note)
+
+	def update_note(self, code):
+		if not self.controller().update_note(int(code), self.body_value('text', str)):
+			raise RequestError(404, "No note with code %s." % (code))
+		return 200, {}
+
+	def delete_note(self, code):
+		if not self.controller().delete_note(int(code)):
+			raise RequestError(404, "No note with code %s." % (code))
+		return 200, {}
+
+class ClinicHTTPServer(ThreadingHTTPServer):
+	''' HTTP server that serves every connection on its own thread, over shared sessions '''
+
+	daemon_threads = True
+
+	def __init__(self, address, session_manager, verbose=False):
+		''' binds the server to a (host, port) address '''
+
+		super().__init__(address, ClinicRequestHandler)
+		self.session_manager = session_manager
+		self.verbose = verbose
+
+def serve(host='127.0.0.1', port=8000, store=None):
+	''' serves the clinic until interrupted, on the loopback interface unless another host is given '''
+
+	owns_store = store is None
+	if store is None:
+		store = DataStore(autosave=True)
+	session_manager = SessionManager(store)
+	server = ClinicHTTPServer((host, port), session_manager, verbose=True)
+	print('Serving the clinic on http://%s:%d/' % server.server_address[:2])
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		session_manager.close()
+		if owns_store:
+			store.close()
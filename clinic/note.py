@@ -3,12 +3,23 @@ import datetime
 class Note():
 	''' class that represents a note '''
 
+	__slots__ = ('code', 'text', 'timestamp')
+
 	def __init__(self, code, text, timestamp=datetime.datetime.now()):
 		''' constructs a note '''
 		self.code = code
 		self.text = text
 		self.timestamp = timestamp
 
+	def __getstate__(self):
+		''' returns the fields to pickle, as a dictionary like notes had before they were slotted '''
+		return {'code': self.code, 'text': self.text, 'timestamp': self.timestamp}
+
+	def __setstate__(self, state):
+		''' restores the fields of a pickled note '''
+		for name, value in state.items():
+			setattr(self, name, value)
+
 	def __eq__(self, other):
 		''' checks whether this note is the same as other note '''
 		return self.code == other.code and self.text == other.text
@@ -1,9 +1,19 @@
-from clinic.patient_record import PatientRecord
+import threading
+from clinic.patient_record import PatientRecord, EmptyRecord, EMPTY_RECORD
+
+# guards the opening of records, so that a patient never gets two
+RECORD_LOCK = threading.Lock()
 
 class Patient():
-	''' class that represents a patient '''
+	''' class that represents a patient
+
+		Patients have no per-instance dictionary, and share the empty record
+		until their notes are first needed.
+	'''
 
-	def __init__(self, phn, name, birth_date, phone, email, address, autosave=False):
+	__slots__ = ('phn', 'name', 'birth_date', 'phone', 'email', 'address', 'autosave', 'durability', 'record', '__weakref__')
+
+	def __init__(self, phn, name, birth_date, phone, email, address, autosave=False, note_dao=None, durability=None):
 		''' constructs a patient '''
 		self.phn = phn
 		self.name = name
@@ -12,12 +22,30 @@ class Patient():
 		self.email = email
 		self.address = address
 		self.autosave = autosave
+		self.durability = durability
 
-		self.record = PatientRecord(self.phn, self.autosave)
+		if note_dao is None:
+			self.record = EMPTY_RECORD
+		else:
+			self.record = PatientRecord(self.phn, self.autosave, note_dao)
 
 	def get_patient_record(self):
-		''' get the patient's record '''
-		return self.record
+		''' get the patient's record, opening it the first time '''
+		record = self.record
+		if isinstance(record, EmptyRecord):
+			with RECORD_LOCK:
+				if isinstance(self.record, EmptyRecord):
+					self.record = self.record.open(self)
+				record = self.record
+		return record
+
+	def read_record(self):
+		''' get the record to read notes from, without opening one when there are no notes to read '''
+		# saved notes may be on disk even if the record was not opened yet
+		record = self.record
+		if isinstance(record, EmptyRecord) and not self.autosave:
+			return record.opened_record(self)
+		return self.get_patient_record()
 
 	def __eq__(self, other):
 		''' checks whether this patient is the same as other patient '''
@@ -36,24 +64,24 @@ class Patient():
 
 	def search_note(self, code):
 		''' delegates note search to the patient's record '''
-		return self.record.search_note(code)
+		return self.read_record().search_note(code)
 
 	def create_note(self, text):
 		''' delegates note creation to the patient's record '''
-		return self.record.create_note(text)
+		return self.get_patient_record().create_note(text)
 
 	def retrieve_notes(self, search_string):
 		''' delegates note retrieval to the patient's record '''
-		return self.record.retrieve_notes(search_string)
+		return self.read_record().retrieve_notes(search_string)
 
 	def update_note(self, code, new_text):
 		''' delegates note updating to the patient's record '''
-		return self.record.update_note(code, new_text)
+		return self.read_record().update_note(code, new_text)
 
 	def delete_note(self, code):
 		''' delegates note deletion to the patient's record '''
-		return self.record.delete_note(code)
+		return self.read_record().delete_note(code)
 
 	def list_notes(self):
 		''' delegates note listing to the patient's record '''
-		return self.record.list_notes()
+		return self.read_record().list_notes()
@@ -0,0 +1,42 @@
+import csv
+from json import loads
+
+PATIENT_FIELDS = ['phn', 'name', 'birth_date', 'phone', 'email', 'address']
+
+class ImportReport():
+	''' class that reports the outcome of a bulk patient import '''
+
+	def __init__(self):
+		''' constructs an empty report '''
+		self.imported = []
+		self.errors = []
+
+	def add_error(self, row_number, message):
+		''' records that a row could not be imported '''
+		self.errors.append((row_number, message))
+
+	def __str__(self):
+		''' converts the report to a string representation '''
+		return "%d patients imported, %d rows rejected" % (len(self.imported), len(self.errors))
+
+def read_patients_csv(filename):
+	''' yields the line numbers and rows of a CSV file whose header names the patient fields,
+		a row is numbered by the file line it ends on '''
+
+	with open(filename, 'r', newline='') as file:
+		reader = csv.DictReader(file)
+		for row in reader:
+			yield reader.line_num, row
+
+def read_patients_jsonl(filename):
+	''' yields the line numbers and objects of a file with one JSON patient per line,
+		lines that are not valid JSON are yielded as they are '''
+
+	with open(filename, 'r') as file:
+		for line_number, line in enumerate(file, 1):
+			if not line.strip():
+				continue
+			try:
+				yield line_number, loads(line)
+			except ValueError:
+				yield line_number, line
@@ -1,13 +1,28 @@
 from clinic.note import Note
 from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.note_dao_segment import NoteDAOSegment
+from clinic.dao.note_segment_store import segment_store
 from pickle import load, dump
 
 class PatientRecord():
 	''' class that represents a patient's medical record '''
 
-	def __init__(self, phn=None, autosave=False):
+	__slots__ = ('note_dao',)
+
+	def __init__(self, phn=None, autosave=False, note_dao=None, durability=None):
 		''' construct a patient record '''
-		self.note_dao = NoteDAOPickle(phn, autosave)
+		if note_dao is None:
+			# saved notes go to the segment store when one is open, else to files of their own
+			store = segment_store() if autosave else None
+			if store is None:
+				note_dao = NoteDAOPickle(phn, autosave, durability)
+			else:
+				note_dao = NoteDAOSegment(phn, store, durability)
+		self.note_dao = note_dao
+
+	def load_notes(self):
+		''' load the notes of the patient's record if not loaded yet '''
+		self.note_dao.load_notes()
 
 	def search_note(self, code):
 		''' search a note in the patient's record '''
@@ -33,3 +48,22 @@ class PatientRecord():
 		''' list all notes from the patient's record from the 
 			more recently added to the least recently added'''
 		return self.note_dao.list_notes()
+
+class EmptyRecord(PatientRecord):
+	''' record shared by the patients whose notes were not needed yet, it has no notes and takes none '''
+
+	__slots__ = ()
+
+	def open(self, patient):
+		''' opens the record of a patient that had this empty one '''
+		return PatientRecord(patient.phn, patient.autosave, None, patient.durability)
+
+	def opened_record(self, patient):
+		''' returns the record a patient with this empty one opened since, or this one '''
+		return self
+
+	def create_note(self, text):
+		''' refuses notes, the patient must open a record of its own first '''
+		raise RuntimeError("Notes cannot be created in the shared empty record.")
+
+EMPTY_RECORD = EmptyRecord()
\ No newline at end of file
@@ -0,0 +1,108 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from clinic.controller import Controller
+from clinic.data_store import DataStore
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+# seconds a session may stay unused before it is closed
+SESSION_TIMEOUT = 30 * 60
+
+class SessionManager():
+	''' class that issues sessions over one shared data store
+
+		Every session is a controller with its own login and current patient,
+		so many clinicians can work at once against the same loaded data.
+		Sessions are looked up by an opaque session id, and are closed once
+		they have not been used for a while.
+	'''
+
+	def __init__(self, store=None, session_timeout=SESSION_TIMEOUT):
+		''' constructs a session manager, loading a data store if none is given '''
+
+		# a data store given by the caller is closed by the caller
+		self.owns_store = store is None
+		if store is None:
+			store = DataStore()
+		self.store = store
+
+		# session id -> controller and when it was last used, the least recently used first
+		self.sessions = OrderedDict()
+		self.session_timeout = session_timeout
+		self.lock = threading.Lock()
+
+	def expire_sessions(self, now):
+		''' closes the sessions that were not used within the timeout '''
+
+		expired = []
+		with self.lock:
+			while self.sessions:
+				session_id, (controller, last_used) = next(iter(self.sessions.items()))
+				if now - last_used < self.session_timeout:
+					break
+				del self.sessions[session_id]
+				expired.append(controller)
+		for controller in expired:
+			if controller.logged:
+				controller.logout()
+
+	def open_session(self):
+		''' opens a logged out session and returns its id '''
+
+		now = time.monotonic()
+		self.expire_sessions(now)
+		session_id = secrets.token_hex(16)
+		with self.lock:
+			self.sessions[session_id] = (Controller(store=self.store), now)
+		return session_id
+
+	def get_session(self, session_id):
+		''' returns the controller of a session '''
+
+		now = time.monotonic()
+		self.expire_sessions(now)
+		with self.lock:
+			session = self.sessions.get(session_id)
+			if session is not None:
+				controller = session[0]
+				self.sessions[session_id] = (controller, now)
+				self.sessions.move_to_end(session_id)
+		if session is None:
+			raise IllegalAccessException("Illegal Access: Unknown or closed session.")
+		return controller
+
+	def login(self, username, password):
+		''' opens a session and logs a user in it, returning the session id '''
+
+		session_id = self.open_session()
+		try:
+			self.get_session(session_id).login(username, password)
+		except:
+			self.close_session(session_id)
+			raise
+		return session_id
+
+	def close_session(self, session_id):
+		''' logs out of a session, if needed, and forgets it '''
+
+		with self.lock:
+			session = self.sessions.pop(session_id, None)
+		if session is not None:
+			controller, last_used = session
+			if controller.logged:
+				controller.logout()
+
+	def list_sessions(self):
+		''' lists the ids of the open sessions '''
+
+		with self.lock:
+			return list(self.sessions)
+
+	def close(self):
+		''' closes every session, and the data store if the manager loaded it '''
+
+		for session_id in self.list_sessions():
+			self.close_session(session_id)
+		if self.owns_store:
+			self.store.close()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase
+from unittest import main
+from clinic.async_controller import AsyncController
+from clinic.controller import Controller
+from clinic.data_store import DataStore
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.exception.illegal_operation_exception import IllegalOperationException
+
+class AsyncControllerTest(IsolatedAsyncioTestCase):
+
+	async def asyncSetUp(self):
+		self.controller = AsyncController()
+
+	async def asyncTearDown(self):
+		await self.controller.close()
+
+	async def test_operations(self):
+		with self.assertRaises(IllegalAccessException, msg="must log in first"):
+			await self.controller.list_patients()
+		self.assertTrue(await self.controller.login("user", "123456"))
+
+		await self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		await self.controller.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		await self.controller.create_patient(9792226666, "Jim Doe", "1987-12-12", "250 203 3030", "jim.doe@gmail.com", "300 Moss St, Victoria")
+		with self.assertRaises(IllegalOperationException, msg="PHN already registered"):
+			await self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+
+		self.assertEqual((await self.controller.search_patient(9790014444)).name, "Mary Doe")
+		self.assertEqual(len(await self.controller.retrieve_patients("Doe")), 3)
+		self.assertEqual([patient.phn for patient in await self.controller.suggest_patients("ji")], [9792226666])
+
+		# streamed patients are fetched a page at a time, in PHN order
+		phns = [patient.phn async for patient in self.controller.iter_patients()]
+		self.assertEqual(phns, [9790012000, 9790014444, 9792226666])
+		phns = [patient.phn async for patient in self.controller.iter_patients(after_phn=9790012000, limit=1)]
+		self.assertEqual(phns, [9790014444])
+
+		await self.controller.set_current_patient(9790012000)
+		self.assertEqual((await self.controller.get_current_patient()).phn, 9790012000)
+		note = await self.controller.create_note("Patient comes with headache and high blood pressure.")
+		self.assertEqual((await self.controller.search_note(note.code)).text, note.text)
+		self.assertTrue(await self.controller.update_note(note.code, "Patient is feeling better."))
+		self.assertEqual(len(await self.controller.retrieve_notes("better")), 1)
+		self.assertTrue(await self.controller.delete_note(note.code))
+		self.assertEqual(await self.controller.list_notes(), [])
+		await self.controller.unset_current_patient()
+
+		await self.controller.update_patient(9790014444, 9790014444, "Mary Smith", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		self.assertTrue(await self.controller.delete_patient(9792226666))
+		self.assertEqual([patient.name for patient in await self.controller.list_patients()], ["John Doe", "Mary Smith"])
+		self.assertTrue(await self.controller.logout())
+
+	async def test_close_keeps_shared_store(self):
+		# closing the facade of one session leaves the store open for the others
+		store = DataStore(backend='sqlite')
+		facade = AsyncController(Controller(store=store))
+		await facade.close()
+		other = AsyncController(Controller(store=store))
+		self.assertTrue(await other.login("user", "123456"))
+		await other.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		self.assertEqual((await other.search_patient(9790012000)).name, "John Doe")
+		await other.close()
+		store.close()
+
+	async def test_reads_do_not_wait_for_writes(self):
+		await self.controller.login("user", "123456")
+		await self.controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+
+		# hold the write executor with a write that does not finish yet
+		release = threading.Event()
+		blocked_write = asyncio.create_task(self.controller.write(release.wait))
+		queued_write = asyncio.create_task(self.controller.delete_patient(9790012000))
+		await asyncio.sleep(0)
+
+		patient = await asyncio.wait_for(self.controller.search_patient(9790012000), 5)
+		self.assertEqual(patient.name, "John Doe")
+		self.assertFalse(queued_write.done(), "writes run one at a time, in order")
+
+		release.set()
+		await blocked_write
+		self.assertTrue(await queued_write)
+		self.assertIsNone(await self.controller.search_patient(9790012000))
+
+	async def test_event_loop_keeps_running(self):
+		await self.controller.login("user", "123456")
+		ticks = 0
+
+		async def tick():
+			nonlocal ticks
+			while True:
+				ticks += 1
+				await asyncio.sleep(0)
+
+		ticker = asyncio.create_task(tick())
+		await self.controller.import_patients([{"phn": 9000000000 + i, "name": "Patient %d" % (i), "birth_date": "2000-01-01",
+			"phone": "250 000 0000", "email": "patient@gmail.com", "address": "1 Main St, Victoria"} for i in range(2000)])
+		ticker.cancel()
+		self.assertGreater(ticks, 0, "the loop ran while patients were imported")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,127 @@
+import os
+from unittest import TestCase
+from unittest import main
+from clinic.dao.checkpoint import read_checkpoint, write_checkpoint, file_stamp, HEADER
+from clinic.dao.patient_table import PatientTable
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_columnar import PatientDAOColumnar
+from clinic.data_store import DataStore
+from clinic.exception.damaged_record_exception import DamagedRecordException
+from clinic.patient import Patient
+
+class CheckpointTest(TestCase):
+
+	def setUp(self):
+		self.filename = 'clinic/test.ckpt'
+		self.table = PatientTable()
+		for i in range(200):
+			self.table[9790000000 + (i * 7919) % 1000] = Patient(9790000000 + (i * 7919) % 1000, "Patient %d Doe" % (i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.table[9790000919] = Patient(9790000919, "Jin Hu", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.table.pop(9790000838)
+
+	def tearDown(self):
+		for filename in [self.filename, 'clinic/patients.json', 'clinic/patients.journal', 'clinic/patients.ckpt']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+	def test_round_trip(self):
+		write_checkpoint(self.filename, self.table, (1, 2, 3))
+		table, stamp = read_checkpoint(self.filename)
+		self.assertEqual(stamp, (1, 2, 3))
+		self.assertEqual(len(table), len(self.table))
+		self.assertEqual(list(table.values()), list(self.table.values()))
+		self.assertEqual(list(table.sorted_keys()), sorted(self.table))
+		self.assertEqual(table.search("Hu"), [9790000919])
+
+		# the table read back changes like any other
+		table[9790000919] = Patient(9790000919, "Jin Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		table.pop(9790000000)
+		table[9790005000] = Patient(9790005000, "Ada Hu", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.assertEqual(table.search("Hu"), [9790005000])
+		self.assertEqual(list(table.sorted_keys(9790000999)), [9790005000])
+		self.assertNotIn(9790000000, table)
+
+	def test_damaged(self):
+		write_checkpoint(self.filename, self.table, (1, 2, 3))
+		with open(self.filename, 'r+b') as file:
+			file.seek(HEADER.size + 200)
+			file.write(b'X')
+		with self.assertRaises(DamagedRecordException):
+			read_checkpoint(self.filename)
+
+		# a torn checkpoint is not read either
+		write_checkpoint(self.filename, self.table, (1, 2, 3))
+		with open(self.filename, 'r+b') as file:
+			file.truncate(os.path.getsize(self.filename) - 10)
+		with self.assertRaises(DamagedRecordException):
+			read_checkpoint(self.filename)
+
+	def test_dao(self):
+		# the checkpoint mirrors the patients file, which is kept for the other backends
+		patient_dao = PatientDAOJSON(autosave=True)
+		patient_dao.create_patients([Patient(9790000000 + i, "Patient %d Doe" % (i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria") for i in range(50)])
+		expected = patient_dao.list_patients()
+		patient_dao = PatientDAOColumnar(autosave=True, journal=True, checkpoint=True)
+		self.assertTrue(os.path.exists('clinic/patients.ckpt'))
+		self.assertEqual(read_checkpoint('clinic/patients.ckpt')[1], file_stamp('clinic/patients.json'))
+		self.assertEqual(patient_dao.list_patients(), expected)
+		self.assertEqual(PatientDAOJSON(autosave=True).list_patients(), expected)
+
+		# the changes after the checkpoint are replayed from the journal
+		patient_dao.update_patient(9790000001, Patient(9790000001, "Ada Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		patient_dao.delete_patient(9790000002)
+		patient_dao.close()
+		patient_dao = PatientDAOColumnar(autosave=True, journal=True, checkpoint=True)
+		self.assertEqual(patient_dao.search_patient(9790000001).name, "Ada Smith")
+		self.assertIsNone(patient_dao.search_patient(9790000002))
+		self.assertEqual(patient_dao.retrieve_patients("Smith"), [Patient(9790000001, "Ada Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")])
+
+		# compacting the journal writes the patients file and a new checkpoint
+		patient_dao.compaction_threshold = 0
+		patient_dao.create_patient(Patient(9790001000, "Jin Hu", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		patient_dao.close()
+		self.assertEqual(os.path.getsize('clinic/patients.journal'), 0)
+		self.assertEqual(read_checkpoint('clinic/patients.ckpt')[1], file_stamp('clinic/patients.json'))
+		self.assertEqual(PatientDAOJSON(autosave=True).search_patient(9790001000).name, "Jin Hu")
+		patient_dao = PatientDAOColumnar(autosave=True, checkpoint=True)
+		self.assertEqual(len(patient_dao.list_patients()), len(expected))
+		self.assertEqual(patient_dao.search_patient(9790001000).name, "Jin Hu")
+
+		# without a journal, each change writes the patients file, the checkpoint waits for the DAO to close
+		checkpoint_modified = os.stat('clinic/patients.ckpt').st_mtime_ns
+		patient_dao.delete_patient(9790001000)
+		self.assertEqual(os.stat('clinic/patients.ckpt').st_mtime_ns, checkpoint_modified)
+		stale_dao = PatientDAOColumnar(autosave=True, checkpoint=True)
+		self.assertFalse(stale_dao.loaded_checkpoint)
+		self.assertIsNone(stale_dao.search_patient(9790001000))
+		patient_dao.close()
+		patient_dao = PatientDAOColumnar(autosave=True, checkpoint=True)
+		self.assertTrue(patient_dao.loaded_checkpoint)
+		self.assertIsNone(patient_dao.search_patient(9790001000))
+
+	def test_stale(self):
+		patient_dao = PatientDAOColumnar(autosave=True, checkpoint=True)
+		patient_dao.create_patient(Patient(9790000001, "Ada Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+
+		# a change made by another backend replaces the patients file, the checkpoint is not used
+		PatientDAOJSON(autosave=True).update_patient(9790000001, Patient(9790000001, "Ada Hu", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		patient_dao = PatientDAOColumnar(autosave=True, checkpoint=True)
+		self.assertFalse(patient_dao.loaded_checkpoint)
+		self.assertEqual(patient_dao.search_patient(9790000001).name, "Ada Hu")
+		self.assertTrue(PatientDAOColumnar(autosave=True, checkpoint=True).loaded_checkpoint)
+
+		# a damaged checkpoint is not used either
+		with open('clinic/patients.ckpt', 'r+b') as file:
+			file.seek(HEADER.size + 200)
+			file.write(b'X')
+		with self.assertLogs('clinic.dao.patient_dao_columnar', 'WARNING'):
+			patient_dao = PatientDAOColumnar(autosave=True, checkpoint=True)
+		self.assertEqual(patient_dao.search_patient(9790000001).name, "Ada Hu")
+		self.assertTrue(PatientDAOColumnar(autosave=True, checkpoint=True).loaded_checkpoint)
+
+	def test_backend(self):
+		with self.assertRaises(ValueError):
+			DataStore(backend='json', checkpoint=True)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,41 @@
+import os
+from unittest import main
+from clinic.controller import Controller
+import tests.integration_test as integration_test
+
+class ColumnarIntegrationTest(integration_test.IntegrationTest):
+	''' runs the integration tests against the column-oriented patient table '''
+
+	def setUp(self):
+		self.controller = Controller(autosave=True, journal=True, backend='columnar')
+
+	def tearDown(self):
+		self.controller.close()
+		for filename in ['clinic/patients.journal', 'clinic/patients.journal.old']:
+			if os.path.exists(filename):
+				os.remove(filename)
+		super().tearDown()
+
+	def reset_persistence(self):
+		self.controller.close()
+		self.controller = Controller(autosave=True, journal=True, backend='columnar')
+		self.controller.login("user", "123456")
+
+class CheckpointIntegrationTest(ColumnarIntegrationTest):
+	''' runs the integration tests against the column-oriented patient table and its checkpoint '''
+
+	def setUp(self):
+		self.controller = Controller(autosave=True, journal=True, backend='columnar', checkpoint=True)
+
+	def tearDown(self):
+		super().tearDown()
+		if os.path.exists('clinic/patients.ckpt'):
+			os.remove('clinic/patients.ckpt')
+
+	def reset_persistence(self):
+		self.controller.close()
+		self.controller = Controller(autosave=True, journal=True, backend='columnar', checkpoint=True)
+		self.controller.login("user", "123456")
+
+if __name__ == '__main__':
+	main()
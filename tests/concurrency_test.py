@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+from unittest import TestCase
+from unittest import main
+from clinic.controller import Controller
+from clinic.data_store import DataStore
+
+class ConcurrencyTest(TestCase):
+	''' many sessions hammer one store from their own threads, no update may be lost '''
+
+	backend = 'json'
+	autosave = False
+	threads = 8
+	rounds = 50
+
+	def setUp(self):
+		# switch threads as often as possible, to interleave the operations
+		self.switch_interval = sys.getswitchinterval()
+		sys.setswitchinterval(1e-6)
+		self.store = DataStore(autosave=self.autosave, journal=self.autosave, backend=self.backend)
+
+	def tearDown(self):
+		sys.setswitchinterval(self.switch_interval)
+		self.store.close()
+
+	def session(self):
+		controller = Controller(store=self.store)
+		controller.login("user", "123456")
+		return controller
+
+	def run_threads(self, target):
+		errors = []
+
+		def run(worker):
+			try:
+				target(worker)
+			except Exception as e:
+				errors.append(e)
+
+		threads = [threading.Thread(target=run, args=(worker,)) for worker in range(self.threads)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(errors, [])
+
+	def test_no_lost_notes(self):
+		self.session().create_patient(9790099999, "Shared Patient", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+
+		def work(worker):
+			controller = self.session()
+			controller.set_current_patient(9790099999)
+			for i in range(self.rounds):
+				controller.create_note("Note %d %d" % (worker, i))
+				controller.retrieve_notes("Note %d" % (worker))
+
+		self.run_threads(work)
+
+		# every note got its own code, and every note is there
+		controller = self.session()
+		controller.set_current_patient(9790099999)
+		notes = controller.list_notes()
+		self.assertEqual(sorted(note.code for note in notes), list(range(1, self.threads * self.rounds + 1)))
+		self.assertEqual(len({note.text for note in notes}), self.threads * self.rounds)
+
+	def test_no_lost_patients(self):
+		def work(worker):
+			controller = self.session()
+			for i in range(self.rounds):
+				phn = 9790000000 + worker * 1000 + i
+				controller.create_patient(phn, "Patient %d %d" % (worker, i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+				controller.update_patient(phn, phn, "Patient %d %d Doe" % (worker, i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+				if i % 5 == 0:
+					controller.delete_patient(phn)
+				controller.list_patients()
+				controller.suggest_patients("patient %d" % (worker))
+
+		self.run_threads(work)
+
+		controller = self.session()
+		expected = sorted(9790000000 + worker * 1000 + i for worker in range(self.threads) for i in range(self.rounds) if i % 5)
+		self.assertEqual([patient.phn for patient in controller.iter_patients()], expected)
+		self.assertEqual(sorted(patient.phn for patient in controller.retrieve_patients("Doe")), expected)
+
+	def test_create_once(self):
+		# many sessions race to register the same PHN, exactly one of them wins
+		created = []
+
+		def work(worker):
+			try:
+				self.session().create_patient(9790012000, "John Doe %d" % (worker), "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+				created.append(worker)
+			except Exception:
+				pass
+
+		self.run_threads(work)
+		self.assertEqual(len(created), 1)
+		self.assertEqual(self.session().search_patient(9790012000).name, "John Doe %d" % (created[0]))
+
+class SQLiteConcurrencyTest(ConcurrencyTest):
+
+	backend = 'sqlite'
+
+class JournalConcurrencyTest(ConcurrencyTest):
+	''' the same with persistence, the files must hold every update too '''
+
+	autosave = True
+
+	def tearDown(self):
+		super().tearDown()
+		for filename in ['clinic/patients.json', 'clinic/patients.journal', 'clinic/patients.journal.old',
+			'clinic/records/9790099999.dat', 'clinic/records/9790099999.log']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+	def test_no_lost_patients(self):
+		super().test_no_lost_patients()
+		self.store.close()
+		self.store = DataStore(autosave=True, journal=True)
+		self.assertEqual(len(self.store.patient_dao.list_patients()), self.threads * self.rounds * 4 // 5)
+
+	def test_no_lost_notes(self):
+		super().test_no_lost_notes()
+		self.store.close()
+		self.store = DataStore(autosave=True, journal=True)
+		controller = self.session()
+		controller.set_current_patient(9790099999)
+		self.assertEqual(len(controller.list_notes()), self.threads * self.rounds)
+
+if __name__ == '__main__':
+	main()
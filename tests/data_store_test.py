@@ -0,0 +1,51 @@
+from unittest import TestCase
+from unittest import main
+from clinic.controller import Controller
+from clinic.data_store import DataStore
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+class DataStoreTest(TestCase):
+
+	def setUp(self):
+		self.store = DataStore()
+
+	def test_sessions_share_store(self):
+		controller = Controller(store=self.store)
+		controller.login("user", "123456")
+		controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		controller.set_current_patient(9790012000)
+		controller.create_note("Patient comes with headache and high blood pressure.")
+		patient = controller.get_current_patient()
+		controller.logout()
+
+		# the next session starts logged out, without a current patient, over the same loaded data
+		controller = Controller(store=self.store)
+		self.assertIs(controller.patient_dao, self.store.patient_dao)
+		with self.assertRaises(IllegalAccessException, msg="a new session must log in"):
+			controller.search_patient(9790012000)
+		controller.login("ali", "@G00dPassw0rd")
+		self.assertIsNone(controller.get_current_patient())
+		self.assertIs(controller.search_patient(9790012000), patient)
+		controller.set_current_patient(9790012000)
+		self.assertEqual(len(controller.list_notes()), 1)
+
+	def test_shared_store_stays_open(self):
+		# closing a session over a shared store leaves it open for the others
+		store = DataStore(backend='sqlite')
+		Controller(store=store).close()
+		controller = Controller(store=store)
+		controller.login("user", "123456")
+		controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		self.assertEqual(controller.search_patient(9790012000).name, "John Doe")
+		store.close()
+
+	def test_store_settings(self):
+		controller = Controller(backend='sqlite')
+		self.assertEqual(controller.store.backend, 'sqlite')
+		self.assertFalse(controller.autosave)
+		controller.close()
+		with self.assertRaises(ValueError, msg="unknown backends are rejected"):
+			DataStore(backend='csv')
+
+if __name__ == '__main__':
+	main()
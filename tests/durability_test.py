@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from unittest import TestCase
+from unittest import main
+from clinic.dao.durability import Durability, STRICT, GROUP, LAZY
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.patient import Patient
+from clinic.controller import Controller
+
+class FlushRecorder():
+	''' stands for a DAO, recording when its pending mutations are flushed '''
+
+	def __init__(self):
+		self.flushes = []
+		self.flushed = threading.Event()
+
+	def flush_pending(self, sync=True):
+		self.flushes.append(sync)
+		self.flushed.set()
+
+class DurabilityTest(TestCase):
+
+	def setUp(self):
+		self.patient_dao = None
+		self.durability = None
+
+	def tearDown(self):
+		if self.durability is not None:
+			self.durability.close()
+		if self.patient_dao is not None:
+			self.patient_dao.close()
+		for filename in ['clinic/patients.json', 'clinic/patients.journal', 'clinic/patients.journal.old']:
+			if os.path.exists(filename):
+				os.remove(filename)
+		for filename in os.listdir('clinic/records'):
+			if filename.startswith('9790012000'):
+				os.remove(os.path.join('clinic/records', filename))
+
+	def test_modes(self):
+		with self.assertRaises(ValueError, msg="unknown mode"):
+			Durability('sometimes')
+
+		# strict mutations are flushed and synced before write returns
+		dao = FlushRecorder()
+		durability = Durability(STRICT)
+		durability.write(dao)
+		durability.write(dao)
+		self.assertEqual(dao.flushes, [True, True])
+		durability.close()
+
+		# mutations within a group window are flushed and synced once
+		dao = FlushRecorder()
+		durability = Durability(GROUP, group_window=0.05)
+		for i in range(10):
+			durability.write(dao)
+		self.assertEqual(dao.flushes, [])
+		self.assertTrue(dao.flushed.wait(5))
+		self.assertEqual(dao.flushes, [True])
+		durability.close()
+
+		# lazy mutations are flushed on a timer without syncing, then synced on closing
+		dao = FlushRecorder()
+		durability = Durability(LAZY, lazy_interval=0.05)
+		durability.write(dao)
+		self.assertTrue(dao.flushed.wait(5))
+		self.assertEqual(dao.flushes, [False])
+		durability.write(dao)
+		durability.close()
+		self.assertEqual(dao.flushes, [False, True])
+
+		# mutations after closing are flushed right away
+		durability.write(dao)
+		self.assertEqual(dao.flushes, [False, True, True])
+
+	def test_group_patients(self):
+		self.durability = Durability(GROUP, group_window=60)
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True, durability=self.durability)
+		patient_1 = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		patient_2 = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		self.patient_dao.create_patient(patient_1)
+		self.patient_dao.create_patient(patient_2)
+		self.patient_dao.delete_patient(9790014444)
+
+		# the changes are pending until the group is flushed
+		self.assertEqual(os.path.getsize('clinic/patients.journal'), 0)
+		self.assertEqual(self.patient_dao.search_patient(9790012000), patient_1)
+		self.durability.flush()
+		self.assertGreater(os.path.getsize('clinic/patients.journal'), 0)
+
+		self.patient_dao.close()
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+		self.assertEqual(self.patient_dao.list_patients(), [patient_1])
+
+	def test_closing_flushes_patients(self):
+		self.durability = Durability(LAZY, lazy_interval=60)
+		self.patient_dao = PatientDAOJSON(autosave=True, durability=self.durability)
+		patients = self.patient_dao.list_patients()
+		patient_1 = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		self.patient_dao.create_patient(patient_1)
+
+		# without a journal, the whole snapshot is written once, when closing
+		self.assertEqual(PatientDAOJSON(autosave=True).list_patients(), patients)
+		self.patient_dao.close()
+		self.patient_dao = PatientDAOJSON(autosave=True)
+		self.assertEqual(self.patient_dao.list_patients(), patients + [patient_1])
+
+	def test_group_notes(self):
+		self.durability = Durability(GROUP, group_window=0.01)
+		note_dao = NoteDAOPickle(9790012000, autosave=True, durability=self.durability)
+		note_1 = note_dao.create_note("Patient comes with headache and high blood pressure.")
+		note_2 = note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+		note_dao.update_note(1, "Patient is feeling better.")
+
+		# the background flush writes the log, flushing again waits for it to finish
+		deadline = time.monotonic() + 5
+		while not os.path.exists(note_dao.log_filename) and time.monotonic() < deadline:
+			time.sleep(0.01)
+		self.durability.flush()
+		self.assertEqual(note_dao.pending, [])
+		note_dao = NoteDAOPickle(9790012000, autosave=True)
+		self.assertEqual(note_dao.list_notes(), [note_2, note_1])
+		self.assertEqual(note_dao.search_note(1).text, "Patient is feeling better.")
+
+	def test_updated_patient(self):
+		controller = Controller(autosave=True, journal=True)
+		controller.login("user", "123456")
+		controller.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		controller.set_current_patient(9790012000)
+		controller.create_note("Patient comes with headache and high blood pressure.")
+		controller.unset_current_patient()
+		controller.update_patient(9790012000, 9790012000, "John Smith", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+
+		# the updated patient keeps the controller's persistence, and their notes
+		patient = controller.search_patient(9790012000)
+		self.assertIs(patient.durability, controller.durability)
+		self.assertTrue(patient.autosave)
+		controller.set_current_patient(9790012000)
+		self.assertEqual(len(controller.list_notes()), 1)
+		controller.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,171 @@
+import http.client
+import socket
+import threading
+from json import loads, dumps
+from unittest import TestCase
+from unittest import main
+from clinic.data_store import DataStore
+from clinic.session_manager import SessionManager
+from clinic.http_server import ClinicHTTPServer, MAX_BODY_SIZE
+
+JOHN_DOE = {"phn": 9790012000, "name": "John Doe", "birth_date": "2000-10-10", "phone": "250 203 1010",
+	"email": "john.doe@gmail.com", "address": "300 Moss St, Victoria"}
+MARY_DOE = {"phn": 9790014444, "name": "Mary Doe", "birth_date": "1995-07-01", "phone": "250 203 2020",
+	"email": "mary.doe@gmail.com", "address": "300 Moss St, Victoria"}
+
+class HTTPServerTest(TestCase):
+
+	def setUp(self):
+		self.server = ClinicHTTPServer(('127.0.0.1', 0), SessionManager(DataStore()))
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		self.connections = []
+
+	def tearDown(self):
+		for connection in self.connections:
+			connection.close()
+		self.server.shutdown()
+		self.server.server_close()
+		self.server.session_manager.close()
+		self.server.session_manager.store.close()
+
+	def connect(self):
+		connection = http.client.HTTPConnection(*self.server.server_address[:2])
+		self.connections.append(connection)
+		return connection
+
+	def request(self, connection, method, path, body=None, session=None):
+		headers = {'Content-Type': 'application/json'}
+		if session is not None:
+			headers['X-Session'] = session
+		connection.request(method, path, None if body is None else dumps(body), headers)
+		response = connection.getresponse()
+		return response.status, loads(response.read())
+
+	def login(self, connection, username="user", password="123456"):
+		status, answer = self.request(connection, 'POST', '/sessions', {"username": username, "password": password})
+		self.assertEqual(status, 201)
+		return answer['session']
+
+	def test_patients(self):
+		connection = self.connect()
+		status, answer = self.request(connection, 'GET', '/patients')
+		self.assertEqual(status, 401, "must log in first")
+		status, answer = self.request(connection, 'POST', '/sessions', {"username": "user", "password": "abadpassword"})
+		self.assertEqual(status, 401, "wrong password")
+		session = self.login(connection)
+
+		self.assertEqual(self.request(connection, 'POST', '/patients', JOHN_DOE, session), (201, JOHN_DOE))
+		self.assertEqual(self.request(connection, 'POST', '/patients', MARY_DOE, session)[0], 201)
+		self.assertEqual(self.request(connection, 'POST', '/patients', JOHN_DOE, session)[0], 409, "PHN already registered")
+		self.assertEqual(self.request(connection, 'POST', '/patients', {"phn": 1}, session)[0], 400, "missing fields")
+		self.assertEqual(self.request(connection, 'GET', '/patients/9790012000', None, session), (200, JOHN_DOE))
+		self.assertEqual(self.request(connection, 'GET', '/patients/9790000000', None, session)[0], 404)
+		self.assertEqual(self.request(connection, 'GET', '/nothing', None, session)[0], 404)
+
+		# pages continue after the last PHN of the previous one
+		status, answer = self.request(connection, 'GET', '/patients?limit=1', None, session)
+		self.assertEqual(answer, {"patients": [JOHN_DOE], "next": 9790012000})
+		status, answer = self.request(connection, 'GET', '/patients?after=9790012000', None, session)
+		self.assertEqual(answer, {"patients": [MARY_DOE], "next": None})
+		status, answer = self.request(connection, 'GET', '/patients?name=Mary', None, session)
+		self.assertEqual(answer['patients'], [MARY_DOE])
+		status, answer = self.request(connection, 'GET', '/patients/suggestions?prefix=do', None, session)
+		self.assertEqual(answer['patients'], [JOHN_DOE, MARY_DOE])
+
+		john_smith = dict(JOHN_DOE, name="John Smith")
+		self.assertEqual(self.request(connection, 'PUT', '/patients/9790012000', john_smith, session)[0], 200)
+		self.assertEqual(self.request(connection, 'GET', '/patients/9790012000', None, session), (200, john_smith))
+		self.assertEqual(self.request(connection, 'DELETE', '/patients/9790014444', None, session)[0], 200)
+		self.assertEqual(self.request(connection, 'DELETE', '/patients/9790014444', None, session)[0], 409)
+
+		# every request went over the same connection
+		self.assertEqual(self.request(connection, 'DELETE', '/sessions', None, session)[0], 200)
+		self.assertEqual(self.request(connection, 'GET', '/patients', None, session)[0], 401, "closed session")
+		self.assertEqual(len(self.server.session_manager.list_sessions()), 0)
+
+	def raw_request(self, content_length):
+		with socket.create_connection(self.server.server_address[:2], timeout=5) as client:
+			client.sendall(b'POST /sessions HTTP/1.1\r\nHost: clinic\r\nContent-Length: %s\r\n\r\n' % (content_length))
+			response = b''
+			while True:
+				data = client.recv(4096)
+				if not data:
+					return response
+				response += data
+
+	def test_field_types(self):
+		connection = self.connect()
+		session = self.login(connection)
+		self.request(connection, 'POST', '/patients', MARY_DOE, session)
+
+		# fields of the wrong type are refused before anything is registered
+		for field, value in [("name", 123), ("phn", "9790012000"), ("phn", True), ("email", None)]:
+			self.assertEqual(self.request(connection, 'POST', '/patients', dict(JOHN_DOE, **{field: value}), session)[0], 400)
+		self.assertEqual(self.request(connection, 'GET', '/patients/9790012000', None, session)[0], 404)
+		self.assertEqual(self.request(connection, 'PUT', '/patients/9790014444', dict(MARY_DOE, name=["Mary"]), session)[0], 400)
+		status, answer = self.request(connection, 'GET', '/patients?name=Doe', None, session)
+		self.assertEqual((status, answer['patients']), (200, [MARY_DOE]))
+
+	def test_bad_body(self):
+		# the server answers and closes the connection, rather than waiting for a body it will not read
+		response = self.raw_request(b'-1')
+		self.assertTrue(response.startswith(b'HTTP/1.1 400'))
+		self.assertIn(b'Connection: close', response)
+		self.assertTrue(self.raw_request(b'many').startswith(b'HTTP/1.1 400'))
+		self.assertTrue(self.raw_request(b'%d' % (MAX_BODY_SIZE + 1)).startswith(b'HTTP/1.1 413'))
+
+	def test_notes(self):
+		front_desk = self.connect()
+		exam_room = self.connect()
+		front_desk_session = self.login(front_desk)
+		exam_room_session = self.login(exam_room, "ali", "@G00dPassw0rd")
+		self.request(front_desk, 'POST', '/patients', JOHN_DOE, front_desk_session)
+
+		self.assertEqual(self.request(exam_room, 'POST', '/notes', {"text": "Note"}, exam_room_session)[0], 409, "no current patient")
+		self.assertEqual(self.request(exam_room, 'PUT', '/current_patient', {"phn": 9790012000}, exam_room_session)[0], 200)
+		self.assertEqual(self.request(exam_room, 'GET', '/current_patient', None, exam_room_session), (200, {"patient": JOHN_DOE}))
+		self.assertEqual(self.request(front_desk, 'GET', '/current_patient', None, front_desk_session), (200, {"patient": None}))
+
+		status, note = self.request(exam_room, 'POST', '/notes', {"text": "Patient comes with headache and high blood pressure."}, exam_room_session)
+		self.assertEqual((status, note['code']), (201, 1))
+		self.request(exam_room, 'POST', '/notes', {"text": "Patient complains of a strong headache on the back of neck."}, exam_room_session)
+		status, answer = self.request(exam_room, 'GET', '/notes?search=headache', None, exam_room_session)
+		self.assertEqual([note['code'] for note in answer['notes']], [1, 2])
+		status, answer = self.request(exam_room, 'GET', '/notes', None, exam_room_session)
+		self.assertEqual([note['code'] for note in answer['notes']], [2, 1])
+
+		self.assertEqual(self.request(exam_room, 'PUT', '/notes/1', {"text": "Updated"}, exam_room_session)[0], 200)
+		self.assertEqual(self.request(exam_room, 'GET', '/notes/1', None, exam_room_session)[1]['text'], "Updated")
+		self.assertEqual(self.request(exam_room, 'DELETE', '/notes/2', None, exam_room_session)[0], 200)
+		self.assertEqual(self.request(exam_room, 'DELETE', '/notes/2', None, exam_room_session)[0], 404)
+		self.assertEqual(self.request(exam_room, 'DELETE', '/current_patient', None, exam_room_session)[0], 200)
+
+	def test_concurrent_clients(self):
+		errors = []
+
+		def work(worker):
+			try:
+				connection = http.client.HTTPConnection(*self.server.server_address[:2])
+				session = self.login(connection)
+				for i in range(20):
+					patient = dict(JOHN_DOE, phn=9790000000 + worker * 100 + i)
+					status, answer = self.request(connection, 'POST', '/patients', patient, session)
+					if status != 201:
+						errors.append(answer)
+				connection.close()
+			except Exception as e:
+				errors.append(e)
+
+		threads = [threading.Thread(target=work, args=(worker,)) for worker in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(errors, [])
+		session = self.login(self.connect())
+		status, answer = self.request(self.connections[0], 'GET', '/patients?limit=1000', None, session)
+		self.assertEqual(len(answer['patients']), 160)
+
+if __name__ == '__main__':
+	main()
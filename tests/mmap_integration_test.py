@@ -0,0 +1,25 @@
+import os
+from unittest import main
+from clinic.controller import Controller
+import tests.integration_test as integration_test
+
+class MmapIntegrationTest(integration_test.IntegrationTest):
+	''' runs the integration tests against the memory-mapped patients file '''
+
+	def setUp(self):
+		self.controller = Controller(autosave=True, backend='mmap')
+
+	def tearDown(self):
+		self.controller.close()
+		for filename in ['clinic/patients.idx', 'clinic/patients.journal', 'clinic/patients.journal.old']:
+			if os.path.exists(filename):
+				os.remove(filename)
+		super().tearDown()
+
+	def reset_persistence(self):
+		self.controller.close()
+		self.controller = Controller(autosave=True, backend='mmap')
+		self.controller.login("user", "123456")
+
+if __name__ == '__main__':
+	main()
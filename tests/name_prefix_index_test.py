@@ -0,0 +1,46 @@
+from unittest import TestCase
+from unittest import main
+from clinic.dao.name_prefix_index import NamePrefixIndex
+
+class NamePrefixIndexTest(TestCase):
+
+	def setUp(self):
+		self.index = NamePrefixIndex([(9798884444, "Ali Mesbah"), (9792226666, "Jin Hu"), (9790012000, "John Doe")])
+		self.index.add(9790014444, "Mary Doe")
+		self.index.add(9792225555, "Joe  Hancock")
+
+	def test_search(self):
+		# any word of the name can start the match, regardless of case and spacing
+		self.assertEqual(self.index.search("jo", 10), [9792225555, 9790012000])
+		self.assertEqual(self.index.search("DOE", 10), [9790012000, 9790014444])
+		self.assertEqual(self.index.search("joe ha", 10), [9792225555])
+		self.assertEqual(self.index.search("Mary  Doe", 10), [9790014444])
+		self.assertEqual(self.index.search("Doe John", 10), [])
+		self.assertEqual(self.index.search("  ", 10), [])
+
+		# a trailing space completes the last word, which may end the name
+		self.assertEqual(self.index.search("Jo ", 10), [])
+		self.assertEqual(self.index.search("John ", 10), [9790012000])
+		self.assertEqual(self.index.search("john doe ", 10), [9790012000])
+		self.assertEqual(self.index.search("doe ", 10), [9790012000, 9790014444])
+		self.assertEqual(self.index.search("do ", 10), [])
+
+		# the limit keeps the first matches
+		self.assertEqual(self.index.search("", 10), [])
+		self.assertEqual(self.index.search("h", 10), [9792225555, 9792226666])
+		self.assertEqual(self.index.search("h", 1), [9792225555])
+
+	def test_add_remove(self):
+		self.index.add(9790012000, "John Smith")
+		self.assertEqual(self.index.search("Doe", 10), [9790014444])
+		self.assertEqual(self.index.search("smi", 10), [9790012000])
+
+		self.index.remove(9790012000)
+		self.assertEqual(self.index.search("jo", 10), [9792225555])
+
+		# removing an unknown key does nothing
+		self.index.remove(1234)
+		self.assertEqual(len(self.index.entries), 8)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,42 @@
+from unittest import TestCase
+from unittest import main
+from clinic.dao.name_trigram_index import NameTrigramIndex
+
+class NameTrigramIndexTest(TestCase):
+
+	def setUp(self):
+		self.index = NameTrigramIndex()
+		self.index.add(9798884444, "Ali Mesbah")
+		self.index.add(9792226666, "Jin Hu")
+		self.index.add(9790012000, "John Doe")
+		self.index.add(9790014444, "Mary Doe")
+		self.index.add(9792225555, "Joe Hancock")
+
+	def test_search(self):
+		self.assertEqual(self.index.search("Mary Doe"), [9790014444])
+		self.assertEqual(self.index.search("Doe"), [9790012000, 9790014444])
+		self.assertEqual(self.index.search("Jo"), [9790012000, 9792225555])
+		self.assertEqual(self.index.search(""), [9798884444, 9792226666, 9790012000, 9790014444, 9792225555])
+		self.assertEqual(self.index.search("Smith"), [])
+
+		# every trigram matches but not the whole search string
+		self.assertEqual(self.index.search("Doe John"), [])
+
+	def test_add_remove(self):
+		# replacing a name keeps the key's position
+		self.index.add(9790012000, "John Smith")
+		self.assertEqual(self.index.search("Doe"), [9790014444])
+		self.assertEqual(self.index.search("o"), [9790012000, 9790014444, 9792225555])
+
+		# removed keys are not found, re-added keys go last
+		self.index.remove(9790012000)
+		self.assertEqual(self.index.search("Smith"), [])
+		self.index.add(9790012000, "John Doe")
+		self.assertEqual(self.index.search("Doe"), [9790014444, 9790012000])
+
+		# removing an unknown key does nothing
+		self.index.remove(1234)
+		self.assertEqual(len(self.index.names), 5)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,111 @@
+import os
+from pickle import loads
+from unittest import TestCase
+from unittest import main
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.recovery import scan_file
+from clinic.note import Note
+
+class NoteDAOPickleTest(TestCase):
+
+	def setUp(self):
+		self.phn = 9790012000
+		self.note_dao = NoteDAOPickle(self.phn, autosave=True)
+
+	def tearDown(self):
+		records_path = 'clinic/records'
+		for filename in os.listdir(records_path):
+			if filename.startswith(str(self.phn)):
+				os.remove(os.path.join(records_path, filename))
+
+	def reset_persistence(self):
+		self.note_dao = NoteDAOPickle(self.phn, autosave=True)
+
+	def test_lazy_loading(self):
+		expected_note_1 = Note(1, "Patient comes with headache and high blood pressure.")
+		expected_note_2 = Note(2, "Patient complains of a strong headache on the back of neck.")
+		self.note_dao.create_note("Patient comes with headache and high blood pressure.")
+		self.note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+
+		# the record file is not read when the DAO is constructed
+		self.reset_persistence()
+		self.assertIsNone(self.note_dao.notes)
+
+		# the first note operation loads the record file
+		self.assertEqual(self.note_dao.search_note(2), expected_note_2)
+		self.assertEqual(self.note_dao.list_notes(), [expected_note_2, expected_note_1])
+
+		# new notes continue the loaded numbering
+		self.assertEqual(self.note_dao.create_note("Patient feels better.").code, 3)
+
+	def test_file_format(self):
+		expected_note_1 = Note(1, "Patient comes with headache and high blood pressure.")
+		expected_note_3 = Note(3, "Patient is taking medicines to control blood pressure.")
+		self.note_dao.create_note("Patient comes with headache and high blood pressure.")
+		self.note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+		self.note_dao.create_note("Patient is taking medicines to control blood pressure.")
+		self.note_dao.delete_note(2)
+
+		# the compacted record file keeps each note in its own checksummed frame
+		self.note_dao.save_notes()
+		self.assertFalse(os.path.exists(self.note_dao.log_filename))
+		note_frames, damaged, torn, chunks = scan_file(self.note_dao.filename)
+		self.assertEqual([loads(note_frame) for note_frame in note_frames], [expected_note_1, expected_note_3])
+		self.assertEqual((damaged, torn), (0, False))
+
+		self.reset_persistence()
+		self.assertEqual(self.note_dao.list_notes(), [expected_note_3, expected_note_1])
+		self.assertEqual(self.note_dao.create_note("Patient feels better.").code, 4)
+
+	def test_log_replay(self):
+		expected_note_1 = Note(1, "Patient comes with headache and high blood pressure.")
+		expected_note_2a = Note(2, "Patient complains of a strong pain on the back of neck.")
+		expected_note_4 = Note(4, "Patient feels general improvement and no more headaches.")
+		self.note_dao.create_note("Patient comes with headache and high blood pressure.")
+		self.note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+		self.note_dao.save_notes()
+		self.note_dao.create_note("Patient is taking medicines to control blood pressure.")
+		self.note_dao.update_note(2, "Patient complains of a strong pain on the back of neck.")
+		self.note_dao.delete_note(3)
+		self.note_dao.create_note("Patient feels general improvement and no more headaches.")
+
+		# mutations after the compaction are appended to the log
+		log_size = os.path.getsize(self.note_dao.log_filename)
+		self.assertEqual(log_size, self.note_dao.log_size)
+
+		# a torn mutation at the end of the log is dropped
+		with open(self.note_dao.log_filename, 'ab') as file:
+			file.write(b'\x30\x00\x00\x00torn')
+
+		self.reset_persistence()
+		self.assertEqual(self.note_dao.list_notes(), [expected_note_4, expected_note_2a, expected_note_1])
+		self.assertEqual(self.note_dao.retrieve_notes("pain"), [expected_note_2a])
+		self.assertEqual(os.path.getsize(self.note_dao.log_filename), log_size)
+
+	def test_retrieve_candidates(self):
+		for i in range(1, 11):
+			self.note_dao.create_note("Patient number %d has %s." % (i, "a cough" if i % 3 == 0 else "a fever"))
+		self.note_dao.update_note(3, "Patient number 3 has a fever.")
+
+		# the notes come in the order of their codes
+		self.assertEqual([note.code for note in self.note_dao.retrieve_notes("has a fever")], [1, 2, 3, 4, 5, 7, 8, 10])
+		self.assertEqual([note.code for note in self.note_dao.retrieve_notes("cough")], [6, 9])
+		self.assertEqual(self.note_dao.retrieve_notes("a rash"), [])
+
+		# only the notes found by the index are searched
+		self.note_dao.notes[1].text = "Patient number 1 has a rash."
+		self.assertEqual(self.note_dao.retrieve_notes("a rash"), [])
+		self.assertEqual([note.code for note in self.note_dao.retrieve_notes("a cough")], [6, 9])
+
+	def test_compaction(self):
+		for i in range(200):
+			self.note_dao.create_note("Patient note number %d. " % (i) + "x" * 500)
+
+		# the log was folded into the record file along the way
+		self.assertLess(self.note_dao.log_size, 200 * 500)
+		self.reset_persistence()
+		self.assertEqual(len(self.note_dao.list_notes()), 200)
+		self.assertEqual(self.note_dao.list_notes()[0].code, 200)
+
+if __name__ == '__main__':
+	main()
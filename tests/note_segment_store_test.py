@@ -0,0 +1,173 @@
+import os
+import re
+from unittest import TestCase
+from unittest import main
+from clinic.dao.note_segment_store import NoteSegmentStore, segment_store, has_segments, migrate, open_stores
+from clinic.dao.note_dao_segment import NoteDAOSegment
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.dao.durability import Durability, GROUP
+from clinic.patient import Patient
+
+class NoteSegmentStoreTest(TestCase):
+
+	def setUp(self):
+		self.store = NoteSegmentStore()
+
+	def tearDown(self):
+		for store in list(open_stores.values()):
+			store.close()
+		for filename in os.listdir('clinic/records'):
+			if re.match(r'notes-\d+\.seg|notes\.idx|979001\d+\.(dat|log)', filename):
+				os.remove(os.path.join('clinic/records', filename))
+
+	def segment_files(self):
+		return sorted(filename for filename in os.listdir('clinic/records') if filename.endswith('.seg'))
+
+	def reopen(self, segment_size=None):
+		self.store.close()
+		self.store = NoteSegmentStore() if segment_size is None else NoteSegmentStore(segment_size=segment_size)
+
+	def test_notes(self):
+		self.assertIs(segment_store(), self.store)
+		self.assertTrue(has_segments())
+		note_dao = NoteDAOSegment(9790012000, self.store)
+		note_1 = note_dao.create_note("Patient comes with headache and high blood pressure.")
+		note_2 = note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+		note_dao.update_note(1, "Patient is feeling better.")
+		other_dao = NoteDAOSegment(9790014444, self.store)
+		note_3 = other_dao.create_note("Patient has a rash.")
+		other_dao.delete_note(1)
+
+		# every patient shares the same segment file
+		self.assertEqual(self.segment_files(), ['notes-000001.seg'])
+		self.assertFalse(os.path.exists('clinic/records/9790012000.dat'))
+
+		self.reopen()
+		note_dao = NoteDAOSegment(9790012000, self.store)
+		self.assertEqual(note_dao.list_notes(), [note_2, note_1])
+		self.assertEqual(note_dao.search_note(1).text, "Patient is feeling better.")
+		self.assertEqual(NoteDAOSegment(9790014444, self.store).list_notes(), [])
+		self.assertEqual(NoteDAOSegment(9790099999, self.store).list_notes(), [])
+
+		# the records of patients open the store's notes
+		patient = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria", autosave=True)
+		self.assertIsInstance(patient.get_patient_record().note_dao, NoteDAOSegment)
+		self.assertEqual(patient.list_notes(), [note_2, note_1])
+
+	def test_recovery(self):
+		note_dao = NoteDAOSegment(9790012000, self.store)
+		for i in range(5):
+			note_dao.create_note("Note %d" % (i))
+
+		# without closing, the index does not know the extents, they are found by scanning
+		self.store.active_file.close()
+		del open_stores['clinic/records']
+		with open('clinic/records/notes-000001.seg', 'ab') as file:
+			file.write(b'\x10\x00\x00\x00torn')
+		self.store = NoteSegmentStore()
+		note_dao = NoteDAOSegment(9790012000, self.store)
+		self.assertEqual([note.text for note in note_dao.list_notes()], ["Note 4", "Note 3", "Note 2", "Note 1", "Note 0"])
+		self.assertEqual(note_dao.create_note("Note 5").code, 6)
+
+		# a damaged extent is skipped, the notes are written back from the others
+		self.reopen()
+		offset = self.store.extents[9790012000][2][1]
+		with open('clinic/records/notes-000001.seg', 'r+b') as file:
+			file.seek(offset + 20)
+			file.write(b'X')
+		with self.assertLogs('clinic.dao.note_segment_store', 'WARNING'):
+			note_dao = NoteDAOSegment(9790012000, self.store)
+			codes = [note.code for note in note_dao.list_notes()]
+		self.assertEqual(codes, [6, 5, 4, 2, 1])
+		self.reopen()
+		self.assertEqual(len(self.store.extents[9790012000]), 1)
+
+		# a damaged index is rebuilt from the segments
+		self.store.close()
+		with open('clinic/records/notes.idx', 'r+b') as file:
+			file.seek(12)
+			file.write(b'X')
+		with self.assertLogs('clinic.dao.note_segment_store', 'WARNING'):
+			self.store = NoteSegmentStore()
+		self.assertEqual([note.code for note in NoteDAOSegment(9790012000, self.store).list_notes()], [6, 5, 4, 2, 1])
+
+	def test_damaged_extent_header(self):
+		note_dao = NoteDAOSegment(9790012000, self.store)
+		other_dao = NoteDAOSegment(9790014444, self.store)
+		note_dao.create_note("Patient comes with headache and high blood pressure.")
+		note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+		other_dao.create_note("Patient has a rash.")
+		note_dao.create_note("Patient is feeling better.")
+
+		# damage the PHN of the first extent and scan every segment again
+		offset = self.store.extents[9790012000][0][1]
+		self.store.close()
+		os.remove('clinic/records/notes.idx')
+		with open('clinic/records/notes-000001.seg', 'r+b') as file:
+			file.seek(offset + 8)
+			file.write(b'X')
+		with self.assertLogs('clinic.dao.note_segment_store', 'WARNING'):
+			self.store = NoteSegmentStore()
+
+		# the notes framed inside the damaged extent are not taken for extents
+		self.assertEqual(sorted(self.store.extents), [9790012000, 9790014444])
+		self.assertEqual(len(self.store.extents[9790012000]), 2)
+		self.assertEqual([note.code for note in NoteDAOSegment(9790012000, self.store).list_notes()], [3, 2])
+		self.assertEqual([note.text for note in NoteDAOSegment(9790014444, self.store).list_notes()], ["Patient has a rash."])
+
+	def test_garbage_collection(self):
+		# small segments fill up quickly, the superseded ones are removed
+		self.reopen(segment_size=4096)
+		note_daos = [NoteDAOSegment(9790010000 + i, self.store) for i in range(3)]
+		for i in range(300):
+			note_daos[i % 3].create_note("Note %d of a patient." % (i))
+			if i % 3 == 0:
+				note_daos[0].delete_note(note_daos[0].list_notes()[-1].code)
+			if i % 10 == 0:
+				for note_dao in note_daos:
+					note_dao.load_notes()
+					note_dao.save_notes()
+		self.assertGreater(self.store.active, 5)
+		self.assertLess(len(self.segment_files()), self.store.active - 2)
+
+		expected = [note_dao.list_notes() for note_dao in note_daos]
+		self.reopen(segment_size=4096)
+		self.assertEqual([NoteDAOSegment(9790010000 + i, self.store).list_notes() for i in range(3)], expected)
+
+	def test_group_sync(self):
+		# the store is synced in the same flush as the notes written to it
+		durability = Durability(GROUP, group_window=60)
+		note_daos = [NoteDAOSegment(9790012000, self.store, durability), NoteDAOSegment(9790014444, self.store, durability)]
+		for note_dao in note_daos:
+			note_dao.create_note("Patient comes with headache.")
+		self.assertEqual(self.store.extents, {})
+		durability.flush()
+		self.assertEqual(sorted(self.store.extents), [9790012000, 9790014444])
+		self.assertFalse(self.store.unsynced)
+		durability.close()
+
+	def test_migrate(self):
+		self.store.close()
+		for filename in ['clinic/records/notes.idx', 'clinic/records/notes-000001.seg']:
+			os.remove(filename)
+		note_dao = NoteDAOPickle(9790012000, autosave=True)
+		note_1 = note_dao.create_note("Patient comes with headache and high blood pressure.")
+		note_2 = note_dao.create_note("Patient complains of a strong headache on the back of neck.")
+		note_dao.delete_note(1)
+		note_dao = NoteDAOPickle(9790014444, autosave=True)
+		note_3 = note_dao.create_note("Patient has a rash.")
+		self.assertFalse(has_segments())
+
+		self.assertGreaterEqual(migrate(), 2)
+		self.assertTrue(has_segments())
+		self.assertFalse(os.path.exists('clinic/records/9790012000.dat'))
+		self.assertFalse(os.path.exists('clinic/records/9790012000.log'))
+		self.assertFalse(os.path.exists('clinic/records/segments.tmp'))
+
+		self.store = NoteSegmentStore()
+		self.assertEqual(NoteDAOSegment(9790012000, self.store).list_notes(), [note_2])
+		self.assertEqual(NoteDAOSegment(9790014444, self.store).list_notes(), [note_3])
+		self.assertEqual(self.store.extents[9790014444][0][0], 1)
+
+if __name__ == '__main__':
+	main()
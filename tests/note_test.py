@@ -2,6 +2,7 @@ from unittest import TestCase
 from unittest import main
 from clinic.note import Note
 import datetime
+import pickle
 
 class NoteTest(TestCase):
 	def setUp(self):
@@ -40,5 +41,17 @@ class NoteTest(TestCase):
 		self.assertNotEqual(repr(different_note_1), repr(self.note))
 		self.assertNotEqual(repr(different_note_2), repr(self.note))
 
+	def test_pickle(self):
+		self.assertFalse(hasattr(self.note, '__dict__'))
+		note = pickle.loads(pickle.dumps(self.note))
+		self.assertEqual((note.code, note.timestamp, note.text), (self.note.code, self.note.timestamp, self.note.text))
+
+		# notes pickled before they were slotted kept their fields in a dictionary
+		self.assertEqual(self.note.__getstate__(), {'code': 1, 'text': "Patient shows up with chest pain", 'timestamp': self.note.timestamp})
+		old_pickle = b'\x80\x04\x95E\x00\x00\x00\x00\x00\x00\x00\x8c\x0bclinic.note\x94\x8c\x04Note\x94\x93\x94)\x81\x94}\x94(\x8c\x04code\x94K\x01\x8c\x04text\x94\x8c\x05Hello\x94\x8c\ttimestamp\x94Nub.'
+		note = pickle.loads(old_pickle)
+		self.assertEqual((note.code, note.text, note.timestamp), (1, "Hello", None))
+		self.assertEqual(pickle.dumps(Note(1, "Hello", None), protocol=4), old_pickle)
+
 if __name__ == '__main__':
 	main()
\ No newline at end of file
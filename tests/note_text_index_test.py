@@ -0,0 +1,53 @@
+import random
+from unittest import TestCase
+from unittest import main
+from clinic.dao.note_text_index import NoteTextIndex
+
+class NoteTextIndexTest(TestCase):
+
+	def setUp(self):
+		self.texts = {
+			1: "Patient comes with headache and high blood pressure.",
+			2: "Patient complains of a strong headache on the back of neck.",
+			3: "Patient is taking medicines to control blood pressure.",
+			4: "Patient feels general improvement and no more headaches.",
+			5: "Patient says high BP is controlled, 120x80 in general."}
+		self.index = NoteTextIndex()
+		for code, text in self.texts.items():
+			self.index.add(code, text)
+
+	def matching_codes(self, search_string):
+		''' codes of the notes that really contain the search string '''
+		return {code for code, text in self.texts.items() if search_string in text}
+
+	def test_candidates(self):
+		self.assertEqual(self.index.candidates("neck"), {2})
+		self.assertEqual(self.index.candidates("headache"), {1, 2, 4})
+		self.assertEqual(self.index.candidates("lungs"), set())
+		self.assertEqual(self.index.candidates("ache and hi"), {1, 4})
+		self.assertEqual(self.index.candidates(" BP "), {5})
+
+		# nothing to narrow the search with
+		self.assertIsNone(self.index.candidates(""))
+		self.assertIsNone(self.index.candidates(", "))
+
+	def test_add_remove(self):
+		self.index.add(2, "Patient has dizziness.")
+		self.assertEqual(self.index.candidates("neck"), set())
+		self.assertEqual(self.index.candidates("dizzi"), {2})
+		self.index.remove(2)
+		self.assertEqual(self.index.candidates("dizzi"), set())
+		self.assertNotIn("dizziness", self.index.postings)
+
+	def test_candidates_contain_every_match(self):
+		rng = random.Random(0)
+		for i in range(2000):
+			text = self.texts[rng.randint(1, 5)]
+			start = rng.randint(0, len(text))
+			search_string = text[start:start + rng.randint(0, 15)]
+			candidates = self.index.candidates(search_string)
+			if candidates is not None:
+				self.assertTrue(self.matching_codes(search_string) <= candidates, search_string)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,113 @@
+import os
+from unittest import TestCase
+from unittest import main
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.patient import Patient
+
+class PatientDAOJSONTest(TestCase):
+
+	def setUp(self):
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+
+	def tearDown(self):
+		self.patient_dao.close()
+		for filename in ['clinic/patients.json', 'clinic/patients.journal', 'clinic/patients.journal.old']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+	def reset_persistence(self):
+		self.patient_dao.close()
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+
+	def test_journal_replay(self):
+		patient_1 = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		patient_2 = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		patient_3 = Patient(9792225555, "Joe Hancock", "1990-01-15", "278 456 7890", "john.hancock@outlook.com", "5000 Douglas St, Saanich")
+		patient_3a = Patient(9792226666, "Joe Hancock", "1990-01-15", "278 456 7890", "joe.hancock@outlook.com", "5000 Douglas St, Saanich")
+
+		self.patient_dao.create_patient(patient_1)
+		self.patient_dao.create_patient(patient_2)
+		self.patient_dao.create_patient(patient_3)
+		self.patient_dao.update_patient(9792225555, patient_3a)
+		self.patient_dao.delete_patient(9790012000)
+
+		# mutations are appended to the journal, the snapshot is not rewritten
+		self.assertFalse(os.path.exists('clinic/patients.json'))
+		self.assertTrue(os.path.exists('clinic/patients.journal'))
+
+		self.reset_persistence()
+		self.assertIsNone(self.patient_dao.search_patient(9790012000))
+		self.assertIsNone(self.patient_dao.search_patient(9792225555))
+		self.assertEqual(self.patient_dao.list_patients(), [patient_2, patient_3a])
+
+	def test_compaction(self):
+		self.patient_dao.compaction_threshold = 1000
+		for i in range(50):
+			patient = Patient(9790000000 + i, "Patient %d" % i, "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+			self.patient_dao.create_patient(patient)
+		for i in range(0, 50, 2):
+			self.patient_dao.delete_patient(9790000000 + i)
+		expected_patients = self.patient_dao.list_patients()
+
+		# compaction folded the journal into the snapshot
+		self.patient_dao.close()
+		self.assertTrue(os.path.exists('clinic/patients.json'))
+		self.assertFalse(os.path.exists('clinic/patients.journal.old'))
+
+		self.reset_persistence()
+		self.assertEqual(self.patient_dao.list_patients(), expected_patients)
+
+	def test_interrupted_compaction(self):
+		patient_1 = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		patient_2 = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		self.patient_dao.create_patient(patient_1)
+		self.patient_dao.close()
+
+		# simulate a crash after the journal was moved aside
+		os.replace('clinic/patients.journal', 'clinic/patients.journal.old')
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+		self.patient_dao.create_patient(patient_2)
+
+		self.reset_persistence()
+		self.assertFalse(os.path.exists('clinic/patients.journal.old'))
+		self.assertEqual(self.patient_dao.list_patients(), [patient_1, patient_2])
+
+	def test_refused_patient(self):
+		patient = Patient(9790012000, 123, "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		with self.assertRaises(TypeError):
+			self.patient_dao.create_patient(patient)
+
+		# a patient the name index refuses leaves nothing behind
+		self.assertIsNone(self.patient_dao.search_patient(9790012000))
+		self.assertEqual(self.patient_dao.list_patients(), [])
+		self.assertEqual(self.patient_dao.retrieve_patients("Doe"), [])
+
+	def test_failed_compaction(self):
+		def fail(patients):
+			raise OSError("disk full")
+		self.patient_dao.write_snapshot = fail
+		self.patient_dao.compaction_threshold = 1000
+		with self.assertLogs('clinic.dao.patient_dao_json') as logs:
+			for i in range(20):
+				patient = Patient(9790000000 + i, "Patient %d" % i, "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+				self.patient_dao.create_patient(patient)
+			compaction_thread = self.patient_dao.compaction_thread
+			if compaction_thread is not None:
+				compaction_thread.join()
+		self.assertIn("compaction failed", logs.output[0])
+		self.assertIsNone(self.patient_dao.compaction_thread)
+		self.assertTrue(os.path.exists('clinic/patients.journal.old'))
+
+		# the moved-aside journal is not replaced by a later compaction, it is folded on the next load
+		for i in range(20, 40):
+			patient = Patient(9790000000 + i, "Patient %d" % i, "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+			self.patient_dao.create_patient(patient)
+		self.assertIsNone(self.patient_dao.compaction_thread)
+		expected_patients = self.patient_dao.list_patients()
+		self.reset_persistence()
+		self.assertFalse(os.path.exists('clinic/patients.journal.old'))
+		self.assertEqual(self.patient_dao.list_patients(), expected_patients)
+		self.assertEqual(len(expected_patients), 40)
+
+if __name__ == '__main__':
+	main()
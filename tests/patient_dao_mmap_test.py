@@ -0,0 +1,93 @@
+import os
+from unittest import TestCase
+from unittest import main
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_mmap import PatientDAOMmap
+from clinic.patient import Patient
+
+class PatientDAOMmapTest(TestCase):
+
+	def setUp(self):
+		self.patients = [
+			Patient(9798884444, "Ali Mesbah", "1980-03-03", "250 301 6060", "mesbah.ali@gmail.com", "500 Fairfield Rd, Victoria"),
+			Patient(9792226666, "Jin Hu", "2002-02-28", "278 222 4545", "jinhu@outlook.com", "200 Admirals Rd, Esquimalt"),
+			Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"),
+			Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria"),
+			Patient(9792225555, "Joe Hancock", "1990-01-15", "278 456 7890", "john.hancock@outlook.com", "5000 Douglas St, Saanich")]
+
+		# write a snapshot, and keep an in-memory registry to compare with
+		snapshot_dao = PatientDAOJSON(autosave=True)
+		self.expected_dao = PatientDAOJSON()
+		for patient in self.patients:
+			snapshot_dao.create_patient(patient)
+			self.expected_dao.create_patient(patient)
+		self.patient_dao = PatientDAOMmap(autosave=True)
+
+	def tearDown(self):
+		self.patient_dao.close()
+		for filename in ['clinic/patients.json', 'clinic/patients.idx', 'clinic/patients.journal', 'clinic/patients.journal.old']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+	def reset_persistence(self):
+		self.patient_dao.close()
+		self.patient_dao = PatientDAOMmap(autosave=True)
+
+	def assert_same_patients(self):
+		self.assertEqual(self.patient_dao.list_patients(), self.expected_dao.list_patients())
+		for search_string in ["Doe", "o", "Hancock", "Smith"]:
+			self.assertEqual(self.patient_dao.retrieve_patients(search_string),
+				self.expected_dao.retrieve_patients(search_string))
+
+	def test_search_decodes_one_line(self):
+		self.assertTrue(os.path.exists('clinic/patients.idx'))
+		self.assertEqual(self.patient_dao.search_patient(9790014444), self.patients[3])
+		self.assertIsNone(self.patient_dao.search_patient(9790000000))
+		self.assertEqual(list(self.patient_dao.decoded), [9790014444])
+
+		# the sidecar index is reused when the patients file did not change
+		index_modified = os.stat('clinic/patients.idx').st_mtime_ns
+		self.reset_persistence()
+		self.assertEqual(os.stat('clinic/patients.idx').st_mtime_ns, index_modified)
+		self.assertEqual(self.patient_dao.search_patient(9792225555), self.patients[4])
+
+	def test_decoded_limit(self):
+		self.patient_dao.decoded_limit = 2
+		mary_doe = self.patient_dao.search_patient(9790014444)
+		for patient in self.patients:
+			self.assertEqual(self.patient_dao.search_patient(patient.phn), patient)
+		self.assertEqual(list(self.patient_dao.decoded), [self.patients[3].phn, self.patients[4].phn])
+
+		# a patient still in use is not decoded again, so it keeps its record
+		self.patient_dao.search_patient(9798884444)
+		self.assertNotIn(9790014444, self.patient_dao.decoded)
+		self.assertIs(self.patient_dao.search_patient(9790014444), mary_doe)
+		self.assertEqual(list(self.patient_dao.decoded), [9798884444, 9790014444])
+
+	def test_changes_after_snapshot(self):
+		john_smith = Patient(9790012000, "John Smith", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		jin_hu = Patient(9792227777, "Jin Hu", "2002-02-28", "278 222 4545", "jinhu@outlook.com", "200 Admirals Rd, Esquimalt")
+		new_patient = Patient(9791110000, "Ada Doe", "1970-05-05", "250 111 0000", "ada@gmail.com", "1 Main St, Victoria")
+		for dao in [self.patient_dao, self.expected_dao]:
+			dao.update_patient(9790012000, john_smith)
+			dao.update_patient(9792226666, jin_hu)
+			dao.delete_patient(9798884444)
+			dao.create_patient(new_patient)
+			dao.delete_patient(9790014444)
+			dao.create_patient(self.patients[3])
+		self.assert_same_patients()
+
+		self.reset_persistence()
+		self.assert_same_patients()
+
+		# compaction writes a new snapshot and index, used on the next start
+		self.patient_dao.compaction_threshold = 0
+		self.patient_dao.delete_patient(9792225555)
+		self.expected_dao.delete_patient(9792225555)
+		self.reset_persistence()
+		self.assertEqual(self.patient_dao.deleted, set())
+		self.assertEqual(self.patient_dao.patients, {})
+		self.assert_same_patients()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,110 @@
+import os
+import threading
+from unittest import TestCase
+from unittest import main
+from clinic.dao.patient_dao_sqlite import PatientDAOSQLite
+from clinic.patient import Patient
+
+class PatientDAOSQLiteTest(TestCase):
+
+	def setUp(self):
+		self.patient_dao = PatientDAOSQLite()
+
+	def tearDown(self):
+		self.patient_dao.close()
+		for filename in ['clinic/clinic.db', 'clinic/clinic.db-wal', 'clinic/clinic.db-shm']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+	def test_thread_connections(self):
+		self.patient_dao.create_patient(Patient(9790012000, "John Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		connections = []
+		def search():
+			connections.append(self.patient_dao.connect())
+			self.assertEqual(self.patient_dao.search_patient(9790012000).name, "John Doe")
+		for i in range(2):
+			thread = threading.Thread(target=search)
+			thread.start()
+			thread.join()
+
+		# every thread reads the same database through its own connection
+		self.assertIs(self.patient_dao.connect(), self.patient_dao.connect())
+		self.assertIsNot(connections[0], connections[1])
+		self.assertIsNot(connections[0], self.patient_dao.connect())
+
+		# the connections of finished threads are closed
+		self.assertEqual(len(self.patient_dao.connections), 2)
+		self.assertNotIn(connections[0], self.patient_dao.connections.values())
+
+	def test_concurrent_access(self):
+		for persistent in [False, True]:
+			self.patient_dao.close()
+			self.patient_dao = PatientDAOSQLite(autosave=persistent)
+			errors = []
+			def read():
+				try:
+					for i in range(200):
+						self.patient_dao.search_patient(9790000000 + i)
+						self.patient_dao.retrieve_patients("Doe")
+				except Exception as e:
+					errors.append(e)
+			def write():
+				try:
+					for i in range(200):
+						patient = self.patient_dao.create_patient(Patient(9790000000 + i, "Patient %d Doe" % (i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+						patient.create_note("Note for patient %d." % (i))
+				except Exception as e:
+					errors.append(e)
+			threads = [threading.Thread(target=read) for i in range(4)] + [threading.Thread(target=write)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			self.assertEqual(errors, [])
+			self.assertEqual(len(self.patient_dao.retrieve_patients("Doe")), 200)
+			self.assertEqual(len(self.patient_dao.search_patient(9790000199).list_notes()), 1)
+
+	def test_name_index(self):
+		# names are searched by substring, a B-tree index on the names would never be used
+		indexes = [row[0] for row in self.patient_dao.connect().execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+		self.assertNotIn('patients_name', indexes)
+
+		# the trigram index serves searches of three characters or more
+		self.assertTrue(self.patient_dao.name_search)
+		condition, parameters = self.patient_dao.name_condition("Doe")
+		plan = self.patient_dao.connect().execute(
+			'EXPLAIN QUERY PLAN SELECT phn FROM patients WHERE ' + condition, parameters).fetchall()
+		self.assertIn('patient_names', ' '.join(row[-1] for row in plan))
+
+	def test_name_search(self):
+		self.patient_dao.create_patient(Patient(9790012000, "John Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.patient_dao.create_patient(Patient(9790014444, "Mary Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.patient_dao.create_patient(Patient(9792225555, "Joe Hancock", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.assertEqual([p.phn for p in self.patient_dao.retrieve_patients("Doe")], [9790012000, 9790014444])
+		self.assertEqual([p.phn for p in self.patient_dao.retrieve_patients("oe")], [9790012000, 9790014444, 9792225555])
+		self.assertEqual(self.patient_dao.retrieve_patients("doe"), [])
+		self.assertEqual(self.patient_dao.retrieve_patients('"Doe'), [])
+
+		# the index follows changed and deleted names
+		self.patient_dao.update_patient(9790012000, Patient(9790012000, "John Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.patient_dao.update_patient(9790014444, Patient(9790015555, "Mary Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.patient_dao.delete_patient(9792225555)
+		self.assertEqual([p.phn for p in self.patient_dao.retrieve_patients("Doe")], [9790015555])
+		self.assertEqual([p.phn for p in self.patient_dao.retrieve_patients("Smith")], [9790012000])
+		self.assertEqual(self.patient_dao.retrieve_patients("Hancock"), [])
+		self.assertEqual([p.phn for p in self.patient_dao.retrieve_patients_page("Doe", 9790000000, 1)], [9790015555])
+
+	def test_notes_stay_with_phn(self):
+		# like the record files of the other backends, notes are keyed by PHN
+		self.patient_dao.create_patient(Patient(9790012000, "John Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")).create_note("Patient comes with headache.")
+		self.patient_dao.update_patient(9790012000, Patient(9790014444, "John Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.assertEqual(self.patient_dao.search_patient(9790014444).list_notes(), [])
+		self.patient_dao.update_patient(9790014444, Patient(9790012000, "John Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.assertEqual(len(self.patient_dao.search_patient(9790012000).list_notes()), 1)
+
+		self.patient_dao.delete_patient(9790012000)
+		self.patient_dao.create_patient(Patient(9790012000, "John Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.assertEqual(len(self.patient_dao.search_patient(9790012000).list_notes()), 1)
+
+if __name__ == '__main__':
+	main()
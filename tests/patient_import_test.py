@@ -0,0 +1,81 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest import main
+from clinic.controller import Controller
+from clinic.patient import Patient
+from clinic.patient_import import read_patients_csv, read_patients_jsonl
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+class PatientImportTest(TestCase):
+
+	def setUp(self):
+		self.controller = Controller(autosave=False)
+		self.directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def write_file(self, filename, content):
+		path = os.path.join(self.directory.name, filename)
+		with open(path, 'w') as file:
+			file.write(content)
+		return path
+
+	def test_import_csv(self):
+		expected_patient_1 = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		expected_patient_2 = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		path = self.write_file('patients.csv',
+			'phn,name,birth_date,phone,email,address\n'
+			'9790012000,John Doe,2000-10-10,250 203 1010,john.doe@gmail.com,"300 Moss St, Victoria"\n'
+			'9798884444,Ali Mesbah,1980-03-03,250 301 6060,mesbah.ali@gmail.com,"500 Fairfield Rd, Victoria"\n'
+			'97900A,Jin Hu,2002-02-28,278 222 4545,jinhu@outlook.com,"200 Admirals Rd, Esquimalt"\n'
+			'9790012000,Johnny Doe,2000-10-10,250 203 1010,john.doe@gmail.com,"300 Moss St, Victoria"\n'
+			'\n'
+			'9790014444,Mary Doe,1995-07-01,250 203 2020,mary.doe@gmail.com,"300 Moss St, Victoria"\n'
+			'9792225555,Joe Hancock,,278 456 7890,john.hancock@outlook.com,\n')
+
+		with self.assertRaises(IllegalAccessException, msg="cannot import patients without logging in"):
+			self.controller.import_patients(read_patients_csv(path), numbered=True)
+
+		self.controller.login("user", "123456")
+		self.controller.create_patient(9798884444, "Ali Mesbah", "1980-03-03", "250 301 6060", "mesbah.ali@gmail.com", "500 Fairfield Rd, Victoria")
+		report = self.controller.import_patients(read_patients_csv(path), numbered=True)
+
+		# valid rows are imported, the others are reported with their file line, header and blank lines included
+		self.assertEqual(report.imported, [expected_patient_1, expected_patient_2])
+		self.assertEqual([row_number for row_number, message in report.errors], [3, 4, 5, 8])
+		self.assertEqual(report.errors[3], (8, "Missing fields: birth_date, address."))
+		self.assertEqual(self.controller.search_patient(9790012000), expected_patient_1)
+		self.assertEqual(len(self.controller.list_patients()), 3)
+		self.assertEqual(self.controller.retrieve_patients("Doe"), [expected_patient_1, expected_patient_2])
+
+	def test_import_jsonl(self):
+		expected_patient = Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		path = self.write_file('patients.jsonl',
+			'{"phn": 9790012000, "name": "John Doe", "birth_date": "2000-10-10", "phone": "250 203 1010", '
+			'"email": "john.doe@gmail.com", "address": "300 Moss St, Victoria"}\n'
+			'{"phn": 9790014444, "name": "Mary Doe"\n'
+			'\n'
+			'["not", "a", "patient"]\n')
+
+		self.controller.login("user", "123456")
+		report = self.controller.import_patients(read_patients_jsonl(path), numbered=True)
+		self.assertEqual(report.imported, [expected_patient])
+
+		# rows are numbered by their line, blank lines included
+		self.assertEqual([row_number for row_number, message in report.errors], [2, 4])
+		self.assertEqual(str(report), "1 patients imported, 2 rows rejected")
+
+	def test_import_sqlite(self):
+		self.controller = Controller(autosave=False, backend='sqlite')
+		self.controller.login("user", "123456")
+		rows = [{"phn": 9790000000 + i, "name": "Patient %d" % i, "birth_date": "2000-01-01", "phone": "250 000 0000",
+			"email": "patient@gmail.com", "address": "1 Main St, Victoria"} for i in range(100)]
+		report = self.controller.import_patients(rows + rows[:10])
+		self.assertEqual(len(report.imported), 100)
+		self.assertEqual(len(report.errors), 10)
+		self.assertEqual(len(self.controller.list_patients()), 100)
+
+if __name__ == '__main__':
+	main()
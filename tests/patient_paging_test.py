@@ -0,0 +1,118 @@
+import os
+from unittest import TestCase
+from unittest import main
+from clinic.controller import Controller
+from clinic.exception.illegal_access_exception import IllegalAccessException
+
+class PatientPagingTest(TestCase):
+
+	backend = 'json'
+	autosave = False
+
+	def setUp(self):
+		self.controller = Controller(autosave=self.autosave, backend=self.backend)
+		self.controller.login("user", "123456")
+
+		# PHNs are created out of order, every third patient is a Doe
+		self.phns = []
+		for i in range(250):
+			phn = 9790000000 + (i * 7919) % 1000
+			name = "Patient %d Doe" % (i) if i % 3 == 0 else "Patient %d" % (i)
+			self.controller.create_patient(phn, name, "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+			self.phns.append(phn)
+		self.controller.delete_patient(self.phns[10])
+		self.phns.pop(10)
+		self.phns.sort()
+
+	def tearDown(self):
+		self.controller.close()
+
+	def test_iter_patients(self):
+		self.assertEqual([patient.phn for patient in self.controller.iter_patients()], self.phns)
+		self.assertEqual([patient.phn for patient in self.controller.iter_patients(limit=5)], self.phns[:5])
+		self.assertEqual([patient.phn for patient in self.controller.iter_patients(self.phns[100], 120)], self.phns[101:221])
+		self.assertEqual(list(self.controller.iter_patients(self.phns[-1])), [])
+
+		# walking page by page visits every patient once
+		phns = []
+		after_phn = None
+		while True:
+			page = list(self.controller.iter_patients(after_phn, 30))
+			if not page:
+				break
+			phns.extend([patient.phn for patient in page])
+			after_phn = page[-1].phn
+		self.assertEqual(phns, self.phns)
+
+		self.controller.logout()
+		with self.assertRaises(IllegalAccessException, msg="cannot list patients without logging in"):
+			self.controller.iter_patients()
+
+	def test_retrieve_patients_page(self):
+		does = sorted([patient.phn for patient in self.controller.retrieve_patients("Doe")])
+		page = self.controller.retrieve_patients_page("Doe", limit=20)
+		self.assertEqual([patient.phn for patient in page], does[:20])
+		page = self.controller.retrieve_patients_page("Doe", page[-1].phn, 20)
+		self.assertEqual([patient.phn for patient in page], does[20:40])
+		page = self.controller.retrieve_patients_page("Doe", does[-1])
+		self.assertEqual(page, [])
+
+	def test_suggest_patients(self):
+		does = sorted([patient.phn for patient in self.controller.retrieve_patients("Doe")])
+		self.assertEqual([patient.phn for patient in self.controller.suggest_patients("do", 5)], does[:5])
+		self.assertEqual([patient.name for patient in self.controller.suggest_patients("patient 4", 3)],
+			["Patient 4", "Patient 40", "Patient 41"])
+		self.assertEqual(len(self.controller.suggest_patients("patient")), 10)
+		self.assertEqual(self.controller.suggest_patients("smith"), [])
+
+		# a trailing space completes the last word, which may end the name
+		self.assertEqual([patient.name for patient in self.controller.suggest_patients("patient 4 ")], ["Patient 4"])
+		self.assertEqual([patient.phn for patient in self.controller.suggest_patients("doe ", 5)], does[:5])
+
+		# suggestions follow updates and deletions
+		patient = self.controller.search_patient(self.phns[1])
+		self.controller.update_patient(patient.phn, patient.phn, "Ada Smith", patient.birth_date, patient.phone, patient.email, patient.address)
+		self.assertEqual([patient.name for patient in self.controller.suggest_patients("smi")], ["Ada Smith"])
+		self.controller.delete_patient(self.phns[1])
+		self.assertEqual(self.controller.suggest_patients("ada"), [])
+
+		self.controller.logout()
+		with self.assertRaises(IllegalAccessException, msg="cannot suggest patients without logging in"):
+			self.controller.suggest_patients("do")
+
+class SQLitePatientPagingTest(PatientPagingTest):
+
+	backend = 'sqlite'
+
+class ColumnarPatientPagingTest(PatientPagingTest):
+
+	backend = 'columnar'
+
+class MmapPatientPagingTest(PatientPagingTest):
+
+	backend = 'mmap'
+	autosave = True
+
+	def setUp(self):
+		super().setUp()
+
+		# fold the patients into a snapshot, then change some after it
+		patient_dao = self.controller.patient_dao
+		patient_dao.write_snapshot(patient_dao.all_patients())
+		self.controller.close()
+		os.remove('clinic/patients.journal')
+		self.controller = Controller(autosave=True, backend='mmap')
+		self.controller.login("user", "123456")
+		self.controller.delete_patient(self.phns[0])
+		self.phns.pop(0)
+		self.controller.create_patient(9790001000, "Patient 1000 Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.phns.append(9790001000)
+
+	def tearDown(self):
+		self.controller.close()
+		for filename in ['clinic/patients.json', 'clinic/patients.idx', 'clinic/patients.journal', 'clinic/patients.journal.old']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+if __name__ == '__main__':
+	main()
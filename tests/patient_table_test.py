@@ -0,0 +1,140 @@
+import random
+from unittest import TestCase
+from unittest import main
+from clinic.dao.patient_table import PatientTable
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_columnar import PatientDAOColumnar
+from clinic.patient import Patient
+
+class PatientTableTest(TestCase):
+
+	def setUp(self):
+		self.table = PatientTable()
+		self.patients = [
+			Patient(9798884444, "Ali Mesbah", "1980-03-03", "250 301 6060", "mesbah.ali@gmail.com", "500 Fairfield Rd, Victoria"),
+			Patient(9792226666, "Jin Hu", "2002-02-28", "278 222 4545", "jinhu@outlook.com", "200 Admirals Rd, Esquimalt"),
+			Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"),
+			Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria"),
+			Patient(9792225555, "Joe Hancock", "1990-01-15", "278 456 7890", "john.hancock@outlook.com", "5000 Douglas St, Saanich")]
+		for patient in self.patients:
+			self.table[patient.phn] = patient
+
+	def test_mapping(self):
+		self.assertEqual(len(self.table), 5)
+		self.assertEqual(list(self.table), [patient.phn for patient in self.patients])
+		self.assertEqual(list(self.table.values()), self.patients)
+		self.assertEqual(self.table[9790014444], self.patients[3])
+		self.assertIn(9790012000, self.table)
+		self.assertNotIn(9790000000, self.table)
+		self.assertNotIn("9790012000", self.table)
+		self.assertIsNone(self.table.get(9790000000))
+		with self.assertRaises(KeyError):
+			self.table[9790000000]
+
+		# patients are built when returned, with every field
+		patient = self.table[9792225555]
+		self.assertIsNot(patient, self.patients[4])
+		self.assertEqual(patient.address, "5000 Douglas St, Saanich")
+
+		# an update keeps the row, a deletion drops it
+		john_smith = Patient(9790012000, "John Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.table[9790012000] = john_smith
+		self.assertEqual(self.table.pop(9792226666), self.patients[1])
+		self.assertIsNone(self.table.pop(9792226666, None))
+		with self.assertRaises(KeyError):
+			self.table.pop(9792226666)
+		self.table[9792226666] = self.patients[1]
+		self.assertEqual(list(self.table.values()),
+			[self.patients[0], john_smith, self.patients[3], self.patients[4], self.patients[1]])
+		self.assertEqual(list(self.table.sorted_keys()), sorted(self.table))
+		self.assertEqual(list(self.table.sorted_keys(9790014444)), [9792225555, 9792226666, 9798884444])
+
+	def test_search(self):
+		self.assertEqual(self.table.search("Doe"), [9790012000, 9790014444])
+		self.assertEqual(self.table.search("o"), [9790012000, 9790014444, 9792225555])
+		self.assertEqual(self.table.search(""), list(self.table))
+		self.assertEqual(self.table.search("doe"), [])
+
+		# names are packed end to end, a match must not span two of them
+		self.assertEqual(self.table.search("HuJohn"), [])
+		self.assertEqual(self.table.search("DoeMary"), [])
+
+		# replaced and deleted names are not found
+		self.table[9790012000] = Patient(9790012000, "John Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.table.pop(9790014444)
+		self.assertEqual(self.table.search("Doe"), [])
+		self.assertEqual(self.table.search("Smith"), [9790012000])
+		self.table[9790014444] = Patient(9790014444, "Mary Doe Élise", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.assertEqual(self.table.search("Doe É"), [9790014444])
+
+	def test_compaction(self):
+		# enough changes to compact the columns and the rows, checked against a dict
+		rng = random.Random(1)
+		expected = {patient.phn: patient for patient in self.patients}
+		for i in range(20000):
+			phn = 9790000000 + rng.randrange(3000)
+			if rng.random() < 0.4:
+				self.assertEqual(self.table.pop(phn, None), expected.pop(phn, None))
+			else:
+				patient = Patient(phn, "Patient %d %s" % (i, rng.choice(["Doe", "Hu", "Smith"])), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+				self.table[phn] = patient
+				expected[phn] = patient
+		self.assertLess(len(self.table.phns), 2 * len(expected) + 1024)
+		self.assertEqual(len(self.table), len(expected))
+		self.assertEqual(list(self.table.values()), list(expected.values()))
+		self.assertEqual(list(self.table.sorted_keys()), sorted(expected))
+		self.assertEqual(self.table.search("Doe"), [phn for phn, patient in expected.items() if "Doe" in patient.name])
+		for phn in range(9790000000, 9790003000, 7):
+			self.assertEqual(self.table.get(phn), expected.get(phn))
+
+		# a copy does not change with the table
+		copy = self.table.copy()
+		self.table.pop(next(iter(expected)))
+		self.assertEqual(list(copy.values()), list(expected.values()))
+
+	def test_shared_record(self):
+		# the record opened through one built patient is seen by every other one
+		patient = self.table[9790012000]
+		self.assertEqual(patient.list_notes(), [])
+		patient.create_note("Patient comes with headache.")
+		self.assertEqual(len(self.table[9790012000].list_notes()), 1)
+
+		other_patient = self.table[9790014444]
+		same_patient = self.table[9790014444]
+		other_patient.create_note("Patient has high blood pressure.")
+		self.assertEqual(len(same_patient.list_notes()), 1)
+		self.assertIs(same_patient.get_patient_record(), other_patient.get_patient_record())
+
+		# storing another patient for the PHN replaces the record, like a dict would
+		self.table[9790014444] = Patient(9790014444, "Mary Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+		self.assertEqual(self.table[9790014444].list_notes(), [])
+		self.table.pop(9790012000)
+		self.table[9790012000] = self.patients[2]
+		self.assertEqual(self.table[9790012000].list_notes(), [])
+
+class PatientDAOColumnarTest(TestCase):
+
+	def test_same_as_json(self):
+		patient_dao = PatientDAOColumnar()
+		expected_dao = PatientDAOJSON()
+		for dao in [patient_dao, expected_dao]:
+			dao.create_patients([Patient(9790000000 + (i * 7919) % 1000, "Patient %d Doe" % (i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria") for i in range(300)])
+			dao.update_patient(9790000000, Patient(9790000000, "Ada Smith", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+			dao.update_patient(9790000919, Patient(9790005000, "Jin Doe", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+			dao.delete_patient(9790000838)
+
+		self.assertEqual(patient_dao.list_patients(), expected_dao.list_patients())
+		for search_string in ["Doe", "1", "Smith", "Hu"]:
+			self.assertEqual(patient_dao.retrieve_patients(search_string), expected_dao.retrieve_patients(search_string))
+			self.assertEqual(patient_dao.retrieve_patients_page(search_string, 9790000500, 20),
+				expected_dao.retrieve_patients_page(search_string, 9790000500, 20))
+		self.assertEqual(list(patient_dao.iter_patients(9790000100)), list(expected_dao.iter_patients(9790000100)))
+		self.assertEqual(patient_dao.suggest_patients("ad"), expected_dao.suggest_patients("ad"))
+
+		# the prefix index follows the changes once built
+		for dao in [patient_dao, expected_dao]:
+			dao.create_patient(Patient(9790006000, "Adam Hu", "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria"))
+		self.assertEqual(patient_dao.suggest_patients("ad"), expected_dao.suggest_patients("ad"))
+
+if __name__ == '__main__':
+	main()
@@ -1,6 +1,7 @@
 from unittest import TestCase
 from unittest import main
 from clinic.patient import Patient
+from clinic.patient_record import EMPTY_RECORD
 
 class PatientTest(TestCase):
 	def setUp(self):
@@ -47,5 +48,24 @@ class PatientTest(TestCase):
 		self.assertNotEqual(repr(different_patient_2), repr(self.patient))
 		self.assertNotEqual(repr(different_patient_3), repr(self.patient))
 
+	def test_empty_record(self):
+		other_patient = Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+		self.assertFalse(hasattr(self.patient, '__dict__'))
+
+		# patients share the empty record until they take a note
+		self.assertEqual(self.patient.list_notes(), [])
+		self.assertIsNone(self.patient.search_note(1))
+		self.assertFalse(self.patient.delete_note(1))
+		self.assertIs(self.patient.record, EMPTY_RECORD)
+		self.assertIs(other_patient.record, EMPTY_RECORD)
+		with self.assertRaises(RuntimeError, msg="the empty record takes no notes"):
+			EMPTY_RECORD.create_note("Note")
+
+		self.patient.create_note("Patient comes with headache and high blood pressure.")
+		self.assertIsNot(self.patient.record, EMPTY_RECORD)
+		self.assertEqual(len(self.patient.list_notes()), 1)
+		self.assertEqual(other_patient.list_notes(), [])
+		self.assertIs(other_patient.record, EMPTY_RECORD)
+
 if __name__ == '__main__':
 	main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import re
+from unittest import TestCase
+from unittest import main
+from clinic.dao.record_loader import load_records, EAGER_MODES
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_columnar import PatientDAOColumnar
+from clinic.dao.note_segment_store import NoteSegmentStore, open_stores
+from clinic.data_store import DataStore
+from clinic.patient import Patient
+
+class RecordLoaderTest(TestCase):
+
+	def setUp(self):
+		self.phns = [9790020000 + i for i in range(5)]
+		self.patient_dao = PatientDAOJSON(autosave=True)
+		for phn in self.phns:
+			self.patient_dao.create_patient(Patient(phn, "Patient %d Doe" % (phn), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria", autosave=True))
+		self.write_notes()
+
+	def tearDown(self):
+		for store in list(open_stores.values()):
+			store.close()
+		for filename in os.listdir('clinic/records'):
+			if re.match(r'notes-\d+\.seg|notes\.idx|979002\d+\.(dat|log)', filename):
+				os.remove(os.path.join('clinic/records', filename))
+		if os.path.exists('clinic/patients.json'):
+			os.remove('clinic/patients.json')
+
+	def write_notes(self):
+		# notes of the first patients are in their record files, those of the others in logs only
+		for i, phn in enumerate(self.phns[:4]):
+			patient = self.patient_dao.search_patient(phn)
+			for j in range(i + 1):
+				patient.create_note("Note %d of patient %d" % (j, phn))
+			patient.delete_note(1)
+			if i % 2:
+				patient.get_patient_record().note_dao.save_notes()
+		self.expected = {phn: self.patient_dao.search_patient(phn).list_notes() for phn in self.phns}
+
+	def check_loaded(self, patient_dao):
+		# patients without notes on disk keep the empty record
+		for phn in self.phns[:4]:
+			note_dao = patient_dao.search_patient(phn).get_patient_record().note_dao
+			self.assertIsNotNone(note_dao.notes)
+			self.assertEqual(note_dao.list_notes(), self.expected[phn])
+		self.assertEqual(patient_dao.search_patient(self.phns[4]).list_notes(), [])
+
+		# the loaded records go on like those loaded when needed
+		patient = patient_dao.search_patient(self.phns[3])
+		self.assertEqual(patient.create_note("Last note").code, 5)
+		self.assertEqual(len(patient.retrieve_notes("patient")), 3)
+
+	def test_modes(self):
+		for mode in EAGER_MODES:
+			patient_dao = PatientDAOJSON(autosave=True)
+			times = load_records(patient_dao, mode, 2)
+			self.assertEqual(list(times), ['scan', 'read', 'index'])
+			self.check_loaded(patient_dao)
+			patient_dao.search_patient(self.phns[3]).delete_note(5)
+
+		with self.assertRaises(ValueError):
+			load_records(patient_dao, 'fork')
+
+	def test_columnar(self):
+		patient_dao = PatientDAOColumnar(autosave=True)
+		load_records(patient_dao, 'process')
+		self.check_loaded(patient_dao)
+
+	def test_segments(self):
+		# notes kept in the segment store are replayed from their extents
+		NoteSegmentStore()
+		self.patient_dao = PatientDAOJSON(autosave=True)
+		self.write_notes()
+		for mode in EAGER_MODES:
+			patient_dao = PatientDAOJSON(autosave=True)
+			load_records(patient_dao, mode)
+			self.check_loaded(patient_dao)
+			patient_dao.search_patient(self.phns[3]).delete_note(5)
+
+	def test_data_store(self):
+		store = DataStore(autosave=True, eager='thread', workers=2)
+		self.assertEqual(list(store.load_times), ['patients', 'scan', 'read', 'index'])
+		self.check_loaded(store.patient_dao)
+		store.close()
+		with self.assertRaises(ValueError):
+			DataStore(backend='sqlite', eager='thread')
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,223 @@
+import os
+import logging
+from pickle import dumps
+from unittest import TestCase
+from unittest import main
+from clinic.dao.recovery import seal_line, open_line, scan_lines, frame, scan_frames, scan_file, salvage_file, data_files, \
+	RESYNC_LENGTH, INDEX_MAGIC
+from clinic.dao.checkpoint import write_checkpoint
+from clinic.dao.patient_table import PatientTable
+from clinic.dao.note_segment_store import NoteSegmentStore, open_stores
+from clinic.dao.note_dao_segment import NoteDAOSegment
+from clinic.dao.patient_dao_json import PatientDAOJSON
+from clinic.dao.patient_dao_mmap import PatientDAOMmap
+from clinic.dao.note_dao_pickle import NoteDAOPickle
+from clinic.patient import Patient
+
+PATIENT_FILES = ['clinic/patients.json', 'clinic/patients.idx', 'clinic/patients.journal', 'clinic/patients.journal.old',
+	'clinic/patients.ckpt']
+
+def damage(filename, position):
+	''' flips the bits of one byte of a file '''
+	with open(filename, 'r+b') as file:
+		file.seek(position)
+		byte = file.read(1)
+		file.seek(position)
+		file.write(bytes([byte[0] ^ 0xff]))
+
+class RecoveryTest(TestCase):
+
+	def setUp(self):
+		self.patients = [
+			Patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria"),
+			Patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria"),
+			Patient(9792225555, "Joe Hancock", "1990-01-15", "278 456 7890", "john.hancock@outlook.com", "5000 Douglas St, Saanich")]
+		self.patient_dao = None
+		# the warnings about damaged files are expected here
+		logging.disable(logging.WARNING)
+
+	def tearDown(self):
+		logging.disable(logging.NOTSET)
+		if self.patient_dao is not None:
+			self.patient_dao.close()
+		for filename in PATIENT_FILES:
+			for name in [filename, filename + '.damaged']:
+				if os.path.exists(name):
+					os.remove(name)
+		for store in list(open_stores.values()):
+			store.close()
+		for filename in os.listdir('clinic/records'):
+			if filename.startswith('9790012000') or filename.startswith('notes'):
+				os.remove(os.path.join('clinic/records', filename))
+
+	def test_lines(self):
+		line = seal_line('{"phn": 9790012000}')
+		self.assertEqual(open_line(line[:-1]), b'{"phn": 9790012000}')
+		self.assertIsNone(open_line(line[:-1].replace(b'9790', b'9791')), "changed text")
+		self.assertIsNone(open_line(b'zzzzzzzz {}'), "unreadable checksum")
+		self.assertEqual(open_line(b'{"phn": 1}'), b'{"phn": 1}', "lines of older files have no checksum")
+
+		# damaged lines are skipped, a torn last line is left out
+		data = seal_line('1') + seal_line('2').replace(b'2\n', b'3\n') + seal_line('4') + seal_line('5')[:-2]
+		self.assertEqual(scan_lines(data), ([b'1', b'4'], 1, len(data) - len(seal_line('5')) + 2))
+
+	def test_frames(self):
+		frames = [frame(b'first'), frame(b'second'), frame(b'third')]
+		data = b''.join(frames)
+		self.assertEqual(scan_frames(data), ([b'first', b'second', b'third'], 0, len(data)))
+
+		# a damaged frame is skipped to the next intact one
+		damaged = frames[0] + frames[1][:4] + b'\xff' * 4 + frames[1][8:] + frames[2]
+		self.assertEqual(scan_frames(damaged), ([b'first', b'third'], 1, len(damaged)))
+
+		# a torn last frame is left out, but not counted as damaged
+		self.assertEqual(scan_frames(data[:-2]), ([b'first', b'second'], 0, len(frames[0]) + len(frames[1])))
+
+		# past damage, only frames of a bounded length are looked for, the others are skipped with it
+		long_frame = frame(b'x' * (RESYNC_LENGTH + 1))
+		damaged = frames[0] + b'\xff' * 16 + long_frame + frames[2]
+		self.assertEqual(scan_frames(damaged), ([b'first', b'third'], 1, len(damaged)))
+		self.assertEqual(scan_frames(frames[0] + long_frame)[0], [b'first', b'x' * (RESYNC_LENGTH + 1)])
+
+	def test_damaged_patients_file(self):
+		self.patient_dao = PatientDAOJSON(autosave=True)
+		for patient in self.patients:
+			self.patient_dao.create_patient(patient)
+		self.patient_dao.close()
+
+		# damage the second patient
+		with open('clinic/patients.json', 'rb') as file:
+			first_line = file.readline()
+		damage('clinic/patients.json', len(first_line) + 20)
+
+		# the intact patients are loaded and written back, the damaged file is kept
+		self.patient_dao = PatientDAOJSON(autosave=True)
+		self.assertEqual(self.patient_dao.list_patients(), [self.patients[0], self.patients[2]])
+		self.assertTrue(os.path.exists('clinic/patients.json.damaged'))
+		patient_lines, damaged, torn, chunks = scan_file('clinic/patients.json')
+		self.assertEqual((len(patient_lines), damaged, torn), (2, 0, False))
+
+	def test_damaged_journal(self):
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+		for patient in self.patients:
+			self.patient_dao.create_patient(patient)
+		self.patient_dao.close()
+		with open('clinic/patients.journal', 'rb') as file:
+			journal_size = len(file.read())
+
+		# a torn last entry is dropped without keeping a damaged copy
+		with open('clinic/patients.journal', 'ab') as file:
+			file.write(b'0123abcd {"op": "pu')
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+		self.assertEqual(self.patient_dao.list_patients(), self.patients)
+		self.assertEqual(os.path.getsize('clinic/patients.journal'), journal_size)
+		self.assertFalse(os.path.exists('clinic/patients.journal.damaged'))
+		self.patient_dao.close()
+
+		# a damaged entry is skipped, the others are folded into the snapshot
+		damage('clinic/patients.journal', 30)
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+		self.assertEqual(self.patient_dao.list_patients(), self.patients[1:])
+		self.assertTrue(os.path.exists('clinic/patients.journal.damaged'))
+		self.assertEqual(os.path.getsize('clinic/patients.journal'), 0)
+		self.patient_dao.close()
+		self.patient_dao = PatientDAOJSON(autosave=True, journal=True)
+		self.assertEqual(self.patient_dao.list_patients(), self.patients[1:])
+
+	def test_damaged_mmap_snapshot(self):
+		snapshot_dao = PatientDAOJSON(autosave=True)
+		for patient in self.patients:
+			snapshot_dao.create_patient(patient)
+		damage('clinic/patients.json', 20)
+
+		# the damaged line is found when the patients file is indexed
+		self.patient_dao = PatientDAOMmap(autosave=True)
+		self.assertEqual(self.patient_dao.list_patients(), self.patients[1:])
+		self.assertTrue(os.path.exists('clinic/patients.json.damaged'))
+
+	def test_damaged_record(self):
+		note_dao = NoteDAOPickle(9790012000, autosave=True)
+		for i in range(1, 6):
+			note_dao.create_note("Note number %d." % (i))
+		note_dao.save_notes()
+		note_dao.create_note("Note number 6.")
+		note_dao.create_note("Note number 7.")
+
+		# damage the third note of the record file and the first mutation of the log
+		with open(note_dao.filename, 'rb') as file:
+			data = file.read()
+		damage(note_dao.filename, data.index(b'Note number 3.'))
+		damage(note_dao.log_filename, 20)
+
+		note_dao = NoteDAOPickle(9790012000, autosave=True)
+		self.assertEqual([note.code for note in note_dao.list_notes()], [7, 5, 4, 2, 1])
+		self.assertTrue(os.path.exists(note_dao.filename + '.damaged'))
+		self.assertTrue(os.path.exists(note_dao.log_filename + '.damaged'))
+		self.assertFalse(os.path.exists(note_dao.log_filename), "the intact notes were written back")
+		self.assertEqual(NoteDAOPickle(9790012000, autosave=True).list_notes(), note_dao.list_notes())
+
+	def test_salvage_file(self):
+		filename = 'clinic/records/9790012000.log'
+		with open(filename, 'wb') as file:
+			file.write(b'CLNLOG01' + frame(dumps(1)) + b'garbage' + frame(dumps(2)))
+		self.assertEqual(salvage_file(filename), (2, 1))
+		self.assertEqual(salvage_file(filename), (2, 0), "nothing left to salvage")
+		self.assertEqual(scan_file(filename)[:2], ([dumps(1), dumps(2)], 0))
+
+	def test_damaged_segment(self):
+		store = NoteSegmentStore()
+		note_dao = NoteDAOSegment(9790012000, store)
+		note_dao.create_note("Note number 1.")
+		note_dao.create_note("Note number 2.")
+		other_dao = NoteDAOSegment(9790014444, store)
+		other_dao.create_note("Other note.")
+		store.close()
+
+		segment = 'clinic/records/notes-000001.seg'
+		index = 'clinic/records/notes.idx'
+		self.assertIn(segment, data_files())
+		self.assertIn(index, data_files())
+		with open(segment, 'rb') as file:
+			damage(segment, file.read().index(b'Note number 1.'))
+		self.assertEqual(scan_file(segment)[1], 1)
+		self.assertEqual(salvage_file(segment), (2, 1))
+		self.assertEqual(scan_file(segment)[1], 0)
+
+		# the extents moved, so the index is set to be rebuilt from the segments
+		with open(index, 'rb') as file:
+			self.assertEqual(file.read(), INDEX_MAGIC)
+		self.assertEqual(scan_file(index)[:2], ([], 0))
+		store = NoteSegmentStore()
+		self.assertEqual([note.text for note in NoteDAOSegment(9790014444, store).list_notes()], ["Other note."])
+		self.assertEqual([note.text for note in NoteDAOSegment(9790012000, store).list_notes()], ["Note number 2."])
+
+	def test_damaged_index(self):
+		store = NoteSegmentStore()
+		NoteDAOSegment(9790012000, store).create_note("Note number 1.")
+		store.close()
+
+		index = 'clinic/records/notes.idx'
+		damage(index, 20)
+		self.assertEqual(salvage_file(index), (0, 1))
+		store = NoteSegmentStore()
+		self.assertEqual([note.text for note in NoteDAOSegment(9790012000, store).list_notes()], ["Note number 1."])
+
+	def test_damaged_checkpoint(self):
+		table = PatientTable()
+		for patient in self.patients:
+			table[patient.phn] = patient
+		filename = 'clinic/patients.ckpt'
+		write_checkpoint(filename, table, (1, 2, 3))
+		self.assertIn(filename, data_files())
+		self.assertEqual(scan_file(filename)[1], 0)
+		self.assertEqual(salvage_file(filename), (len(scan_file(filename)[0]), 0))
+
+		# a damaged checkpoint is removed, it is written again from the patients file
+		damage(filename, os.path.getsize(filename) - 30)
+		self.assertEqual(scan_file(filename)[1:], (1, False, None))
+		self.assertEqual(salvage_file(filename), (0, 1))
+		self.assertFalse(os.path.exists(filename))
+		self.assertTrue(os.path.exists(filename + '.damaged'))
+
+if __name__ == '__main__':
+	main()
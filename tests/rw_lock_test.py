@@ -0,0 +1,70 @@
+import threading
+import time
+from unittest import TestCase
+from unittest import main
+from clinic.dao.rw_lock import RWLock
+
+class RWLockTest(TestCase):
+
+	def setUp(self):
+		self.lock = RWLock()
+
+	def test_readers_share(self):
+		# every reader waits for the others inside the lock, which only works if they share it
+		barrier = threading.Barrier(4, timeout=5)
+
+		def read():
+			with self.lock.reading():
+				barrier.wait()
+
+		threads = [threading.Thread(target=read) for i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertFalse(barrier.broken)
+
+	def test_writer_excludes(self):
+		events = []
+		self.lock.acquire_read()
+
+		def write():
+			with self.lock.writing():
+				events.append('write')
+
+		def read():
+			with self.lock.reading():
+				events.append('read')
+
+		writer = threading.Thread(target=write)
+		writer.start()
+		while not self.lock.waiting_writers:
+			time.sleep(0.001)
+
+		# a waiting writer goes before new readers
+		reader = threading.Thread(target=read)
+		reader.start()
+		time.sleep(0.05)
+		self.assertEqual(events, [])
+		self.lock.release_read()
+		writer.join()
+		reader.join()
+		self.assertEqual(events, ['write', 'read'])
+
+	def test_reentrancy(self):
+		with self.lock.writing():
+			with self.lock.writing():
+				with self.lock.reading():
+					pass
+			self.assertIsNotNone(self.lock.writer)
+		self.assertIsNone(self.lock.writer)
+		self.assertEqual(self.lock.readers, {})
+
+		with self.lock.reading():
+			with self.lock.reading():
+				with self.assertRaises(RuntimeError, msg="readers cannot upgrade"):
+					self.lock.acquire_write()
+		self.assertEqual(self.lock.readers, {})
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,21 @@
+from unittest import main
+from clinic.controller import Controller
+import tests.integration_test as integration_test
+
+class SegmentIntegrationTest(integration_test.IntegrationTest):
+	''' runs the integration tests with the notes kept in segment files '''
+
+	def setUp(self):
+		self.controller = Controller(autosave=True, segments=True)
+
+	def tearDown(self):
+		self.controller.close()
+		super().tearDown()
+
+	def reset_persistence(self):
+		self.controller.close()
+		self.controller = Controller(autosave=True)
+		self.controller.login("user", "123456")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from unittest import TestCase
+from unittest import main
+from clinic.session_manager import SessionManager
+from clinic.data_store import DataStore
+from clinic.exception.illegal_access_exception import IllegalAccessException
+from clinic.exception.illegal_operation_exception import IllegalOperationException
+from clinic.exception.invalid_login_exception import InvalidLoginException
+
+class SessionManagerTest(TestCase):
+
+	def setUp(self):
+		self.manager = SessionManager()
+
+	def tearDown(self):
+		self.manager.close()
+
+	def test_sessions(self):
+		with self.assertRaises(InvalidLoginException, msg="a failed login opens no session"):
+			self.manager.login("user", "abadpassword")
+		self.assertEqual(self.manager.list_sessions(), [])
+
+		front_desk = self.manager.get_session(self.manager.login("user", "123456"))
+		exam_room_id = self.manager.login("ali", "@G00dPassw0rd")
+		exam_room = self.manager.get_session(exam_room_id)
+		front_desk.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+		front_desk.create_patient(9790014444, "Mary Doe", "1995-07-01", "250 203 2020", "mary.doe@gmail.com", "300 Moss St, Victoria")
+
+		# each session has its own current patient over the same registry
+		front_desk.set_current_patient(9790012000)
+		exam_room.set_current_patient(9790014444)
+		exam_room.create_note("Patient comes with headache and high blood pressure.")
+		self.assertEqual(front_desk.get_current_patient().phn, 9790012000)
+		self.assertEqual(front_desk.list_notes(), [])
+		self.assertEqual(len(exam_room.list_notes()), 1)
+
+		# closed sessions are logged out and forgotten
+		self.manager.close_session(exam_room_id)
+		self.assertFalse(exam_room.logged)
+		with self.assertRaises(IllegalAccessException, msg="closed sessions cannot be used"):
+			self.manager.get_session(exam_room_id)
+		self.assertEqual(len(self.manager.list_sessions()), 1)
+
+	def test_concurrent_sessions(self):
+		errors = []
+
+		def work(worker):
+			try:
+				controller = self.manager.get_session(self.manager.login("user", "123456"))
+				for i in range(100):
+					phn = 9790000000 + worker * 1000 + i
+					controller.create_patient(phn, "Patient %d %d" % (worker, i), "2000-01-01", "250 000 0000", "patient@gmail.com", "1 Main St, Victoria")
+					controller.set_current_patient(phn)
+					controller.create_note("Note %d" % (i))
+					controller.unset_current_patient()
+					controller.retrieve_patients("Patient %d" % (worker))
+			except Exception as e:
+				errors.append(e)
+
+		threads = [threading.Thread(target=work, args=(worker,)) for worker in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual(errors, [])
+		controller = self.manager.get_session(self.manager.login("user", "123456"))
+		patients = controller.list_patients()
+		self.assertEqual(len(patients), 800)
+		self.assertEqual(list(controller.iter_patients()), sorted(patients, key=lambda patient: patient.phn))
+		controller.set_current_patient(9790007099)
+		self.assertEqual(controller.list_notes()[0].text, "Note 99")
+
+	def test_shared_current_patient(self):
+		self.manager.close()
+		store = DataStore(autosave=True)
+		self.manager = SessionManager(store)
+		try:
+			front_desk = self.manager.get_session(self.manager.login("user", "123456"))
+			exam_room = self.manager.get_session(self.manager.login("ali", "@G00dPassw0rd"))
+			front_desk.create_patient(9790012000, "John Doe", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+			exam_room.set_current_patient(9790012000)
+			exam_room.create_note("Patient comes with headache and high blood pressure.")
+
+			# another session cannot change the patient that a session has open
+			with self.assertRaises(IllegalOperationException):
+				front_desk.update_patient(9790012000, 9790012000, "John Smith", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+			with self.assertRaises(IllegalOperationException):
+				front_desk.delete_patient(9790012000)
+
+			# once unset, the updated patient keeps the one record both sessions write to
+			exam_room.unset_current_patient()
+			front_desk.update_patient(9790012000, 9790012000, "John Smith", "2000-10-10", "250 203 1010", "john.doe@gmail.com", "300 Moss St, Victoria")
+			front_desk.set_current_patient(9790012000)
+			exam_room.set_current_patient(9790012000)
+			self.assertEqual(front_desk.create_note("Patient is feeling better.").code, 2)
+			self.assertEqual(exam_room.create_note("Patient was sent home.").code, 3)
+			with self.assertRaises(IllegalOperationException):
+				front_desk.delete_patient(9790012000)
+
+			# no note is lost after a restart
+			self.manager.close()
+			store.close()
+			store = DataStore(autosave=True)
+			self.manager = SessionManager(store)
+			controller = self.manager.get_session(self.manager.login("user", "123456"))
+			controller.set_current_patient(9790012000)
+			self.assertEqual([note.code for note in controller.list_notes()], [3, 2, 1])
+			controller.unset_current_patient()
+			controller.delete_patient(9790012000)
+		finally:
+			self.manager.close()
+			store.close()
+			for filename in os.listdir('clinic/records'):
+				if filename.startswith('9790012000'):
+					os.remove(os.path.join('clinic/records', filename))
+
+	def test_idle_sessions(self):
+		self.manager.session_timeout = 0.2
+		idle_id = self.manager.login("user", "123456")
+		idle = self.manager.get_session(idle_id)
+		active_id = self.manager.login("ali", "@G00dPassw0rd")
+		for i in range(3):
+			time.sleep(0.1)
+			self.manager.get_session(active_id)
+
+		# sessions left unused are logged out and forgotten, used ones are kept
+		self.assertEqual(self.manager.list_sessions(), [active_id])
+		self.assertFalse(idle.logged)
+		with self.assertRaises(IllegalAccessException, msg="expired sessions cannot be used"):
+			self.manager.get_session(idle_id)
+		self.assertTrue(self.manager.get_session(active_id).logged)
+
+if __name__ == '__main__':
+	main()
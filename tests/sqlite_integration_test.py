@@ -0,0 +1,24 @@
+import os
+from unittest import main
+from clinic.controller import Controller
+import tests.integration_test as integration_test
+
+class SQLiteIntegrationTest(integration_test.IntegrationTest):
+	''' runs the integration tests against the SQLite backend '''
+
+	def setUp(self):
+		self.controller = Controller(autosave=True, backend='sqlite')
+
+	def tearDown(self):
+		self.controller.close()
+		for filename in ['clinic/clinic.db', 'clinic/clinic.db-wal', 'clinic/clinic.db-shm']:
+			if os.path.exists(filename):
+				os.remove(filename)
+
+	def reset_persistence(self):
+		self.controller.close()
+		self.controller = Controller(autosave=True, backend='sqlite')
+		self.controller.login("user", "123456")
+
+if __name__ == '__main__':
+	main()